@@ -0,0 +1,8 @@
+# benchmarks/__init__.py
+"""
+This package contains micro-benchmarks for the compute services.
+
+Run a benchmark from the repository root, e.g.:
+
+    python -m benchmarks.bench_set_loading
+"""
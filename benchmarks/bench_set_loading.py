@@ -0,0 +1,144 @@
+# benchmarks/bench_set_loading.py
+"""
+Micro-benchmark for building block set ingestion.
+
+Compares the original row-wise ingestion (read_csv + DataFrame.iterrows)
+against the column-wise loader in web.services.blocks.set_loader on a
+synthetic set. SMILES canonicalization is timed separately: the loader parses
+each distinct SMILES once, so its cost depends on how many duplicates a set
+holds rather than on how rows are walked.
+
+Usage:
+    python -m benchmarks.bench_set_loading [--rows 10000] [--repeat 5]
+"""
+
+# Standard Library Imports
+from typing import Any, Callable, Dict, List
+import argparse
+import os
+import tempfile
+import time
+
+# External Imports
+import pandas as pd
+from rdkit import Chem
+
+# Internal Imports
+from web.services.blocks.set_loader import read_block_set
+
+# Side chains combined into synthetic alpha-amino acids
+SIDE_CHAINS: List[str] = [
+    "",
+    "C",
+    "CC",
+    "CCC",
+    "CC(C)",
+    "CC(C)C",
+    "CCSC",
+    "Cc1ccccc1",
+    "CO",
+    "C(C)O",
+    "CS",
+    "CC(=O)N",
+    "CCC(=O)N",
+    "CC(=O)O",
+    "CCC(=O)O",
+    "CCCCN",
+    "CCCNC(=N)N",
+    "Cc1c[nH]cn1",
+    "Cc1ccc(O)cc1",
+    "Cc1c[nH]c2ccccc12",
+]
+
+
+def write_synthetic_set(path: str, rows: int) -> None:
+    """Write a synthetic building block set.
+
+    Args:
+        path: The path of the CSV file to write.
+        rows: The number of blocks in the set.
+    """
+    chains = ["C" * (i % 7) + SIDE_CHAINS[i % len(SIDE_CHAINS)] for i in range(rows)]
+    smiles = [f"NC({chain})C(=O)O" if chain else "NCC(=O)O" for chain in chains]
+    pd.DataFrame(
+        {
+            "name": [f"Block {i}" for i in range(rows)],
+            "alt_name1": [f"B{i}" for i in range(rows)],
+            "alt_name2": [f"Blk{i}" for i in range(rows)],
+            "smiles": smiles,
+            "position": ["any"] * rows,
+            "notes": ["unused column"] * rows,
+        }
+    ).to_csv(path, index=False)
+
+
+def rowwise(path: str) -> List[Dict[str, Any]]:
+    """Ingest a set the way get_building_blocks originally did."""
+    df = pd.read_csv(path)
+    records = []
+    for _, row in df.iterrows():
+        records.append(
+            {
+                "name": row["name"],
+                "code": row["alt_name1"],
+                "alt_code": row["alt_name2"],
+                "smiles": row["smiles"],
+                "position": row["position"],
+                "set": "bench",
+            }
+        )
+    return records
+
+
+def columnwise(path: str) -> List[Dict[str, Any]]:
+    """Ingest a set with the column-wise loader."""
+    return read_block_set(path, "bench", canonicalize=False).records()
+
+
+def canonicalize_rowwise(path: str) -> None:
+    """Canonicalize every row's SMILES one at a time."""
+    for smiles in pd.read_csv(path)["smiles"]:
+        Chem.MolToSmiles(Chem.MolFromSmiles(smiles))
+
+
+def canonicalize_columnwise(path: str) -> None:
+    """Canonicalize the SMILES column in one batch."""
+    read_block_set(path, "bench")
+
+
+def best_of(func: Callable[[str], Any], path: str, repeat: int) -> float:
+    """Return the best wall-clock time of several runs."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(path)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "bench_set.csv")
+        write_synthetic_set(path, args.rows)
+        assert rowwise(path) == columnwise(path)
+
+        before = best_of(rowwise, path, args.repeat)
+        after = best_of(columnwise, path, args.repeat)
+        canon_before = best_of(canonicalize_rowwise, path, args.repeat)
+        canon_after = best_of(canonicalize_columnwise, path, args.repeat)
+
+    print(f"rows:                     {args.rows}")
+    print(f"ingest, iterrows:         {before * 1000:8.1f} ms")
+    print(f"ingest, column-wise:      {after * 1000:8.1f} ms")
+    print(f"ingest speedup:           {before / after:8.1f}x")
+    print(f"canonicalize, per row:    {canon_before * 1000:8.1f} ms")
+    print(f"canonicalize, batched:    {canon_after * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+# benchmarks/bench_similarity.py
+"""
+Micro-benchmark for bulk Tanimoto similarity search.
+
+Times SimilarityIndex.search on random sparse 2048-bit fingerprints and
+checks its hits against a brute-force scan of the whole set.
+
+Usage:
+    python -m benchmarks.bench_similarity [--blocks 100000] [--repeat 20]
+"""
+
+# Standard Library Imports
+import argparse
+import time
+
+# External Imports
+import numpy as np
+
+# Internal Imports
+from web.services.blocks.fingerprints import pack_bits
+from web.services.blocks.similarity import SimilarityIndex, popcount
+
+
+def brute_force(fingerprints: np.ndarray, query: np.ndarray, threshold: float, k: int):
+    """Score every block and return the top-k above threshold."""
+    common = popcount(fingerprints & query)
+    scores = common / (popcount(query) + popcount(fingerprints) - common)
+    hits = np.flatnonzero(scores >= threshold)
+    return hits[np.lexsort((hits, -scores[hits]))][:k]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--blocks", type=int, default=100_000)
+    parser.add_argument("--density", type=float, default=0.02)
+    parser.add_argument("--threshold", type=float, default=0.5)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    fingerprints = pack_bits(rng.random((args.blocks, 2048)) < args.density)
+
+    start = time.perf_counter()
+    index = SimilarityIndex(None, fingerprints)
+    build = time.perf_counter() - start
+
+    timings = []
+    for query_row in rng.integers(0, args.blocks, args.repeat):
+        query = fingerprints[query_row]
+        start = time.perf_counter()
+        indices, _ = index.search(query, args.threshold, args.k)
+        timings.append(time.perf_counter() - start)
+        expected = brute_force(fingerprints, query, args.threshold, args.k)
+        assert np.array_equal(indices, expected)
+
+    print(f"blocks:        {args.blocks}")
+    print(f"index build:   {build * 1000:8.1f} ms")
+    print(f"query median:  {np.median(timings) * 1000:8.1f} ms")
+    print(f"query max:     {np.max(timings) * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
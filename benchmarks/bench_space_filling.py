@@ -0,0 +1,84 @@
+# benchmarks/bench_space_filling.py
+"""
+Benchmark for space-filling curve library sampling.
+
+Draws samples of an n-ary library with Hilbert and Z-order curves and with
+uniform random sampling, repeats dropped from each, and compares how
+evenly they spread through the property space. Each member is embedded as
+the block property at each position, scaled to [0, 1]. Coverage is the
+mean distance from random library members to their nearest sampled member,
+lower being better; separation is the mean distance from each sampled
+member to its nearest other sampled member, higher being better.
+
+Usage:
+    python -m benchmarks.bench_space_filling [--blocks 20] [--length 6]
+"""
+
+# Standard Library Imports
+import argparse
+import time
+
+# External Imports
+import numpy as np
+
+# Internal Imports
+from web.services.design.combinatoric import CombinatoricDesign
+from web.services.design.space_filling import CURVES, space_filling_sample
+
+
+def nearest_distances(
+    queries: np.ndarray, points: np.ndarray, exclude_self: bool = False
+) -> np.ndarray:
+    """Get the distance from each query to its nearest point, in chunks."""
+    distances = np.empty(len(queries))
+    for start in range(0, len(queries), 1024):
+        chunk = queries[start : start + 1024]
+        squared = ((chunk[:, None, :] - points[None, :, :]) ** 2).sum(axis=2)
+        if exclude_self:
+            rows = np.arange(len(chunk))
+            squared[rows, start + rows] = np.inf
+        distances[start : start + len(chunk)] = np.sqrt(squared.min(axis=1))
+    return distances
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--blocks", type=int, default=20)
+    parser.add_argument("--length", type=int, default=6)
+    parser.add_argument("--size", type=int, default=4096)
+    parser.add_argument("--probes", type=int, default=8192)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    values = rng.normal(size=args.blocks)
+    scaled = (values - values.min()) / (values.max() - values.min())
+    design = CombinatoricDesign("nary", args.blocks, args.length)
+    probes = scaled[rng.integers(0, args.blocks, (args.probes, args.length))]
+
+    samples = {}
+    for curve in CURVES:
+        start = time.perf_counter()
+        samples[curve] = space_filling_sample(design, values, args.size, curve)
+        samples[curve + "_time"] = time.perf_counter() - start
+    start = time.perf_counter()
+    drawn = rng.integers(0, args.blocks, (args.size, args.length))
+    samples["random"] = np.unique(drawn, axis=0)
+    samples["random_time"] = time.perf_counter() - start
+
+    print(
+        f"{args.size:,} of {args.blocks ** args.length:,} members, "
+        f"{args.length} positions"
+    )
+    for name in (*CURVES, "random"):
+        members = scaled[samples[name]]
+        coverage = nearest_distances(probes, members).mean()
+        separation = nearest_distances(members, members, exclude_self=True).mean()
+        print(
+            f"{name:>8}: {len(members):,} members in {samples[name + '_time']:.3f}s, "
+            f"coverage {coverage:.4f}, separation {separation:.4f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -20,10 +20,12 @@ from peplab.frontend.src.presentation.app.routes.optimization_routes import (
 )
 from peplab.frontend.src.presentation.app.routes.settings_routes import settings_bp
 from peplab.frontend.src.presentation.app.routes.blocks_routes import blocks_bp
+from peplab.frontend.src.presentation.app.routes.jobs_routes import jobs_bp
 from peplab.frontend.src.infrastructure.orchestrator import (
     ApplicationOrchestrator,
     ApplicationContext,
 )
+from web.services.jobs.scheduler import get_job_scheduler
 
 
 @dataclass
@@ -66,6 +68,7 @@ class BlueprintManager:
             "optimization": BlueprintConfig(optimization_bp, "/optimization"),
             "settings": BlueprintConfig(settings_bp, "/settings"),
             "blocks": BlueprintConfig(blocks_bp, "/blocks"),
+            "jobs": BlueprintConfig(jobs_bp, "/jobs"),
         }
 
     def register_blueprints(self) -> None:
@@ -76,6 +79,8 @@ class BlueprintManager:
         """
         for config in self.blueprints.values():
             self.app.register_blueprint(config.blueprint, url_prefix=config.url_prefix)
+        # Queued jobs, and those orphaned by a restart, resume at startup
+        get_job_scheduler(self.app)
 
     def initialize_state_handlers(self) -> None:
         """Initialize state handlers for all blueprints.
@@ -0,0 +1,33 @@
+# web/core/exceptions/blocks_exceptions.py
+"""
+This module contains the building block exceptions.
+"""
+
+
+class BuildingBlockException(Exception):
+    """The building block exception."""
+
+    def __init__(self, message: str) -> None:
+        self.message: str = message
+        super().__init__(self.message)
+
+
+class InvalidSmilesError(BuildingBlockException):
+    """The invalid SMILES error."""
+
+    def __init__(self, message: str) -> None:
+        super().__init__(message)
+
+
+class UnknownBlockSetError(BuildingBlockException):
+    """The unknown building block set error."""
+
+    def __init__(self, message: str) -> None:
+        super().__init__(message)
+
+
+class InvalidSmartsError(BuildingBlockException):
+    """The invalid SMARTS error."""
+
+    def __init__(self, message: str) -> None:
+        super().__init__(message)
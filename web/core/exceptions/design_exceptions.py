@@ -0,0 +1,26 @@
+# web/core/exceptions/design_exceptions.py
+"""
+This module contains the library design exceptions.
+"""
+
+
+class DesignException(Exception):
+    """The library design exception."""
+
+    def __init__(self, message: str) -> None:
+        self.message: str = message
+        super().__init__(self.message)
+
+
+class InvalidDesignError(DesignException):
+    """The invalid library design error."""
+
+    def __init__(self, message: str) -> None:
+        super().__init__(message)
+
+
+class LibraryGenerationError(DesignException):
+    """The library generation error."""
+
+    def __init__(self, message: str) -> None:
+        super().__init__(message)
@@ -0,0 +1,26 @@
+# web/core/exceptions/job_exceptions.py
+"""
+This module contains the background job exceptions.
+"""
+
+
+class JobException(Exception):
+    """The background job exception."""
+
+    def __init__(self, message: str) -> None:
+        self.message: str = message
+        super().__init__(self.message)
+
+
+class InvalidJobError(JobException):
+    """The invalid background job error."""
+
+    def __init__(self, message: str) -> None:
+        super().__init__(message)
+
+
+class UnknownJobError(JobException):
+    """The unknown background job error."""
+
+    def __init__(self, message: str) -> None:
+        super().__init__(message)
@@ -17,6 +17,7 @@ from peplab.frontend.src.presentation.app.routes.optimization_routes import (
 )
 from peplab.frontend.src.presentation.app.routes.settings_routes import settings_bp
 from peplab.frontend.src.presentation.app.routes.blocks_routes import blocks_bp
+from peplab.frontend.src.presentation.app.routes.jobs_routes import jobs_bp
 
 __all__: List[str] = [
     "main_bp",
@@ -27,4 +28,5 @@ __all__: List[str] = [
     "optimization_bp",
     "settings_bp",
     "blocks_bp",
+    "jobs_bp",
 ]
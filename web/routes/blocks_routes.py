@@ -4,13 +4,41 @@ Module for building blocks-related routes.
 This module contains the routes for managing and exploring building blocks.
 """
 
-from typing import Any, Dict, List
-from flask import Blueprint, render_template, jsonify, redirect, url_for
-from rdkit import Chem
-from rdkit.Chem import Draw
-import pandas as pd
+from typing import Any, Dict, Iterator, List, Optional
+from flask import (
+    Blueprint,
+    Response,
+    render_template,
+    jsonify,
+    redirect,
+    request,
+    stream_with_context,
+    url_for,
+)
 import base64
-import io
+import binascii
+import json
+import re
+
+import numpy as np
+
+from web.core.exceptions.blocks_exceptions import (
+    InvalidSmartsError,
+    InvalidSmilesError,
+    UnknownBlockSetError,
+)
+from web.services.blocks import substructure_index
+from web.services.blocks.depiction_cache import (
+    MIMETYPES,
+    RenderOptions,
+    canonicalize_smiles,
+    get_depiction_cache,
+)
+from web.services.blocks.depiction_pool import get_depiction_pool
+from web.services.blocks.descriptors import get_descriptor_table
+from web.services.blocks.fingerprints import morgan_fingerprints
+from web.services.blocks.set_loader import BLOCK_SET_FILES, BlockSet, load_block_set
+from web.services.blocks.similarity import get_similarity_index
 
 blocks_bp = Blueprint("blocks", __name__)
 
@@ -23,60 +51,364 @@ BLOCK_DATABASES: Dict[str, str] = {
     "specialty": "Specialty Building Blocks",
 }
 
+# Depiction keys are SHA-256 hex digests and never change once issued
+DEPICTION_KEY_PATTERN = re.compile(r"[0-9a-f]{64}")
+DEPICTION_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+# Page sizes bound the work and memory of a single set request
+DEFAULT_PAGE_SIZE = 500
+MAX_PAGE_SIZE = 5000
+STREAM_BATCH_SIZE = 256
+
+
+def encode_cursor(set_name: str, offset: int) -> str:
+    """Encode an opaque pagination cursor.
+
+    Args:
+        set_name: Name of the building block set
+        offset: Index of the next block to return
+
+    Returns:
+        URL-safe cursor string
+    """
+    return base64.urlsafe_b64encode(f"{set_name}:{offset}".encode()).decode()
+
+
+def decode_cursor(cursor: str, set_name: str) -> int:
+    """Decode an opaque pagination cursor.
+
+    Args:
+        cursor: Cursor string returned by a previous page
+        set_name: Name of the building block set being paged
+
+    Returns:
+        Index of the next block to return
+
+    Raises:
+        ValueError: If the cursor is malformed or belongs to another set
+    """
+    try:
+        cursor_set, offset = (
+            base64.urlsafe_b64decode(cursor.encode()).decode().rsplit(":", 1)
+        )
+    except (binascii.Error, UnicodeDecodeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+    if cursor_set != set_name or not offset.isdigit():
+        raise ValueError(f"Invalid cursor: {cursor}")
+    return int(offset)
+
+
+def image_urls_for(
+    smiles: List[str], canonical_smiles: List[str], options: RenderOptions
+) -> List[Optional[str]]:
+    """Get the depiction URLs of building blocks.
+
+    Only the depiction keys are resolved here; the images themselves are
+    rendered lazily when the browser first requests their URLs.
+
+    Args:
+        smiles: SMILES strings as written in the set file
+        canonical_smiles: Canonical SMILES strings, empty where invalid
+        options: Render options of the depiction URLs
+
+    Returns:
+        Depiction URL of each block, or None where the SMILES is invalid
+    """
+    depictions = get_depiction_cache()
+    return [
+        (
+            url_for(
+                "blocks.depict",
+                key=depictions.key_for(item, options),
+                fmt=options.fmt,
+            )
+            if canonical
+            else None
+        )
+        for item, canonical in zip(smiles, canonical_smiles)
+    ]
+
+
+def page_records(
+    block_set: BlockSet, start: int, stop: int, options: RenderOptions
+) -> List[Dict[str, Any]]:
+    """Build the response records for a slice of a set.
+
+    Args:
+        block_set: The building block set
+        start: Index of the first block
+        stop: Index after the last block
+        options: Render options of the depiction URLs
+
+    Returns:
+        Building block records with depiction URLs
+    """
+    image_urls = image_urls_for(
+        block_set.smiles[start:stop].tolist(),
+        block_set.canonical_smiles[start:stop].tolist(),
+        options,
+    )
+    return block_set.records(start, stop, image_urls=image_urls)
+
 
 @blocks_bp.route("/api/building-blocks/<set_name>")
 def get_building_blocks(set_name: str) -> Any:
-    """Get building blocks for a specific set.
+    """Get building blocks for a specific set, one page at a time.
 
     Args:
         set_name: Name of the building block set to load
 
+    Query Args:
+        format: Image format of the returned depiction URLs ("png" or "svg")
+        limit: Maximum number of blocks to return
+        cursor: Cursor returned as next_cursor by the previous page
+        stream: "ndjson" to stream the blocks as newline-delimited JSON
+
     Returns:
-        JSON response with building blocks data
+        JSON page of building blocks with depiction URLs, or an NDJSON stream
     """
     try:
-        # Map set names to file paths (you can expand this)
-        set_files = {
-            "canonical": "test_building_blocks.csv",
-            # Add more mappings as needed
-        }
+        image_format = request.args.get("format", "png")
+        if image_format not in MIMETYPES:
+            return jsonify({"error": f"Unknown image format: {image_format}"}), 400
+        options = RenderOptions(fmt=image_format)
 
-        if set_name not in set_files:
-            return jsonify({"error": f"Unknown set: {set_name}"}), 404
+        block_set = load_block_set(set_name)
+        cursor = request.args.get("cursor")
+        start = decode_cursor(cursor, set_name) if cursor else 0
+        stream = request.args.get("stream") == "ndjson"
 
-        # Read the CSV file
-        df = pd.read_csv(set_files[set_name])
-        building_blocks = []
+        limit = request.args.get("limit", type=int)
+        if limit is None:
+            limit = len(block_set) if stream else DEFAULT_PAGE_SIZE
+        elif limit < 1:
+            return jsonify({"error": "limit must be positive"}), 400
+        stop = min(
+            start + (limit if stream else min(limit, MAX_PAGE_SIZE)), len(block_set)
+        )
+
+        # Render missing depictions on the process pool and prepare the
+        # substructure index, both off the request thread and once per
+        # loaded set
+        get_depiction_pool().warm_in_background(
+            set_name, get_depiction_cache(), block_set.smiles, options
+        )
+        substructure_index.load_in_background(set_name)
+
+        if stream:
+
+            def generate() -> Iterator[str]:
+                for batch_start in range(start, stop, STREAM_BATCH_SIZE):
+                    batch_stop = min(batch_start + STREAM_BATCH_SIZE, stop)
+                    for record in page_records(
+                        block_set, batch_start, batch_stop, options
+                    ):
+                        yield json.dumps(record) + "\n"
+
+            return Response(
+                stream_with_context(generate()), mimetype="application/x-ndjson"
+            )
 
-        for _, row in df.iterrows():
-            # Create RDKit molecule from SMILES
-            mol = Chem.MolFromSmiles(row["smiles"])
-
-            # Generate 2D depiction
-            img = Draw.MolToImage(mol)
-
-            # Convert image to base64
-            img_buffer = io.BytesIO()
-            img.save(img_buffer, format="PNG")
-            img_str = base64.b64encode(img_buffer.getvalue()).decode()
-
-            # Create building block object
-            building_block = {
-                "name": row["name"],
-                "code": row["alt_name1"],
-                "alt_code": row["alt_name2"],
-                "smiles": row["smiles"],
-                "position": row["position"],
-                "image": f"data:image/png;base64,{img_str}",
-                "set": set_name,
+        return jsonify(
+            {
+                "building_blocks": page_records(block_set, start, stop, options),
+                "total": len(block_set),
+                "next_cursor": (
+                    encode_cursor(set_name, stop) if stop < len(block_set) else None
+                ),
             }
-            building_blocks.append(building_block)
+        )
+    except UnknownBlockSetError as e:
+        return jsonify({"error": str(e)}), 404
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@blocks_bp.route("/api/descriptors/<set_name>")
+def get_block_descriptors(set_name: str) -> Any:
+    """Get the descriptor table of a building block set.
+
+    Args:
+        set_name: Name of the building block set
+
+    Query Args:
+        limit: Maximum number of blocks to return
+        cursor: Cursor returned as next_cursor by the previous page
+
+    Returns:
+        JSON page of descriptor columns, one value per block
+    """
+    try:
+        table = get_descriptor_table(set_name)
+        cursor = request.args.get("cursor")
+        start = decode_cursor(cursor, set_name) if cursor else 0
+        limit = min(request.args.get("limit", MAX_PAGE_SIZE, type=int), MAX_PAGE_SIZE)
+        if limit < 1:
+            return jsonify({"error": "limit must be positive"}), 400
+        stop = min(start + limit, len(table))
+
+        # NaN marks invalid blocks and is not valid JSON
+        values = np.asarray(table.values[start:stop], dtype=object)
+        values[np.isnan(table.values[start:stop])] = None
+        return jsonify(
+            {
+                "descriptors": {
+                    name: values[:, i].tolist() for i, name in enumerate(table.names)
+                },
+                "total": len(table),
+                "next_cursor": (
+                    encode_cursor(set_name, stop) if stop < len(table) else None
+                ),
+            }
+        )
+    except UnknownBlockSetError as e:
+        return jsonify({"error": str(e)}), 404
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@blocks_bp.route("/api/search")
+def search_building_blocks() -> Any:
+    """Search building block sets by SMARTS substructure.
+
+    Query Args:
+        smarts: SMARTS pattern the blocks must contain
+        sets: Comma-separated names of the sets to search (default: all)
+        limit: Maximum number of matches per set
+        format: Image format of the returned depiction URLs ("png" or "svg")
+
+    Returns:
+        JSON response with the matching building blocks
+    """
+    try:
+        image_format = request.args.get("format", "png")
+        if image_format not in MIMETYPES:
+            return jsonify({"error": f"Unknown image format: {image_format}"}), 400
+        options = RenderOptions(fmt=image_format)
+
+        query = substructure_index.parse_smarts(request.args.get("smarts", ""))
+        limit = min(
+            request.args.get("limit", DEFAULT_PAGE_SIZE, type=int), MAX_PAGE_SIZE
+        )
+        if limit < 1:
+            return jsonify({"error": "limit must be at least 1"}), 400
+        set_names = [name for name in request.args.get("sets", "").split(",") if name]
+
+        building_blocks = []
+        for set_name in set_names or list(BLOCK_SET_FILES):
+            index = substructure_index.get_substructure_index(set_name)
+            matches = index.search(query, limit=limit)
+            image_urls = image_urls_for(
+                [index.block_set.smiles[i] for i in matches],
+                [index.block_set.canonical_smiles[i] for i in matches],
+                options,
+            )
+            building_blocks.extend(
+                index.block_set.records_at(matches, image_urls=image_urls)
+            )
+
+        return jsonify({"building_blocks": building_blocks})
+    except UnknownBlockSetError as e:
+        return jsonify({"error": str(e)}), 404
+    except InvalidSmartsError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@blocks_bp.route("/api/similar")
+def similar_building_blocks() -> Any:
+    """Find the building blocks most similar to a SMILES string.
+
+    Query Args:
+        smiles: SMILES string of the query molecule
+        k: Maximum number of blocks to return (default 10)
+        threshold: Minimum Tanimoto similarity (default 0.5)
+        sets: Comma-separated names of the sets to search (default: all)
+        format: Image format of the returned depiction URLs ("png" or "svg")
+
+    Returns:
+        JSON response with the most similar blocks, most similar first
+    """
+    try:
+        image_format = request.args.get("format", "png")
+        if image_format not in MIMETYPES:
+            return jsonify({"error": f"Unknown image format: {image_format}"}), 400
+        options = RenderOptions(fmt=image_format)
+
+        k = min(request.args.get("k", 10, type=int), MAX_PAGE_SIZE)
+        if k < 1:
+            return jsonify({"error": "k must be at least 1"}), 400
+        threshold = request.args.get("threshold", 0.5, type=float)
+        if not 0.0 <= threshold <= 1.0:
+            return jsonify({"error": "threshold must be between 0 and 1"}), 400
+        query = morgan_fingerprints(
+            [canonicalize_smiles(request.args.get("smiles", ""))]
+        )[0]
+        set_names = [name for name in request.args.get("sets", "").split(",") if name]
+
+        hits = []
+        for set_name in set_names or list(BLOCK_SET_FILES):
+            index = get_similarity_index(set_name)
+            indices, scores = index.search(query, threshold=threshold, k=k)
+            hits.extend(
+                (score, index.block_set, block)
+                for score, block in zip(scores.tolist(), indices.tolist())
+            )
+        hits.sort(key=lambda hit: -hit[0])
+
+        building_blocks = []
+        for score, block_set, block in hits[:k]:
+            image_urls = image_urls_for(
+                [block_set.smiles[block]], [block_set.canonical_smiles[block]], options
+            )
+            record = block_set.records_at([block], image_urls=image_urls)[0]
+            record["similarity"] = score
+            building_blocks.append(record)
 
         return jsonify({"building_blocks": building_blocks})
+    except UnknownBlockSetError as e:
+        return jsonify({"error": str(e)}), 404
+    except InvalidSmilesError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
+@blocks_bp.route("/depict/<key>.<fmt>")
+def depict(key: str, fmt: str) -> Any:
+    """Serve a building block depiction by its content key.
+
+    Depiction URLs are content-addressed, so responses carry a strong ETag
+    and are cached by the browser forever.
+
+    Args:
+        key: Content key of the depiction
+        fmt: Image format ("png" or "svg")
+
+    Returns:
+        Image response, 304 if the client copy is current, or 404
+    """
+    if fmt not in MIMETYPES or not DEPICTION_KEY_PATTERN.fullmatch(key):
+        return "Unknown depiction", 404
+
+    headers = {"ETag": f'"{key}"', "Cache-Control": DEPICTION_CACHE_CONTROL}
+    cache = get_depiction_cache()
+    # Only a depiction that exists is current, whichever tags the client sent
+    if request.if_none_match.contains_weak(key) and cache.has_key(key, fmt):
+        return Response(status=304, headers=headers)
+
+    depiction = cache.get_by_key(key, fmt)
+    if depiction is None:
+        return "Unknown depiction", 404
+
+    return Response(depiction.data, mimetype=depiction.mimetype, headers=headers)
+
+
 @blocks_bp.route("/explore")
 def explore() -> Any:
     """Render the building blocks explorer page.
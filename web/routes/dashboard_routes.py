@@ -13,34 +13,56 @@ Functions:
     analysis: Render the analysis dashboard page
     modeling: Render the modeling dashboard page
     optimization: Render the optimization dashboard page
+    save_library: Download a generated library with its peptide properties
 """
+
 # Standard Library Imports
-from typing import Any, Set
+from itertools import islice
+from typing import Any, Dict, Iterator, Set
 import os
+import re
 
 # External Imports
 from werkzeug.utils import secure_filename
 from werkzeug.datastructures import FileStorage
 from flask import (
     Blueprint,
+    Response,
     render_template,
     request,
     flash,
     redirect,
+    stream_with_context,
     url_for,
-    send_file,
 )
-import io
 import csv
+import numpy as np
 
 # Internal Imports
 from peplab.frontend.src.infrastructure.managers.state_manager import StateManager
 from peplab.frontend.src.infrastructure.states.dashboard_state import DashboardState
+from web.core.exceptions.blocks_exceptions import (
+    InvalidSmilesError,
+    UnknownBlockSetError,
+)
+from web.services.blocks.descriptors import DESCRIPTOR_NAMES
+from web.services.blocks.set_loader import load_block_set
+from web.services.design.combinatoric import DEFAULT_CHUNK_SIZE
+from web.services.design.registry import FALSE_VALUES
+from web.services.design.sharding import DEFAULT_LIBRARY_DIR, generation_status
+from web.services.library.properties import (
+    PADDING,
+    build_property_engine,
+    format_properties,
+)
 
 dashboard_bp: Blueprint = Blueprint("dashboard", __name__)
 
 ALLOWED_EXTENSIONS: Set[str] = {"csv", "xlsx", "txt"}
 
+# Generated libraries are named by a digest of their design arguments
+LIBRARY_ID_PATTERN = re.compile(r"[0-9a-f]{16}")
+
 
 def allowed_file(filename: str) -> bool:
     """Check if the file extension is allowed.
@@ -69,7 +91,7 @@ def dashboard() -> Any:
     stats = {
         "peptides_count": 0,  # Total number of peptides in library
         "building_blocks_count": 0,  # Number of unique building blocks
-        "properties_count": 0,  # Number of calculated/measured properties
+        "properties_count": len(DESCRIPTOR_NAMES),  # Calculated block properties
         "recent_projects": [],  # List of recent projects
     }
 
@@ -143,29 +165,77 @@ def upload_library() -> Any:
     return redirect(url_for("dashboard.index"))
 
 
+def _read_members(
+    path: str, lookup: Dict[str, int], separator: str
+) -> Iterator[np.ndarray]:
+    """Read the members of a library CSV as chunks of block indices.
+
+    Args:
+        path: The library CSV path.
+        lookup: The block index of each code.
+        separator: The separator between block codes.
+
+    Yields:
+        Integer arrays of block indices, padded with -1 for shorter members.
+    """
+    with open(path, newline="") as handle:
+        rows = csv.reader(handle)
+        next(rows, None)
+        while True:
+            sequences = [
+                row[0].split(separator) for row in islice(rows, DEFAULT_CHUNK_SIZE)
+            ]
+            if not sequences:
+                return
+            chunk = np.full((len(sequences), max(map(len, sequences))), PADDING)
+            for i, sequence in enumerate(sequences):
+                chunk[i, : len(sequence)] = [lookup[code] for code in sequence]
+            yield chunk
+
+
 @dashboard_bp.route("/save-library")
 def save_library() -> Any:
-    """Handle library file download.
+    """Download a generated library with its peptide properties.
+
+    ``library_id`` names a completed library generation, spelled with the
+    blocks of ``set`` joined by ``separator``. Each peptide is written with
+    its formula, masses and descriptor totals, head-to-tail cyclized with
+    ``cyclic``.
 
     Returns:
-        File download response
+        Streamed CSV file download, or a redirect with an error message
     """
+    library_id = request.args.get("library_id", "")
+    set_name = request.args.get("set", "canonical")
+    separator = request.args.get("separator", "-")
+    cyclic = request.args.get("cyclic", "false").strip().lower() not in FALSE_VALUES
+    if (
+        not LIBRARY_ID_PATTERN.fullmatch(library_id)
+        or generation_status(library_id)[0] != "complete"
+    ):
+        flash("No generated library to save", "error")
+        return redirect(url_for("dashboard.index"))
+    path = os.path.join(DEFAULT_LIBRARY_DIR, f"{library_id}.csv")
     try:
-        # TODO: Get the current library data from your state/database
-        # This is a placeholder that creates a sample CSV
-        output = io.StringIO()
-        writer = csv.writer(output)
-        writer.writerow(["Sequence", "MW", "LogP"])  # Headers
-        writer.writerow(["ACDEFGH", "823.32", "1.23"])  # Sample data
-
-        # Create the response
-        output.seek(0)
-        return send_file(
-            io.BytesIO(output.getvalue().encode("utf-8")),
-            mimetype="text/csv",
-            as_attachment=True,
-            download_name="peptide_library.csv",
-        )
-    except Exception as e:
-        flash(f"Error saving library: {str(e)}", "error")
+        set_codes = load_block_set(set_name).codes.tolist()
+        lookup = {code: index for index, code in enumerate(set_codes)}
+        # A first pass checks every code and finds the blocks in use, so a
+        # library is not refused for an unused block with an invalid SMILES
+        used = set()
+        for chunk in _read_members(path, lookup, separator):
+            used.update(np.unique(chunk).tolist())
+        codes = [set_codes[index] for index in sorted(used - {PADDING})]
+        engine = build_property_engine(set_name, codes)
+    except KeyError as error:
+        flash(f"Unknown block code in library: {error.args[0]}", "error")
+        return redirect(url_for("dashboard.index"))
+    except (InvalidSmilesError, UnknownBlockSetError) as error:
+        flash(f"Error saving library: {error.message}", "error")
         return redirect(url_for("dashboard.index"))
+    lookup = {code: index for index, code in enumerate(codes)}
+    chunks = format_properties(
+        _read_members(path, lookup, separator), codes, engine, separator, cyclic
+    )
+    response = Response(stream_with_context(chunks), mimetype="text/csv")
+    response.headers["Content-Disposition"] = "attachment; filename=peptide_library.csv"
+    return response
@@ -10,17 +10,59 @@ Classes:
 Functions:
     design: Render the design hub page
     handle_design: Handle specific design type routes
+    design_parameters: Get the parameter schema of a design method
+    handle_design_method: Handle specific design method routes
+    combinatoric_size: Get the exact size of a combinatorial library
+    combinatoric_export: Stream a combinatorial library as CSV
+    combinatoric_member: Get a combinatorial library member by rank
+    combinatoric_generate: Start generating a combinatorial library to disk
+    library_status: Get the status or file of a generated library
+    genetic_run: Run a genetic design strategy
+    mcmc_run: Sample peptides by parallel-tempering MCMC
+    space_filling_export: Export an evenly spread sample of a library along a
+        space-filling curve
+    substitution_export: Stream a library grown from substitution rules as CSV
+    random_export: Export a randomly sampled library as CSV
     upload_blocks: Handle building blocks file upload
     explore_blocks: Render the building blocks explorer page
     save_blocks: Handle building blocks export
 """
 
 # Standard Library Imports
-from typing import Any, Dict, Set
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Set,
+    Tuple,
+)
+import hashlib
+import json
+import math
+import os
+import re
+import secrets
+import tempfile
 
 # External Imports
-from flask import Blueprint, render_template, request, flash, redirect, url_for
+from flask import (
+    Blueprint,
+    Response,
+    render_template,
+    request,
+    flash,
+    jsonify,
+    redirect,
+    send_file,
+    stream_with_context,
+    url_for,
+)
 from werkzeug.utils import secure_filename
+import numpy as np
 
 # Internal Imports
 from peplab.frontend.src.infrastructure.states.design_state import DesignState
@@ -31,28 +73,63 @@ from peplab.frontend.src.infrastructure.orchestrator import (
     ApplicationOrchestrator,
     ApplicationContext,
 )
+from web.core.exceptions.blocks_exceptions import (
+    InvalidSmilesError,
+    UnknownBlockSetError,
+)
+from web.core.exceptions.design_exceptions import (
+    InvalidDesignError,
+    LibraryGenerationError,
+)
+from web.services.blocks.descriptors import DescriptorTable, get_descriptor_table
+from web.services.blocks.set_loader import BLOCK_SET_FILES, load_block_set
+from web.services.blocks.similarity import get_similarity_index
+from web.services.design.combinatoric import (
+    CombinatoricDesign,
+    counted_size,
+    enumerate_library,
+    format_library,
+    format_members,
+    library_size,
+)
+from web.services.design.constraints import (
+    Constraints,
+    CountLimit,
+    PropertyBound,
+    position_sets_from_labels,
+)
+from web.services.design.ranking import (
+    check_range,
+    enumerate_range,
+    is_ranked,
+    sample,
+    unrank,
+)
+from web.services.design.registry import DESIGN_METHODS
+from web.services.design.sharding import (
+    DEFAULT_LIBRARY_DIR,
+    design_fingerprint,
+    generate_in_background,
+    generate_library,
+    generation_status,
+)
+from web.services.jobs.scheduler import running_in_job
+from web.services.library.properties import build_property_engine, format_properties
+
+# Engine modules are imported on first use, through the design registry
+if TYPE_CHECKING:
+    from web.services.design.diversity import MinHashDiversity
 
 design_bp = Blueprint("design", __name__)
 
-# Design method descriptions
-METHOD_DESCRIPTIONS: Dict[str, str] = {
-    "combinatoric": "Generate a peptide library using combinatorial methods",
-    "generative": "Generate a peptide library using generative AI models",
-    "genetic": "Generate a peptide library through simulated evolution using genetic algorithms",
-    "mcmc": "Generate a peptide library using Markov Chain Monte Carlo sampling",
-    "fractal": "Generate a peptide library using fractal-based patterns",
-    "random": "Generate a peptide library using random sampling",
-}
-
-# Display names for methods
-DISPLAY_NAMES: Dict[str, str] = {
-    "combinatoric": "Combinatorial",
-    "generative": "Generative AI",
-    "genetic": "Genetic Algorithm",
-    "mcmc": "Markov Chain Monte Carlo",
-    "fractal": "Fractal-Based",
-    "random": "Random Sampling",
-}
+# Generated libraries are named by a digest of their design arguments
+LIBRARY_ID_PATTERN = re.compile(r"[0-9a-f]{16}")
+
+# Reservoir sampling streams the whole library, so larger unranked
+# libraries are only sampled by background jobs
+MAX_RESERVOIR_LIBRARY_SIZE = 10_000_000
+# MCMC runs of more chain moves than this are only run by background jobs
+MAX_INTERACTIVE_MCMC_MOVES = 10_000_000
 
 
 @design_bp.route("/")
@@ -68,8 +145,8 @@ def design() -> Any:
 
     return render_template(
         "design/design.html",
-        method_descriptions=METHOD_DESCRIPTIONS,
-        display_names=DISPLAY_NAMES,
+        method_descriptions=DESIGN_METHODS.descriptions(),
+        display_names=DESIGN_METHODS.display_names(),
     )
 
 
@@ -94,22 +171,30 @@ def handle_design(design_type: str) -> Any:
         else:
             state_manager.current_state.substate = design_enum
 
-        # Return the appropriate template based on design type
-        if design_type == "combinatoric":
-            return render_template("design/combinatoric.html")
-        elif design_type == "genetic":
-            return render_template("design/genetic.html")
-        elif design_type == "mcmc":
-            return render_template("design/mcmc.html")
-        elif design_type == "fractal":
-            return render_template("design/fractal.html")
-        elif design_type == "generative":
-            return render_template("design/generative.html")
-        return render_template("coming_soon.html")
+        method = DESIGN_METHODS.get(design_type.lower())
+        if method is None:
+            return render_template("coming_soon.html")
+        return render_template(method.template)
     except ValueError:
         return "Invalid design type", 404
 
 
+@design_bp.route("/<design_type>/parameters")
+def design_parameters(design_type: str) -> Any:
+    """Get the parameter schema of a design method.
+
+    Args:
+        design_type: The type of design
+
+    Returns:
+        JSON with the method's strategies and parameters
+    """
+    method = DESIGN_METHODS.get(design_type.lower())
+    if method is None:
+        return jsonify({"error": f"Unknown design method: {design_type}"}), 404
+    return jsonify(method.schema())
+
+
 @design_bp.route("/<design_type>/<method>")
 def handle_design_method(design_type: str, method: str) -> Any:
     """Handle specific design method routes.
@@ -127,14 +212,817 @@ def handle_design_method(design_type: str, method: str) -> Any:
             return render_template(
                 "design/method_base.html",
                 method_type=method,
-                display_names=DISPLAY_NAMES,
-                method_descriptions=METHOD_DESCRIPTIONS,
+                display_names=DESIGN_METHODS.display_names(),
+                method_descriptions=DESIGN_METHODS.descriptions(),
             )
         return render_template("coming_soon.html")
     except ValueError:
         return "Invalid method", 404
 
 
+def _codes_to_indices(codes: str, lookup: Dict[str, int]) -> np.ndarray:
+    """Resolve a comma-separated list of block codes to block indices.
+
+    Args:
+        codes: The comma-separated block codes.
+        lookup: The block index of each code.
+
+    Returns:
+        The block indices, in the given order.
+
+    Raises:
+        InvalidDesignError: If a code is not in the block set.
+    """
+    indices: List[int] = []
+    for code in filter(None, (code.strip() for code in codes.split(","))):
+        if code not in lookup:
+            raise InvalidDesignError(f"Unknown block code: {code}")
+        indices.append(lookup[code])
+    return np.asarray(indices, dtype=np.int64)
+
+
+def _parse_bound(argument: str, table: DescriptorTable, length: int) -> PropertyBound:
+    """Parse a ``name:lower:upper`` property bound argument.
+
+    Args:
+        argument: The bound argument; either limit may be empty.
+        table: The descriptor table of the selected blocks.
+        length: The member length.
+
+    Returns:
+        The property bound.
+
+    Raises:
+        InvalidDesignError: If the argument is malformed.
+    """
+    try:
+        name, lower, upper = argument.split(":")
+        values = table.position_contributions(name, length)
+        return PropertyBound(
+            values,
+            float(lower) if lower else -math.inf,
+            float(upper) if upper else math.inf,
+        )
+    except ValueError:
+        raise InvalidDesignError(f"Invalid property bound: {argument}")
+
+
+def _parse_limit(argument: str, lookup: Dict[str, int], length: int) -> CountLimit:
+    """Parse a ``codes:max`` or ``codes:min:max`` block count limit argument.
+
+    Args:
+        argument: The limit argument, with comma-separated block codes.
+        lookup: The block index of each code.
+        length: The member length, which caps the maximum count.
+
+    Returns:
+        The block count limit.
+
+    Raises:
+        InvalidDesignError: If the argument is malformed.
+    """
+    codes, *counts = argument.split(":")
+    if len(counts) not in (1, 2) or not all(count.isdigit() for count in counts):
+        raise InvalidDesignError(f"Invalid block count limit: {argument}")
+    min_count = int(counts[0]) if len(counts) == 2 else 0
+    max_count = min(int(counts[-1]), length)
+    return CountLimit(_codes_to_indices(codes, lookup), max_count, min_count)
+
+
+def _combinatoric_design(method: str) -> Tuple[CombinatoricDesign, List[str]]:
+    """Build a combinatorial library design from the request arguments.
+
+    The request selects a block set with ``set``, the member length with
+    ``length`` and optionally a subset of blocks with ``codes``. Cartesian
+    designs take the blocks of each position from the set's position column,
+    or from ``positions`` as semicolon-separated groups of comma-separated
+    codes. Designs may be constrained with repeated ``bound`` arguments on
+    descriptors, as ``name:lower:upper``, and ``limit`` arguments on block
+    counts, as ``codes:max`` or ``codes:min:max``.
+
+    Args:
+        method: The combinatoric method.
+
+    Returns:
+        The library design and the code of each of its blocks.
+
+    Raises:
+        InvalidDesignError: If the arguments do not describe a library.
+        UnknownBlockSetError: If the block set does not exist.
+    """
+    set_name = request.args.get("set", "canonical")
+    if set_name not in BLOCK_SET_FILES:
+        raise UnknownBlockSetError(f"Unknown block set: {set_name}")
+    block_set = load_block_set(set_name)
+    # Compiled sets hold string columns that only take an int or a slice,
+    # so columns are decoded to lists before selecting blocks
+    set_codes = block_set.codes.tolist()
+    lookup = {code: index for index, code in enumerate(set_codes)}
+
+    selected = np.arange(len(block_set), dtype=np.int64)
+    if request.args.get("codes"):
+        selected = _codes_to_indices(request.args["codes"], lookup)
+    codes = [set_codes[index] for index in selected]
+    local = {code: index for index, code in enumerate(codes)}
+
+    length = request.args.get("length", type=int)
+    position_sets = None
+    if method == "cartesian" and request.args.get("positions"):
+        position_sets = [
+            _codes_to_indices(group, local)
+            for group in request.args["positions"].split(";")
+        ]
+        length = length or len(position_sets)
+    elif method == "cartesian" and length:
+        set_positions = block_set.positions.tolist()
+        labels = [set_positions[index] for index in selected]
+        position_sets = position_sets_from_labels(labels, length)
+
+    constraints = None
+    bounds = request.args.getlist("bound")
+    limits = request.args.getlist("limit")
+    if (bounds or limits) and length:
+        table = get_descriptor_table(set_name)
+        table = DescriptorTable(
+            table.names, table.values[selected], table.couplings[selected]
+        )
+        constraints = Constraints(
+            [_parse_bound(bound, table, length) for bound in bounds],
+            [_parse_limit(limit, local, length) for limit in limits],
+        )
+    return (
+        CombinatoricDesign(method, len(codes), length or 0, position_sets, constraints),
+        codes,
+    )
+
+
+def _format_output(
+    chunks: Iterable[np.ndarray],
+    codes: List[str],
+    set_name: str,
+    separator: str,
+    properties: bool,
+) -> Iterator[str]:
+    """Format library members as CSV, with their properties if requested.
+
+    Args:
+        chunks: Integer arrays of block indices into codes.
+        codes: The code of each block, all in the block set.
+        set_name: The block set name.
+        separator: The separator between block codes.
+        properties: Whether to write each member's properties.
+
+    Returns:
+        The CSV text chunks.
+
+    Raises:
+        UnknownBlockSetError: If the block set does not exist.
+        InvalidSmilesError: If a block's SMILES cannot be used for properties.
+    """
+    if not properties:
+        return format_members(chunks, codes, separator)
+    engine = build_property_engine(set_name, codes)
+    return format_properties(chunks, codes, engine, separator)
+
+
+@design_bp.route("/combinatoric/<method>/size")
+def combinatoric_size(method: str) -> Any:
+    """Get the exact size of a combinatorial library.
+
+    Args:
+        method: The combinatoric method
+
+    Returns:
+        JSON with the library size, or for constrained permutations, which
+        cannot be counted quickly, a null size and an upper bound
+    """
+    try:
+        design, _ = _combinatoric_design(method)
+        size = counted_size(design)
+    except (InvalidDesignError, UnknownBlockSetError) as error:
+        return jsonify({"error": error.message}), 400
+    result = {
+        "method": method,
+        "length": design.length,
+        "blocks": design.n_blocks,
+        "size": size,
+    }
+    if size is None:
+        result["upper_bound"] = math.perm(design.n_blocks, design.length)
+    return jsonify(result)
+
+
+@design_bp.route("/combinatoric/<method>/export")
+def combinatoric_export(method: str) -> Any:
+    """Stream a combinatorial library as CSV.
+
+    A ``start`` and ``stop`` rank export a slice of the library, to resume
+    an interrupted export or to split one across workers. With
+    ``properties``, each member is written with its formula, masses and
+    descriptor totals.
+
+    Args:
+        method: The combinatoric method
+
+    Returns:
+        Streamed CSV file download
+    """
+    start = request.args.get("start", 0, type=int)
+    stop = request.args.get("stop", type=int)
+    separator = request.args.get("separator", "-")
+    try:
+        design, codes = _combinatoric_design(method)
+        if start or stop is not None:
+            stop = check_range(design, start, stop)
+        size = counted_size(design)
+        if DESIGN_METHODS.get("combinatoric").parse(request.args)["properties"]:
+            members = (
+                enumerate_range(design, start, stop)
+                if start or stop is not None
+                else enumerate_library(design)
+            )
+            engine = build_property_engine(request.args.get("set", "canonical"), codes)
+            chunks = format_properties(members, codes, engine, separator)
+        else:
+            chunks = format_library(design, codes, separator, start=start, stop=stop)
+    except (InvalidDesignError, InvalidSmilesError, UnknownBlockSetError) as error:
+        return jsonify({"error": error.message}), 400
+    response = Response(stream_with_context(chunks), mimetype="text/csv")
+    response.headers["Content-Disposition"] = (
+        f"attachment; filename={method}_library.csv"
+    )
+    if size is not None:
+        response.headers["X-Library-Size"] = str(size)
+    return response
+
+
+@design_bp.route("/combinatoric/<method>/member/<int:rank>")
+def combinatoric_member(method: str, rank: int) -> Any:
+    """Get a combinatorial library member by rank.
+
+    Args:
+        method: The combinatoric method
+        rank: The rank of the member in the library
+
+    Returns:
+        JSON with the member's block indices and sequence
+    """
+    try:
+        design, codes = _combinatoric_design(method)
+        member = unrank(design, rank).tolist()
+        size = library_size(design)
+    except (InvalidDesignError, UnknownBlockSetError) as error:
+        return jsonify({"error": error.message}), 400
+    separator = request.args.get("separator", "-")
+    return jsonify(
+        {
+            "rank": rank,
+            "size": size,
+            "blocks": member,
+            "sequence": separator.join(codes[block] for block in member),
+        }
+    )
+
+
+@design_bp.route("/combinatoric/<method>/generate", methods=["POST"])
+def combinatoric_generate(method: str) -> Any:
+    """Start generating a combinatorial library to disk.
+
+    The library is generated by a process pool in the background. Launching
+    the same design again returns the same library instead of restarting it.
+    Run as a background job, the library is generated before responding.
+
+    Args:
+        method: The combinatoric method
+
+    Returns:
+        JSON with the library id, size and status URL
+    """
+    try:
+        design, codes = _combinatoric_design(method)
+        size = counted_size(design)
+    except (InvalidDesignError, UnknownBlockSetError) as error:
+        return jsonify({"error": error.message}), 400
+    separator = request.args.get("separator", "-")
+    library_id = design_fingerprint(design, codes, separator)[:16]
+    status = 202
+    if running_in_job():
+        # The job's worker exits once it responds, taking any thread with it
+        os.makedirs(DEFAULT_LIBRARY_DIR, exist_ok=True)
+        output = os.path.join(DEFAULT_LIBRARY_DIR, f"{library_id}.csv")
+        try:
+            generate_library(design, codes, output, separator)
+        except LibraryGenerationError as error:
+            return jsonify({"error": error.message}), 500
+        status = 200
+    else:
+        generate_in_background(library_id, design, codes, separator)
+    return (
+        jsonify(
+            {
+                "id": library_id,
+                "size": size,
+                "status_url": url_for("design.library_status", library_id=library_id),
+            }
+        ),
+        status,
+    )
+
+
+@design_bp.route("/libraries/<library_id>")
+def library_status(library_id: str) -> Any:
+    """Get the status or file of a generated library.
+
+    Args:
+        library_id: The id returned when the generation started
+
+    Returns:
+        The library CSV once complete, otherwise JSON with its status
+    """
+    if not LIBRARY_ID_PATTERN.fullmatch(library_id):
+        return jsonify({"error": "Invalid library id"}), 404
+    status, error = generation_status(library_id)
+    if status == "unknown":
+        return jsonify({"error": "Unknown library"}), 404
+    if status == "complete" and request.args.get("download"):
+        return send_file(
+            os.path.join(DEFAULT_LIBRARY_DIR, f"{library_id}.csv"),
+            mimetype="text/csv",
+            as_attachment=True,
+            download_name=f"{library_id}.csv",
+        )
+    return jsonify({"id": library_id, "status": status, "error": error})
+
+
+def _diversity_engine(
+    params: Dict[str, Any], set_name: str, n_blocks: int
+) -> Optional["MinHashDiversity"]:
+    """Build the feature diversity engine requested by the arguments.
+
+    Args:
+        params: The parsed genetic design arguments
+        set_name: The name of the block set
+        n_blocks: The number of blocks in the set
+
+    Returns:
+        The diversity engine, or None for Hamming distance
+
+    Raises:
+        InvalidDesignError: If the representation or its settings are invalid
+    """
+    from web.services.design.diversity import MinHashDiversity
+
+    representation = params["representation"]
+    if representation == "hamming":
+        return None
+    fingerprints = None
+    if representation == "fingerprint":
+        fingerprints = get_similarity_index(set_name).fingerprints
+    return MinHashDiversity(
+        n_blocks,
+        representation,
+        k=params["kmer"],
+        fingerprints=fingerprints,
+        num_perm=params["num_perm"],
+        bands=params["bands"],
+    )
+
+
+@design_bp.route("/genetic/<strategy>/run", methods=["POST"])
+def genetic_run(strategy: str) -> Any:
+    """Run a genetic design strategy.
+
+    The request selects a block set with ``set``, the member length with
+    ``length`` and the members per library with ``library_size``. The
+    population_size, generations, mutation_rate and seed arguments control
+    the run. The property strategy optimizes the descriptor ``property``,
+    towards ``target`` if given, otherwise up or down by ``maximize``. The
+    mass strategy resolves members ``tolerance_ppm`` apart, counting
+    ``isotopes`` heavy isotope peaks per member. The diversity strategy
+    compares members by Hamming distance, or by Tanimoto distance between
+    their ``kmer`` k-mers or block fingerprints when ``representation`` is
+    kmer or fingerprint, with ``num_perm`` and ``bands`` MinHash settings.
+
+    Args:
+        strategy: The genetic strategy
+
+    Returns:
+        JSON with the best library and the fitness history
+    """
+    try:
+        run_strategy = DESIGN_METHODS.runner("genetic", strategy)
+        from web.services.design.genetic import GeneticConfig
+
+        params = DESIGN_METHODS.get("genetic").parse(request.args)
+        set_name, length = params["set"], params["length"]
+        if set_name not in BLOCK_SET_FILES:
+            raise UnknownBlockSetError(f"Unknown block set: {set_name}")
+        if length < 1:
+            raise InvalidDesignError("length must be positive")
+        if params["tolerance_ppm"] <= 0:
+            raise InvalidDesignError("tolerance_ppm must be positive")
+        if params["isotopes"] < 0:
+            raise InvalidDesignError("isotopes must not be negative")
+        config = GeneticConfig(
+            population_size=params["population_size"],
+            generations=params["generations"],
+            mutation_rate=params["mutation_rate"],
+            seed=params["seed"],
+        )
+        block_set = load_block_set(set_name)
+        table = get_descriptor_table(set_name)
+        name = params["property"]
+        if strategy == "mass":
+            name = "monoisotopic_mass"
+        if name not in table.names:
+            raise InvalidDesignError(f"Unknown property: {name}")
+        contributions = table.position_contributions(name, length)
+        position_sets = [
+            blocks[np.isfinite(contributions[position, blocks])]
+            for position, blocks in enumerate(
+                position_sets_from_labels(block_set.positions.tolist(), length)
+            )
+        ]
+        diversity = None
+        if strategy == "diversity":
+            diversity = _diversity_engine(params, set_name, len(block_set))
+        members = params["library_size"]
+        if members is None:
+            members = 1 if strategy == "property" else 20
+        result = run_strategy(
+            strategy,
+            position_sets,
+            members,
+            config,
+            contributions=contributions,
+            n_blocks=len(block_set),
+            target=params["target"],
+            maximize=params["maximize"],
+            tolerance_ppm=params["tolerance_ppm"],
+            isotopes=params["isotopes"],
+            diversity=diversity,
+        )
+    except (InvalidDesignError, UnknownBlockSetError) as error:
+        return jsonify({"error": error.message}), 400
+
+    separator = params["separator"]
+    members = result.best.reshape(-1, length)
+    codes = block_set.codes.tolist()
+    return jsonify(
+        {
+            "strategy": strategy,
+            "library": [
+                separator.join(codes[block] for block in member) for member in members
+            ],
+            "best_fitness": result.best_fitness,
+            "best_history": result.best_history,
+            "mean_history": result.mean_history,
+        }
+    )
+
+
+@design_bp.route("/mcmc/run", methods=["POST"])
+def mcmc_run() -> Any:
+    """Sample peptides by parallel-tempering MCMC.
+
+    The request selects a block set with ``set`` and the descriptor
+    ``property``, sampled towards ``target`` if given, otherwise up or down
+    by ``maximize``. Sequences are min_length to max_length blocks long.
+    The chains, temperatures, t_min, t_max, steps, swap_interval, criterion
+    and seed arguments control the run, and ``moves`` holds the comma
+    separated point, swap and insertion weights. Samples stream through a
+    store that skips ``burn_in`` steps and keeps statistics every ``thin``
+    steps; the unique sequences visited become a library. Runs of more
+    than MAX_INTERACTIVE_MCMC_MOVES chain moves must run as a background
+    job.
+
+    Returns:
+        JSON with the best sequence, the final chains, the run diagnostics
+        and the id of the library of unique samples
+    """
+    from web.services.design.mcmc import MCMCConfig, property_energy, property_sum
+    from web.services.design.mcmc_store import (
+        METADATA_SUFFIX,
+        SampleStore,
+        write_samples_csv,
+    )
+
+    ParallelTempering = DESIGN_METHODS.runner("mcmc", "parallel-tempering")
+    args = request.args
+    try:
+        params = DESIGN_METHODS.get("mcmc").parse(args)
+        set_name = params["set"]
+        if set_name not in BLOCK_SET_FILES:
+            raise UnknownBlockSetError(f"Unknown block set: {set_name}")
+        try:
+            moves = tuple(float(weight) for weight in params["moves"].split(","))
+        except ValueError:
+            raise InvalidDesignError("moves must be comma separated weights")
+        config = MCMCConfig(
+            chains=params["chains"],
+            temperatures=params["temperatures"],
+            t_min=params["t_min"],
+            t_max=params["t_max"],
+            steps=params["steps"],
+            min_length=params["min_length"],
+            max_length=params["max_length"],
+            move_weights=moves,
+            swap_interval=params["swap_interval"],
+            criterion=params["criterion"],
+            seed=params["seed"],
+        )
+        moves_run = config.steps * config.chains * config.temperatures
+        if moves_run > MAX_INTERACTIVE_MCMC_MOVES and not running_in_job():
+            raise InvalidDesignError(
+                f"Runs of more than {MAX_INTERACTIVE_MCMC_MOVES} chain moves "
+                "can only run as a background job"
+            )
+        block_set = load_block_set(set_name)
+        table = get_descriptor_table(set_name)
+        name = params["property"]
+        if name not in table.names:
+            raise InvalidDesignError(f"Unknown property: {name}")
+        column = table.names.index(name)
+        values, couplings = table.values[:, column], table.couplings[:, column]
+        energy = property_energy(
+            values,
+            couplings,
+            target=params["target"],
+            maximize=params["maximize"],
+        )
+        blocks = np.flatnonzero(np.isfinite(values) & np.isfinite(couplings))
+        total = property_sum(values, couplings)
+
+        def properties(sequences: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+            return total(sequences, lengths)[:, None]
+
+        # Unseeded runs differ, so each gets its own library
+        nonce = secrets.token_hex(8) if config.seed is None else None
+        arguments = json.dumps(["mcmc", params, nonce], sort_keys=True, default=str)
+        library_id = hashlib.sha256(arguments.encode()).hexdigest()[:16]
+        samples_path = os.path.join(DEFAULT_LIBRARY_DIR, f"{library_id}.samples")
+        # Concurrent runs of one library each write their own store
+        os.makedirs(DEFAULT_LIBRARY_DIR, exist_ok=True)
+        fd, run_path = tempfile.mkstemp(dir=DEFAULT_LIBRARY_DIR, suffix=".samples.tmp")
+        os.close(fd)
+        try:
+            with SampleStore(
+                run_path,
+                len(block_set),
+                config.max_length,
+                config.chains,
+                burn_in=params["burn_in"],
+                thin=params["thin"],
+                properties=properties,
+                property_names=(name,),
+            ) as store:
+                result = ParallelTempering(blocks, energy, config).run(
+                    callback=store, keep_trace=False
+                )
+        except BaseException:
+            for path in (run_path, run_path + METADATA_SUFFIX):
+                if os.path.exists(path):
+                    os.unlink(path)
+            raise
+    except (InvalidDesignError, UnknownBlockSetError) as error:
+        return jsonify({"error": error.message}), 400
+
+    separator = params["separator"]
+    codes = block_set.codes.tolist()
+    fd, tmp_path = tempfile.mkstemp(dir=DEFAULT_LIBRARY_DIR, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", newline="") as handle:
+            write_samples_csv(run_path, handle, codes, separator)
+        os.replace(run_path + METADATA_SUFFIX, samples_path + METADATA_SUFFIX)
+        os.replace(run_path, samples_path)
+        os.replace(tmp_path, os.path.join(DEFAULT_LIBRARY_DIR, f"{library_id}.csv"))
+    except BaseException:
+        for path in (tmp_path, run_path, run_path + METADATA_SUFFIX):
+            if os.path.exists(path):
+                os.unlink(path)
+        raise
+    return jsonify(
+        {
+            "best": separator.join(codes[block] for block in result.best),
+            "best_energy": result.best_energy,
+            "sequences": [
+                separator.join(codes[block] for block in sequence[:length])
+                for sequence, length in zip(result.sequences, result.lengths)
+            ],
+            "energies": result.energies.tolist(),
+            "acceptance": result.acceptance.tolist(),
+            "swap_acceptance": result.swap_acceptance.tolist(),
+            "temperatures": result.temperatures.tolist(),
+            "summary": store.summary(),
+            "library_id": library_id,
+            "library_url": url_for("design.library_status", library_id=library_id),
+        }
+    )
+
+
+@design_bp.route("/fractal/space-filling/export")
+def space_filling_export() -> Any:
+    """Export an evenly spread sample of a library along a space-filling curve.
+
+    The library is described like a cartesian (or, with ``method``, n-ary)
+    combinatorial library. Each position's blocks are ordered by the
+    descriptor ``property``, and ``size`` points are drawn along the
+    ``curve``, hilbert or zorder, jittered with ``seed``. With
+    ``properties``, each member is written with its properties.
+
+    Returns:
+        CSV file download of the sampled members in curve order
+    """
+    space_filling_sample = DESIGN_METHODS.runner("fractal", "space-filling")
+    try:
+        params = DESIGN_METHODS.get("fractal").parse(request.args)
+        design, codes = _combinatoric_design(params["method"])
+        set_name = params["set"]
+        table = get_descriptor_table(set_name)
+        name = params["property"]
+        if name not in table.names:
+            raise InvalidDesignError(f"Unknown property: {name}")
+        lookup = {
+            code: index
+            for index, code in enumerate(load_block_set(set_name).codes.tolist())
+        }
+        values = table.column(name)[[lookup[code] for code in codes]]
+        members = space_filling_sample(
+            design,
+            values,
+            params["size"],
+            curve=params["curve"],
+            seed=params["seed"],
+        )
+        chunks = _format_output(
+            [members], codes, set_name, params["separator"], params["properties"]
+        )
+    except (InvalidDesignError, InvalidSmilesError, UnknownBlockSetError) as error:
+        return jsonify({"error": error.message}), 400
+    response = Response(chunks, mimetype="text/csv")
+    response.headers["Content-Disposition"] = (
+        "attachment; filename=space_filling_library.csv"
+    )
+    return response
+
+
+@design_bp.route("/fractal/<strategy>/export")
+def substitution_export(strategy: str) -> Any:
+    """Stream a library grown from substitution rules as CSV.
+
+    ``rules`` holds the rules as ``lhs -> rhs | rhs``, separated by
+    semicolons or newlines. Self-similar rules rewrite block codes from an
+    ``axiom`` for ``depth`` generations, and the library is the distinct
+    windows of ``length`` blocks of the final word. Recursive rules rewrite
+    nonterminals from ``start`` up to ``depth`` deep, and the library is the
+    distinct sequences of ``min_length`` to ``max_length`` blocks. With
+    ``properties``, each member is written with its properties.
+
+    Args:
+        strategy: The substitution strategy
+
+    Returns:
+        Streamed CSV file download
+    """
+    try:
+        expand = DESIGN_METHODS.runner("fractal", strategy)
+        from web.services.design.substitution import (
+            ExpansionGraph,
+            parse_rules,
+            recursive_library,
+            self_similar_library,
+        )
+
+        params = DESIGN_METHODS.get("fractal").parse(request.args)
+        set_name = params["set"]
+        if set_name not in BLOCK_SET_FILES:
+            raise UnknownBlockSetError(f"Unknown block set: {set_name}")
+        codes = load_block_set(set_name).codes.tolist()
+        lookup = {code: index for index, code in enumerate(codes)}
+        rules = parse_rules(params["rules"])
+        depth, size = params["depth"], params["size"]
+        if strategy == "self-similar":
+            graph = ExpansionGraph()
+            axiom = (params["axiom"] or next(iter(rules))).split()
+            word = expand(graph, rules, axiom, depth, lookup)
+            length = 10 if params["length"] is None else params["length"]
+            chunks = self_similar_library(graph, word, length, size)
+        else:
+            max_length = params["max_length"]
+            graph = ExpansionGraph(max_length=max(max_length, 1))
+            start = params["start"] or next(iter(rules))
+            language = expand(graph, rules, start, depth, lookup)
+            chunks = recursive_library(
+                graph, language, params["min_length"], max_length, size
+            )
+        rows = _format_output(
+            chunks, codes, set_name, params["separator"], params["properties"]
+        )
+    except (InvalidDesignError, InvalidSmilesError, UnknownBlockSetError) as error:
+        return jsonify({"error": error.message}), 400
+    response = Response(stream_with_context(rows), mimetype="text/csv")
+    response.headers["Content-Disposition"] = (
+        f"attachment; filename={strategy}_library.csv"
+    )
+    return response
+
+
+def _block_weights(argument: str, lookup: Dict[str, int]) -> np.ndarray:
+    """Parse comma-separated ``code:weight`` pairs into block weights.
+
+    Args:
+        argument: The weight pairs; blocks not listed weigh 1.
+        lookup: The block index of each code.
+
+    Returns:
+        The weight of each block.
+
+    Raises:
+        InvalidDesignError: If a pair is malformed or a code is unknown.
+    """
+    weights = np.ones(len(lookup))
+    for pair in filter(None, (pair.strip() for pair in argument.split(","))):
+        code, _, weight = pair.rpartition(":")
+        if code not in lookup:
+            raise InvalidDesignError(f"Unknown block code: {code or pair}")
+        try:
+            weights[lookup[code]] = float(weight)
+        except ValueError:
+            raise InvalidDesignError(f"Invalid weight: {pair}")
+    return weights
+
+
+@design_bp.route("/random/<mode>/export")
+def random_export(mode: str) -> Any:
+    """Export a randomly sampled library as CSV.
+
+    In draw mode, ``size`` distinct members of ``length`` blocks are drawn
+    from the block set ``set``. Each position draws from the blocks its
+    position label allows, weighted by ``weights`` as comma-separated
+    ``code:weight`` pairs. In reservoir mode, ``size`` members are taken
+    uniformly from a combinatorial library of ``method``, described and
+    constrained as for the combinatoric exports. Unconstrained libraries
+    of a ranked method are sampled by rank; others are streamed through a
+    reservoir, outside a job only up to MAX_RESERVOIR_LIBRARY_SIZE members.
+    With ``properties``, each member is written with its properties.
+
+    Args:
+        mode: The sampling mode
+
+    Returns:
+        CSV file download
+    """
+    try:
+        sampler = DESIGN_METHODS.runner("random", mode)
+        params = DESIGN_METHODS.get("random").parse(request.args)
+        size, seed = params["size"], params["seed"]
+        if mode == "reservoir":
+            design, codes = _combinatoric_design(params["method"])
+            reservoir = sampler(size, seed)
+            if is_ranked(design):
+                chunks = [sample(design, min(size, library_size(design)), seed)]
+            else:
+                upper_bound = counted_size(design)
+                if upper_bound is None:
+                    upper_bound = math.perm(design.n_blocks, design.length)
+                if upper_bound > MAX_RESERVOIR_LIBRARY_SIZE and not running_in_job():
+                    raise InvalidDesignError(
+                        f"Libraries of more than {MAX_RESERVOIR_LIBRARY_SIZE} "
+                        "members can only be sampled as a background job"
+                    )
+                for chunk in enumerate_library(design):
+                    reservoir.add(chunk)
+                chunks = [reservoir.members()]
+        else:
+            set_name = params["set"]
+            if set_name not in BLOCK_SET_FILES:
+                raise UnknownBlockSetError(f"Unknown block set: {set_name}")
+            block_set = load_block_set(set_name)
+            codes = block_set.codes.tolist()
+            length = 10 if params["length"] is None else params["length"]
+            if length < 1:
+                raise InvalidDesignError("length must be positive")
+            lookup = {code: index for index, code in enumerate(codes)}
+            weights = _block_weights(params["weights"], lookup)
+            position_weights = np.zeros((length, len(codes)))
+            position_sets = position_sets_from_labels(
+                block_set.positions.tolist(), length
+            )
+            for position, blocks in enumerate(position_sets):
+                position_weights[position, blocks] = weights[blocks]
+            chunks = sampler(position_weights, seed).sample(size)
+        rows = _format_output(
+            chunks, codes, params["set"], params["separator"], params["properties"]
+        )
+    except (InvalidDesignError, InvalidSmilesError, UnknownBlockSetError) as error:
+        return jsonify({"error": error.message}), 400
+    response = Response(stream_with_context(rows), mimetype="text/csv")
+    response.headers["Content-Disposition"] = (
+        f"attachment; filename=random_{mode}_library.csv"
+    )
+    return response
+
+
 @design_bp.route("/upload-blocks", methods=["POST"])
 def upload_blocks() -> Any:
     """Handle building blocks file upload.
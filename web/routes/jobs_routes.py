@@ -0,0 +1,194 @@
+# web/routes/jobs_routes.py
+"""
+Module for background job routes.
+
+This module contains the routes that submit design, optimization and
+modeling requests as background jobs and report on them, so long runs do
+not hold a request thread and can be followed from any page.
+
+Functions:
+    submit_job: Queue a design, optimization or modeling request as a job
+    list_jobs: List background jobs
+    job_status: Get the status of a background job
+    cancel_job: Cancel a queued or running job
+    job_result: Download the result of a complete job
+"""
+
+# Standard Library Imports
+from typing import Any, List, Tuple
+import mimetypes
+import re
+
+# External Imports
+from flask import Blueprint, current_app, jsonify, request, send_file, url_for
+
+# Internal Imports
+from web.core.exceptions.job_exceptions import InvalidJobError, UnknownJobError
+from web.services.jobs.scheduler import (
+    JobScheduler,
+    get_job_scheduler,
+    result_path,
+)
+from web.services.jobs.store import COMPLETE, Job
+
+jobs_bp = Blueprint("jobs", __name__)
+
+# Job ids are random 64-bit hex strings
+JOB_ID_PATTERN = re.compile(r"[0-9a-f]{16}")
+MAX_LIST_SIZE = 1000
+
+
+def _scheduler() -> JobScheduler:
+    """Get the job scheduler of the current application."""
+    return get_job_scheduler(current_app._get_current_object())
+
+
+def _describe(job: Job) -> dict:
+    """Describe a job with the URLs of its status and result."""
+    return {
+        **job.to_dict(),
+        "status_url": url_for("jobs.job_status", job_id=job.id),
+        "result_url": url_for("jobs.job_result", job_id=job.id),
+    }
+
+
+def _job_args(args: Any) -> List[Tuple[str, str]]:
+    """Flatten request arguments given as a JSON object into pairs.
+
+    Args:
+        args: The arguments, mapping names to a value or a list of values
+
+    Returns:
+        The (name, value) pairs
+
+    Raises:
+        InvalidJobError: If the arguments are not an object of scalars
+    """
+    if not isinstance(args, dict):
+        raise InvalidJobError("args must be an object")
+    pairs = []
+    for name, values in args.items():
+        for value in values if isinstance(values, list) else [values]:
+            if isinstance(value, (dict, list)) or value is None:
+                raise InvalidJobError(f"Invalid value for argument {name}")
+            if isinstance(value, bool):
+                value = str(value).lower()
+            pairs.append((name, str(value)))
+    return pairs
+
+
+@jobs_bp.route("/", methods=["POST"])
+def submit_job() -> Any:
+    """Queue a design, optimization or modeling request as a job.
+
+    The JSON body holds the route's URL ``path``, the HTTP ``method`` (GET
+    by default), the request ``args`` as an object, where repeated
+    arguments take a list, and an integer ``priority``; higher priorities
+    run first.
+
+    Returns:
+        JSON with the queued job and its status and result URLs
+    """
+    body = request.get_json(silent=True) or {}
+    try:
+        if not isinstance(body.get("path"), str):
+            raise InvalidJobError("path is required")
+        try:
+            priority = int(body.get("priority", 0))
+        except (TypeError, ValueError):
+            raise InvalidJobError("priority must be an integer")
+        job = _scheduler().submit(
+            body["path"],
+            str(body.get("method", "GET")),
+            _job_args(body.get("args", {})),
+            priority,
+        )
+    except InvalidJobError as error:
+        return jsonify({"error": error.message}), 400
+    return jsonify(_describe(job)), 202
+
+
+@jobs_bp.route("/")
+def list_jobs() -> Any:
+    """List background jobs.
+
+    Returns:
+        JSON with the newest jobs, optionally only those with ``status``
+    """
+    limit = min(request.args.get("limit", 100, type=int), MAX_LIST_SIZE)
+    try:
+        jobs = _scheduler().store.list(request.args.get("status"), limit)
+    except InvalidJobError as error:
+        return jsonify({"error": error.message}), 400
+    return jsonify({"jobs": [_describe(job) for job in jobs]})
+
+
+@jobs_bp.route("/<job_id>")
+def job_status(job_id: str) -> Any:
+    """Get the status of a background job.
+
+    Args:
+        job_id: The id returned when the job was submitted
+
+    Returns:
+        JSON with the job
+    """
+    if not JOB_ID_PATTERN.fullmatch(job_id):
+        return jsonify({"error": "Invalid job id"}), 404
+    try:
+        job = _scheduler().store.get(job_id)
+    except UnknownJobError as error:
+        return jsonify({"error": error.message}), 404
+    return jsonify(_describe(job))
+
+
+@jobs_bp.route("/<job_id>/cancel", methods=["POST"])
+def cancel_job(job_id: str) -> Any:
+    """Cancel a queued or running job.
+
+    Args:
+        job_id: The id returned when the job was submitted
+
+    Returns:
+        JSON with the cancelled job
+    """
+    if not JOB_ID_PATTERN.fullmatch(job_id):
+        return jsonify({"error": "Invalid job id"}), 404
+    try:
+        job = _scheduler().cancel(job_id)
+    except UnknownJobError as error:
+        return jsonify({"error": error.message}), 404
+    except InvalidJobError as error:
+        return jsonify({"error": error.message}), 409
+    return jsonify(_describe(job))
+
+
+@jobs_bp.route("/<job_id>/result")
+def job_result(job_id: str) -> Any:
+    """Download the result of a complete job.
+
+    Args:
+        job_id: The id returned when the job was submitted
+
+    Returns:
+        The route's response body, or JSON with the status of a job that
+        has not completed
+    """
+    if not JOB_ID_PATTERN.fullmatch(job_id):
+        return jsonify({"error": "Invalid job id"}), 404
+    scheduler = _scheduler()
+    try:
+        job = scheduler.store.get(job_id)
+    except UnknownJobError as error:
+        return jsonify({"error": error.message}), 404
+    if job.status != COMPLETE:
+        error = job.error or f"Job is {job.status}"
+        return jsonify({**_describe(job), "error": error}), 409
+    mimetype = job.mimetype or "application/octet-stream"
+    download_name = job.filename or job_id + (mimetypes.guess_extension(mimetype) or "")
+    return send_file(
+        result_path(scheduler.job_dir, job_id),
+        mimetype=mimetype,
+        as_attachment=job.filename is not None,
+        download_name=download_name,
+    )
@@ -16,6 +16,9 @@ from typing import Any, Dict
 # External Imports
 from flask import Blueprint, render_template, redirect, url_for
 
+# Internal Imports
+from web.services.blocks.descriptors import DESCRIPTOR_NAMES
+
 main_bp = Blueprint("main", __name__)
 
 
@@ -40,7 +43,7 @@ def dashboard() -> Any:
     stats: Dict[str, int] = {
         "peptides_count": 0,  # Total number of peptides in library
         "building_blocks_count": 0,  # Number of unique building blocks
-        "properties_count": 0,  # Number of calculated/measured properties
+        "properties_count": len(DESCRIPTOR_NAMES),  # Calculated block properties
         "recent_projects_count": 0,  # Number of recent projects
     }
 
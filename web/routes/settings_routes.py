@@ -25,6 +25,7 @@ import torch
 
 # Internal Imports
 from peplab.frontend.src.infrastructure.managers.state_manager import StateManager
+from web.services.compute_settings import ComputeSettings
 
 settings_bp = Blueprint("settings", __name__)
 
@@ -44,7 +45,10 @@ def settings() -> Any:
     )
 
     return render_template(
-        "settings/settings.html", num_cpus=num_cpus, gpu_available=gpu_available
+        "settings/settings.html",
+        num_cpus=num_cpus,
+        gpu_available=gpu_available,
+        max_threads=ComputeSettings().max_threads,
     )
 
 
@@ -65,9 +69,13 @@ def save_general() -> Any:
 def save_compute() -> Any:
     """Save computation settings."""
     try:
-        # TODO: Save settings to configuration
         max_threads = request.form.get("max_threads")
         gpu_enabled = request.form.get("gpu_enabled") == "on"
+        # Worker pools pick up the new thread count on their next use
+        ComputeSettings().update(
+            max_threads=int(max_threads) if max_threads else None,
+            gpu_enabled=gpu_enabled,
+        )
         flash("Computation settings saved successfully", "success")
     except Exception as e:
         flash(f"Error saving settings: {str(e)}", "error")
@@ -0,0 +1,4 @@
+# web/services/__init__.py
+"""
+This package contains the computational services used by the routes.
+"""
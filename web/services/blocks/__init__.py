@@ -0,0 +1,5 @@
+# web/services/blocks/__init__.py
+"""
+This package contains the services for loading, depicting and searching
+building block sets.
+"""
@@ -0,0 +1,92 @@
+# web/services/blocks/coupling.py
+"""
+This module contains the amide coupling helpers for building blocks.
+
+Blocks are coupled by forming an amide bond between the carbonyl C of one
+block and the amine N of the next, removing the acid's hydroxyl.
+
+Functions:
+    backbone_sites: Find the atoms of a building block that form amide bonds.
+    assemble_peptide: Couple building blocks into one RDKit molecule.
+"""
+
+# Standard Library Imports
+from typing import List, Sequence, Tuple
+
+# External Imports
+from rdkit import Chem
+
+# Internal Imports
+from web.core.exceptions.blocks_exceptions import InvalidSmilesError
+
+# Backbone of an alpha amino acid or peptoid monomer: amine N, alpha C,
+# carbonyl C, carbonyl O and hydroxyl O of the acid
+ALPHA_BACKBONE = Chem.MolFromSmarts("[NX3;!H0;!$(NC=O)][CX4][CX3](=O)[OX2H1]")
+AMINE = Chem.MolFromSmarts("[NX3;!H0;!$(NC=O)]")
+ACID = Chem.MolFromSmarts("[CX3](=O)[OX2H1]")
+
+
+def backbone_sites(mol: Chem.Mol) -> Tuple[int, int, int]:
+    """Find the atoms of a building block that form amide bonds.
+
+    The alpha backbone is preferred; otherwise the first free amine and the
+    first carboxylic acid are used.
+
+    Args:
+        mol: The building block molecule.
+
+    Returns:
+        The indices of the amine N, the carbonyl C and the hydroxyl O.
+
+    Raises:
+        InvalidSmilesError: If the block has no amine or carboxylic acid.
+    """
+    match = mol.GetSubstructMatch(ALPHA_BACKBONE)
+    if match:
+        return match[0], match[2], match[4]
+    amine, acid = mol.GetSubstructMatch(AMINE), mol.GetSubstructMatch(ACID)
+    if not amine or not acid:
+        raise InvalidSmilesError(
+            f"No amine and carboxylic acid to couple in: {Chem.MolToSmiles(mol)}"
+        )
+    return amine[0], acid[0], acid[2]
+
+
+def assemble_peptide(mols: Sequence[Chem.Mol], cyclic: bool = False) -> Chem.Mol:
+    """Couple building blocks into one RDKit molecule.
+
+    Args:
+        mols: The building block molecules, N- to C-terminus.
+        cyclic: Whether to cyclize the peptide head-to-tail.
+
+    Returns:
+        The peptide molecule.
+
+    Raises:
+        InvalidSmilesError: If a block has no amine or carboxylic acid.
+    """
+    combined = Chem.Mol()
+    sites: List[Tuple[int, int, int]] = []
+    for mol in mols:
+        offset = combined.GetNumAtoms()
+        n, c, o = backbone_sites(mol)
+        sites.append((n + offset, c + offset, o + offset))
+        combined = Chem.CombineMols(combined, mol)
+
+    peptide = Chem.RWMol(combined)
+    links = list(zip(sites[:-1], sites[1:]))
+    if cyclic and len(sites) > 1:
+        links.append((sites[-1], sites[0]))
+
+    removed = []
+    for (_, carbonyl, hydroxyl), (amine, _, _) in links:
+        peptide.AddBond(carbonyl, amine, Chem.BondType.SINGLE)
+        atom = peptide.GetAtomWithIdx(amine)
+        if atom.GetNumExplicitHs():
+            atom.SetNumExplicitHs(atom.GetNumExplicitHs() - 1)
+        removed.append(hydroxyl)
+    for index in sorted(removed, reverse=True):
+        peptide.RemoveAtom(index)
+
+    Chem.SanitizeMol(peptide)
+    return peptide.GetMol()
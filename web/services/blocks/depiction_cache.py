@@ -0,0 +1,465 @@
+# web/services/blocks/depiction_cache.py
+"""
+This module contains the content-addressed depiction cache for building blocks.
+
+Depictions are keyed by the canonical SMILES of the block plus the render
+options. Rendered images are kept in an in-memory LRU and in an on-disk store
+that survives restarts and is shared by every worker process on the host. The
+mapping from the SMILES as written in a set file to its content key is cached
+as well, so a warm lookup does no RDKit work at all.
+
+Classes:
+    RenderOptions: The options used to render a depiction.
+    Depiction: A rendered depiction.
+    LRUCache: A thread-safe, size-bounded LRU cache.
+    DepictionStore: The on-disk, content-addressed depiction store.
+    DepictionCache: The two-level depiction cache.
+
+Functions:
+    canonicalize_smiles: Canonicalize a SMILES string with RDKit.
+    render_depiction: Render a canonical SMILES to image bytes.
+    get_depiction_cache: Get the process-wide depiction cache.
+"""
+
+# Standard Library Imports
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from typing import Any, Optional
+import hashlib
+import json
+import os
+import tempfile
+import threading
+
+# External Imports
+from rdkit import Chem, rdBase
+from rdkit.Chem.Draw import rdMolDraw2D
+
+# Internal Imports
+from web.core.exceptions.blocks_exceptions import InvalidSmilesError
+
+DEFAULT_CACHE_DIR: str = os.environ.get(
+    "PEPLAB_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "peplab")
+)
+DEFAULT_MEMORY_BYTES: int = 64 * 1024 * 1024
+
+MIMETYPES = {"png": "image/png", "svg": "image/svg+xml"}
+
+
+@dataclass(frozen=True)
+class RenderOptions:
+    """The options used to render a depiction.
+
+    Attributes:
+        fmt: The image format, either "png" or "svg".
+        width: The image width in pixels.
+        height: The image height in pixels.
+    """
+
+    fmt: str = "png"
+    width: int = 300
+    height: int = 300
+
+    def __post_init__(self) -> None:
+        """Validate the image format."""
+        if self.fmt not in MIMETYPES:
+            raise ValueError(f"Unsupported depiction format: {self.fmt}")
+
+    @property
+    def mimetype(self) -> str:
+        """The MIME type of images rendered with these options."""
+        return MIMETYPES[self.fmt]
+
+    def fingerprint(self) -> str:
+        """Return a string that uniquely identifies the rendered output.
+
+        The RDKit version is included because a different drawing backend
+        can produce different bytes for the same molecule.
+        """
+        return f"{self.fmt}:{self.width}x{self.height}:rdkit-{rdBase.rdkitVersion}"
+
+
+@dataclass(frozen=True)
+class Depiction:
+    """A rendered depiction.
+
+    Attributes:
+        key: The content key of the depiction.
+        fmt: The image format.
+        data: The image bytes.
+    """
+
+    key: str
+    fmt: str
+    data: bytes
+
+    @property
+    def mimetype(self) -> str:
+        """The MIME type of the depiction."""
+        return MIMETYPES[self.fmt]
+
+
+def _digest(*parts: str) -> str:
+    """Hash the given parts into a hex digest."""
+    return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+
+def canonicalize_smiles(smiles: str) -> str:
+    """Canonicalize a SMILES string with RDKit.
+
+    Args:
+        smiles: The SMILES string to canonicalize.
+
+    Returns:
+        The canonical SMILES string.
+
+    Raises:
+        InvalidSmilesError: If RDKit cannot parse the SMILES string.
+    """
+    mol = Chem.MolFromSmiles(smiles)
+    if mol is None:
+        raise InvalidSmilesError(f"Invalid SMILES: {smiles}")
+    return Chem.MolToSmiles(mol)
+
+
+def render_depiction(canonical_smiles: str, options: RenderOptions) -> bytes:
+    """Render a canonical SMILES to image bytes.
+
+    Args:
+        canonical_smiles: The canonical SMILES string to render.
+        options: The render options.
+
+    Returns:
+        The image bytes.
+
+    Raises:
+        InvalidSmilesError: If RDKit cannot parse the SMILES string.
+    """
+    mol = Chem.MolFromSmiles(canonical_smiles)
+    if mol is None:
+        raise InvalidSmilesError(f"Invalid SMILES: {canonical_smiles}")
+
+    if options.fmt == "svg":
+        drawer = rdMolDraw2D.MolDraw2DSVG(options.width, options.height)
+    else:
+        drawer = rdMolDraw2D.MolDraw2DCairo(options.width, options.height)
+    rdMolDraw2D.PrepareAndDrawMolecule(drawer, mol)
+    drawer.FinishDrawing()
+
+    data = drawer.GetDrawingText()
+    return data.encode("utf-8") if isinstance(data, str) else data
+
+
+class LRUCache:
+    """A thread-safe LRU cache bounded by the total size of its values.
+
+    Attributes:
+        max_bytes: The maximum total size of the cached values.
+
+    Methods:
+        get: Get a value and mark it as recently used.
+        put: Insert a value, evicting the least recently used entries.
+        clear: Remove every entry.
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_MEMORY_BYTES) -> None:
+        """Initialize the LRU cache.
+
+        Args:
+            max_bytes: The maximum total size of the cached values.
+        """
+        self.max_bytes: int = max_bytes
+        self._entries: "OrderedDict[str, Any]" = OrderedDict()
+        self._sizes: dict = {}
+        self._total: int = 0
+        self._lock: threading.Lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional[Any]:
+        """Get a value and mark it as recently used.
+
+        Args:
+            key: The key to look up.
+
+        Returns:
+            The cached value, or None if the key is not cached.
+        """
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def put(self, key: str, value: Any, size: int = 1) -> None:
+        """Insert a value, evicting the least recently used entries.
+
+        Args:
+            key: The key to insert.
+            value: The value to insert.
+            size: The size of the value in bytes.
+        """
+        with self._lock:
+            if key in self._entries:
+                self._total -= self._sizes[key]
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            self._sizes[key] = size
+            self._total += size
+            while self._total > self.max_bytes and len(self._entries) > 1:
+                old_key, _ = self._entries.popitem(last=False)
+                self._total -= self._sizes.pop(old_key)
+
+    def clear(self) -> None:
+        """Remove every entry."""
+        with self._lock:
+            self._entries.clear()
+            self._sizes.clear()
+            self._total = 0
+
+
+class DepictionStore:
+    """The on-disk, content-addressed depiction store.
+
+    Files are written to a temporary name and atomically renamed into place,
+    so concurrent writers in different processes never expose partial files.
+
+    Attributes:
+        root: The root directory of the store.
+
+    Methods:
+        path_for: Get the path of a depiction file.
+        read: Read a depiction.
+        write: Write a depiction.
+        read_alias: Read the content key for a SMILES alias.
+        write_alias: Write the content key for a SMILES alias.
+    """
+
+    def __init__(self, root: str) -> None:
+        """Initialize the depiction store.
+
+        Args:
+            root: The root directory of the store.
+        """
+        self.root: str = root
+
+    def path_for(self, key: str, suffix: str) -> str:
+        """Get the path of a depiction file.
+
+        Args:
+            key: The content key.
+            suffix: The file suffix.
+
+        Returns:
+            The path of the file.
+        """
+        return os.path.join(self.root, key[:2], f"{key}.{suffix}")
+
+    def _read(self, path: str) -> Optional[bytes]:
+        try:
+            with open(path, "rb") as handle:
+                return handle.read()
+        except FileNotFoundError:
+            return None
+
+    def _write(self, path: str, data: bytes) -> None:
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as handle:
+                handle.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+    def read(self, key: str, fmt: str) -> Optional[bytes]:
+        """Read a depiction.
+
+        Args:
+            key: The content key.
+            fmt: The image format.
+
+        Returns:
+            The image bytes, or None if the depiction is not stored.
+        """
+        return self._read(self.path_for(key, fmt))
+
+    def write(self, key: str, fmt: str, data: bytes) -> None:
+        """Write a depiction.
+
+        Args:
+            key: The content key.
+            fmt: The image format.
+            data: The image bytes.
+        """
+        self._write(self.path_for(key, fmt), data)
+
+    def read_alias(self, alias: str) -> Optional[str]:
+        """Read the content key for a SMILES alias.
+
+        Args:
+            alias: The alias digest.
+
+        Returns:
+            The content key, or None if the alias is not stored.
+        """
+        data = self._read(self.path_for(alias, "alias"))
+        return data.decode("ascii") if data is not None else None
+
+    def write_alias(self, alias: str, key: str) -> None:
+        """Write the content key for a SMILES alias.
+
+        Args:
+            alias: The alias digest.
+            key: The content key.
+        """
+        self._write(self.path_for(alias, "alias"), key.encode("ascii"))
+
+
+class DepictionCache:
+    """The two-level depiction cache.
+
+    Attributes:
+        store: The on-disk depiction store.
+        memory: The in-memory LRU of rendered depictions.
+        aliases: The in-memory LRU of SMILES aliases to content keys.
+
+    Methods:
+        key_for: Get the content key for a SMILES string.
+        get: Get the depiction for a SMILES string, rendering it on a miss.
+        get_by_key: Get a depiction by its content key, rendering it on a miss.
+        has_key: Check whether a content key can be served in a format.
+    """
+
+    def __init__(
+        self,
+        root: Optional[str] = None,
+        max_memory_bytes: int = DEFAULT_MEMORY_BYTES,
+    ) -> None:
+        """Initialize the depiction cache.
+
+        Args:
+            root: The root directory of the on-disk store.
+            max_memory_bytes: The size bound of the in-memory LRU.
+        """
+        self.store: DepictionStore = DepictionStore(
+            root or os.path.join(DEFAULT_CACHE_DIR, "depictions")
+        )
+        self.memory: LRUCache = LRUCache(max_memory_bytes)
+        self.aliases: LRUCache = LRUCache(max_memory_bytes // 64)
+
+    def key_for(self, smiles: str, options: RenderOptions = RenderOptions()) -> str:
+        """Get the content key for a SMILES string.
+
+        The SMILES string is only canonicalized the first time it is seen on
+        this host; afterwards the key is served from the alias caches.
+
+        Args:
+            smiles: The SMILES string, as written in the set file.
+            options: The render options.
+
+        Returns:
+            The content key.
+        """
+        alias = _digest("alias", smiles, options.fingerprint())
+        key = self.aliases.get(alias)
+        if key is not None:
+            return key
+
+        key = self.store.read_alias(alias)
+        if key is None:
+            canonical = canonicalize_smiles(smiles)
+            key = _digest(canonical, options.fingerprint())
+            # The manifest lets any worker render the depiction from its key
+            manifest = {"smiles": canonical, **asdict(options)}
+            self.store.write(key, "json", json.dumps(manifest).encode("utf-8"))
+            self.store.write_alias(alias, key)
+        self.aliases.put(alias, key, len(alias) + len(key))
+        return key
+
+    def get(self, smiles: str, options: RenderOptions = RenderOptions()) -> Depiction:
+        """Get the depiction for a SMILES string, rendering it on a miss.
+
+        Args:
+            smiles: The SMILES string, as written in the set file.
+            options: The render options.
+
+        Returns:
+            The depiction.
+        """
+        depiction = self.get_by_key(self.key_for(smiles, options), options.fmt)
+        if depiction is None:
+            raise InvalidSmilesError(f"No depiction manifest for SMILES: {smiles}")
+        return depiction
+
+    def get_by_key(self, key: str, fmt: str) -> Optional[Depiction]:
+        """Get a depiction by its content key, rendering it on a miss.
+
+        Args:
+            key: The content key.
+            fmt: The image format.
+
+        Returns:
+            The depiction, or None if the key is unknown or was issued for a
+            different format.
+        """
+        depiction = self.memory.get(f"{key}.{fmt}")
+        if depiction is not None:
+            return depiction
+
+        data = self.store.read(key, fmt)
+        if data is None:
+            manifest = self.store.read(key, "json")
+            if manifest is None:
+                return None
+            fields = json.loads(manifest)
+            options = RenderOptions(fields["fmt"], fields["width"], fields["height"])
+            if options.fmt != fmt:
+                return None
+            data = render_depiction(fields["smiles"], options)
+            self.store.write(key, fmt, data)
+
+        depiction = Depiction(key, fmt, data)
+        self.memory.put(f"{key}.{fmt}", depiction, len(data))
+        return depiction
+
+    def has_key(self, key: str, fmt: str) -> bool:
+        """Check whether a content key can be served in a format.
+
+        Nothing is rendered: the key is known if its depiction is cached or
+        stored, or its manifest was issued for the format.
+
+        Args:
+            key: The content key.
+            fmt: The image format.
+
+        Returns:
+            True if get_by_key would return a depiction.
+        """
+        if self.memory.get(f"{key}.{fmt}") is not None:
+            return True
+        if os.path.exists(self.store.path_for(key, fmt)):
+            return True
+        manifest = self.store.read(key, "json")
+        return manifest is not None and json.loads(manifest)["fmt"] == fmt
+
+
+_cache: Optional[DepictionCache] = None
+_cache_lock: threading.Lock = threading.Lock()
+
+
+def get_depiction_cache() -> DepictionCache:
+    """Get the process-wide depiction cache.
+
+    Returns:
+        The depiction cache.
+    """
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = DepictionCache()
+        return _cache
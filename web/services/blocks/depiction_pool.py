@@ -0,0 +1,257 @@
+# web/services/blocks/depiction_pool.py
+"""
+This module contains the process-pool depiction engine for large building
+block sets.
+
+SMILES are split into chunks that are rendered in parallel worker processes.
+Results are streamed back in input order while only a bounded number of
+chunks is in flight, so rendering never blocks a request thread and memory
+does not grow with the size of the set.
+
+Classes:
+    DepictionPool: The process-pool depiction engine.
+
+Functions:
+    get_depiction_pool: Get the process-wide depiction pool.
+"""
+
+# Standard Library Imports
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from itertools import islice
+from typing import Deque, Dict, Iterable, Iterator, List, Optional, Sequence, Set
+import threading
+
+# Internal Imports
+from web.core.exceptions.blocks_exceptions import InvalidSmilesError
+from web.services.blocks.depiction_cache import (
+    DepictionCache,
+    RenderOptions,
+    canonicalize_smiles,
+    render_depiction,
+)
+from web.services.compute_settings import ComputeSettings
+
+DEFAULT_CHUNK_SIZE: int = 64
+
+
+def _render_chunk(smiles: List[str], options: RenderOptions) -> List[Optional[bytes]]:
+    """Render a chunk of SMILES in a worker process.
+
+    Args:
+        smiles: The canonical SMILES strings to render.
+        options: The render options.
+
+    Returns:
+        The image bytes for each SMILES, or None where RDKit failed.
+    """
+    images: List[Optional[bytes]] = []
+    for item in smiles:
+        try:
+            images.append(render_depiction(item, options))
+        except InvalidSmilesError:
+            images.append(None)
+    return images
+
+
+class DepictionPool:
+    """The process-pool depiction engine.
+
+    Attributes:
+        max_workers: The number of worker processes.
+        chunk_size: The number of SMILES rendered per task.
+
+    Methods:
+        render: Render SMILES in parallel, yielding images in input order.
+        warm: Render every depiction of a set that is missing from a cache.
+        warm_in_background: Warm a cache from a background thread.
+        retire: Shut down the worker processes once running renders end.
+        shutdown: Shut down the worker processes.
+    """
+
+    def __init__(
+        self, max_workers: Optional[int] = None, chunk_size: int = DEFAULT_CHUNK_SIZE
+    ) -> None:
+        """Initialize the depiction pool.
+
+        Args:
+            max_workers: The number of worker processes. Defaults to the
+                max_threads compute setting.
+            chunk_size: The number of SMILES rendered per task.
+        """
+        self.max_workers: int = max_workers or ComputeSettings().max_threads
+        self.chunk_size: int = chunk_size
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock: threading.Lock = threading.Lock()
+        # Renders in progress, and whether the pool closes once they end
+        self._active: int = 0
+        self._retired: bool = False
+        self._warming: Set[str] = set()
+        # The SMILES each name was last warmed from, so a set is warmed once
+        # per load rather than once per request
+        self._warmed: Dict[str, Sequence[str]] = {}
+
+    def _acquire(self) -> ProcessPoolExecutor:
+        """Get the executor for a render, starting it if needed."""
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            self._active += 1
+            return self._executor
+
+    def _release(self) -> None:
+        """End a render, closing a retired pool after its last one."""
+        with self._lock:
+            self._active -= 1
+            if self._retired and not self._active and self._executor is not None:
+                self._executor.shutdown(wait=False)
+                self._executor = None
+
+    def render(
+        self, smiles: Iterable[str], options: RenderOptions = RenderOptions()
+    ) -> Iterator[Optional[bytes]]:
+        """Render SMILES in parallel, yielding images in input order.
+
+        Args:
+            smiles: The canonical SMILES strings to render.
+            options: The render options.
+
+        Yields:
+            The image bytes for each SMILES, or None where RDKit failed.
+        """
+        executor = self._acquire()
+        try:
+            iterator = iter(smiles)
+            pending: Deque[Future] = deque()
+            max_pending = 2 * self.max_workers
+
+            while True:
+                while len(pending) < max_pending:
+                    chunk = list(islice(iterator, self.chunk_size))
+                    if not chunk:
+                        break
+                    pending.append(executor.submit(_render_chunk, chunk, options))
+                if not pending:
+                    return
+                yield from pending.popleft().result()
+        finally:
+            self._release()
+
+    def warm(
+        self,
+        cache: DepictionCache,
+        smiles: Iterable[str],
+        options: RenderOptions = RenderOptions(),
+    ) -> int:
+        """Render every depiction of a set that is missing from a cache.
+
+        Args:
+            cache: The depiction cache to fill.
+            smiles: The SMILES strings of the set, as written in the set file.
+            options: The render options.
+
+        Returns:
+            The number of depictions rendered.
+        """
+        missing = {}
+        for item in smiles:
+            try:
+                key = cache.key_for(item, options)
+            except InvalidSmilesError:
+                continue
+            if key not in missing and cache.store.read(key, options.fmt) is None:
+                missing[key] = item
+
+        rendered = 0
+        canonical = (canonicalize_smiles(item) for item in missing.values())
+        for key, data in zip(missing, self.render(canonical, options)):
+            if data is not None:
+                cache.store.write(key, options.fmt, data)
+                rendered += 1
+        return rendered
+
+    def warm_in_background(
+        self,
+        name: str,
+        cache: DepictionCache,
+        smiles: Sequence[str],
+        options: RenderOptions = RenderOptions(),
+    ) -> bool:
+        """Warm a cache from a background thread.
+
+        A name is warmed again only when given a different SMILES column,
+        as when its set is reloaded, so calling this for every request of
+        a set is cheap. The column is read on the background thread.
+
+        Args:
+            name: A name for the work, used to avoid warming a set twice.
+            cache: The depiction cache to fill.
+            smiles: The SMILES column of the set.
+            options: The render options.
+
+        Returns:
+            True if a new warm-up was started.
+        """
+        name = f"{name}:{options.fingerprint()}"
+        with self._lock:
+            if name in self._warming or self._warmed.get(name) is smiles:
+                return False
+            self._warming.add(name)
+            self._warmed[name] = smiles
+
+        def run() -> None:
+            try:
+                self.warm(cache, smiles, options)
+            except BaseException:
+                with self._lock:
+                    if self._warmed.get(name) is smiles:
+                        del self._warmed[name]
+                raise
+            finally:
+                with self._lock:
+                    self._warming.discard(name)
+
+        threading.Thread(target=run, name=f"warm-{name}", daemon=True).start()
+        return True
+
+    def retire(self) -> None:
+        """Shut down the worker processes once running renders end.
+
+        Renders in progress, such as a warm-up, run to completion; the pool
+        shuts down after the last one.
+        """
+        with self._lock:
+            self._retired = True
+            if not self._active and self._executor is not None:
+                self._executor.shutdown(wait=False)
+                self._executor = None
+
+    def shutdown(self) -> None:
+        """Shut down the worker processes, cancelling pending renders."""
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+
+_pool: Optional[DepictionPool] = None
+_pool_lock: threading.Lock = threading.Lock()
+
+
+def get_depiction_pool() -> DepictionPool:
+    """Get the process-wide depiction pool.
+
+    The pool is recreated when the max_threads compute setting changes,
+    and the old pool is retired, so its running warm-ups finish.
+
+    Returns:
+        The depiction pool.
+    """
+    global _pool
+    with _pool_lock:
+        max_workers = ComputeSettings().max_threads
+        if _pool is None or _pool.max_workers != max_workers:
+            if _pool is not None:
+                _pool.retire()
+            _pool = DepictionPool(max_workers)
+        return _pool
@@ -0,0 +1,275 @@
+# web/services/blocks/descriptors.py
+"""
+This module contains the descriptor engine for building blocks.
+
+Descriptors are computed once per distinct canonical SMILES when a set is
+ingested and kept as a column table, one row per block. Compiled sets carry
+the table; for CSV sets it is persisted next to the set file.
+
+All descriptors in the table are additive over amide coupling: the value for
+a peptide is the sum of its blocks' values plus a correction for every block
+whose amine is acylated. Masses lose one water per bond. The other
+corrections depend on the amine (a primary amine keeps an N-H donor, a
+secondary amine such as proline or a peptoid does not), so each block's
+correction is measured once at ingestion by coupling it to glycine with the
+same RDKit descriptors. Peptide-level properties therefore never need the
+full peptide parsed.
+
+Classes:
+    DescriptorTable: The descriptor table of a building block set.
+
+Functions:
+    compute_descriptor_table: Compute the descriptor table for SMILES.
+    descriptor_path: Get the descriptor table file path for a set file.
+    get_descriptor_table: Get the descriptor table of a named set, with caching.
+"""
+
+# Standard Library Imports
+from dataclasses import dataclass
+from typing import Dict, Tuple
+import os
+import tempfile
+import threading
+
+# External Imports
+import numpy as np
+import pandas as pd
+from rdkit import Chem
+from rdkit.Chem import Crippen, Descriptors, Lipinski, rdMolDescriptors
+
+# Internal Imports
+from web.core.exceptions.blocks_exceptions import InvalidSmilesError
+from web.services.blocks.coupling import assemble_peptide
+from web.services.blocks.set_loader import BLOCK_SET_FILES, BlockSet, load_block_set
+
+DESCRIPTOR_NAMES: Tuple[str, ...] = (
+    "mol_wt",
+    "monoisotopic_mass",
+    "clogp",
+    "tpsa",
+    "hbd",
+    "hba",
+    "formal_charge",
+)
+
+# Change of each descriptor per amide bond formed on a primary amine, used
+# for blocks whose own correction cannot be measured
+AMIDE_BOND_CORRECTIONS: Dict[str, float] = {
+    "mol_wt": -18.015,
+    "monoisotopic_mass": -18.010564684,
+    "clogp": 0.0865,
+    "tpsa": -34.22,
+    "hbd": -1.0,
+    "hba": -1.0,
+    "formal_charge": 0.0,
+}
+
+DESCRIPTOR_SUFFIX: str = ".desc.npy"
+
+GLYCINE = Chem.MolFromSmiles("NCC(=O)O")
+
+
+def _descriptors(mol: Chem.Mol) -> Tuple[float, ...]:
+    return (
+        Descriptors.MolWt(mol),
+        Descriptors.ExactMolWt(mol),
+        Crippen.MolLogP(mol),
+        rdMolDescriptors.CalcTPSA(mol),
+        Lipinski.NumHDonors(mol),
+        Lipinski.NumHAcceptors(mol),
+        Chem.GetFormalCharge(mol),
+    )
+
+
+def _coupling(mol: Chem.Mol, values: Tuple[float, ...]) -> np.ndarray:
+    """Measure the descriptor change when a block's amine is acylated."""
+    try:
+        peptide = assemble_peptide([GLYCINE, mol])
+    except InvalidSmilesError:
+        return np.array([AMIDE_BOND_CORRECTIONS[name] for name in DESCRIPTOR_NAMES])
+    return (
+        np.array(_descriptors(peptide))
+        - np.array(values)
+        - np.array(_descriptors(GLYCINE))
+    )
+
+
+@dataclass
+class DescriptorTable:
+    """The descriptor table of a building block set.
+
+    Attributes:
+        names: The descriptor names, one per column.
+        values: The float64 descriptor values, one row per block, NaN where
+            the block's SMILES is invalid.
+        couplings: The float64 change of each descriptor when the block's
+            amine is acylated, one row per block.
+    """
+
+    names: Tuple[str, ...]
+    values: np.ndarray
+    couplings: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def column(self, name: str) -> np.ndarray:
+        """Get one descriptor column.
+
+        Args:
+            name: The descriptor name.
+
+        Returns:
+            The descriptor values, one per block.
+        """
+        return self.values[:, self.names.index(name)]
+
+    def position_contributions(
+        self, name: str, length: int, cyclic: bool = False
+    ) -> np.ndarray:
+        """Get what each block adds to a peptide property at each position.
+
+        The contributions are additive, so a peptide's property is the sum
+        of the contributions of its blocks at their positions.
+
+        Args:
+            name: The descriptor name.
+            length: The peptide length.
+            cyclic: Whether the peptides are head-to-tail cyclized.
+
+        Returns:
+            The contributions, shape (length, n_blocks).
+        """
+        column = self.names.index(name)
+        values = self.values[:, column]
+        contributions = np.tile(values + self.couplings[:, column], (length, 1))
+        if not cyclic:
+            # The N-terminal block keeps its free amine
+            contributions[0] = values
+        return contributions
+
+    def peptide_properties(
+        self, sequences: np.ndarray, cyclic: bool = False
+    ) -> np.ndarray:
+        """Sum per-block contributions into peptide-level properties.
+
+        Args:
+            sequences: An integer array of block indices, shape (length,) for
+                one peptide or (n_peptides, length) for a library, padded
+                with -1 for peptides shorter than the longest one.
+            cyclic: Whether the peptides are head-to-tail cyclized.
+
+        Returns:
+            The properties, shape (n_descriptors,) or (n_peptides, n_descriptors).
+        """
+        sequences = np.asarray(sequences)
+        # Padding gathers an all-zero row past the last block
+        zeros = np.zeros((1, len(self.names)))
+        values = np.vstack([self.values, zeros])
+        couplings = np.vstack([self.couplings, zeros])
+        index = np.where(sequences < 0, len(self), sequences)
+
+        # Every block but the N-terminal one has its amine acylated, plus the
+        # N-terminal one when a peptide of two or more blocks is cyclized
+        acylated = index.copy()
+        acylated[..., 0] = len(self)
+        totals = values[index].sum(axis=-2) + couplings[acylated].sum(axis=-2)
+        if cyclic:
+            closes = (sequences >= 0).sum(axis=-1) > 1
+            totals = totals + np.where(closes[..., None], couplings[index[..., 0]], 0)
+        return totals
+
+
+def compute_descriptor_table(smiles: np.ndarray) -> DescriptorTable:
+    """Compute the descriptor table for SMILES.
+
+    Every distinct SMILES is parsed once, and the values are gathered back
+    into a table with one row per input.
+
+    Args:
+        smiles: The canonical SMILES strings, empty where invalid.
+
+    Returns:
+        The descriptor table.
+    """
+    codes, uniques = pd.factorize(np.asarray(smiles, dtype=object), sort=False)
+    unique_values = np.full((len(uniques), len(DESCRIPTOR_NAMES)), np.nan)
+    unique_couplings = np.full((len(uniques), len(DESCRIPTOR_NAMES)), np.nan)
+    for i, item in enumerate(uniques):
+        mol = Chem.MolFromSmiles(item) if item else None
+        if mol is not None:
+            unique_values[i] = _descriptors(mol)
+            unique_couplings[i] = _coupling(mol, unique_values[i])
+    return DescriptorTable(
+        DESCRIPTOR_NAMES, unique_values[codes], unique_couplings[codes]
+    )
+
+
+def descriptor_path(path: str) -> str:
+    """Get the descriptor table file path for a set file.
+
+    Args:
+        path: The path of the set CSV file.
+
+    Returns:
+        The path of the descriptor table file next to it.
+    """
+    return os.path.splitext(path)[0] + DESCRIPTOR_SUFFIX
+
+
+def _save(path: str, values: np.ndarray) -> None:
+    fd, tmp_path = tempfile.mkstemp(
+        dir=os.path.dirname(os.path.abspath(path)), suffix=".tmp"
+    )
+    try:
+        with os.fdopen(fd, "wb") as handle:
+            np.save(handle, values)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+
+_tables: Dict[str, Tuple[BlockSet, DescriptorTable]] = {}
+_tables_lock: threading.Lock = threading.Lock()
+
+
+def get_descriptor_table(set_name: str) -> DescriptorTable:
+    """Get the descriptor table of a named set, with caching.
+
+    Args:
+        set_name: The name of the set.
+
+    Returns:
+        The descriptor table.
+    """
+    block_set = load_block_set(set_name)
+    with _tables_lock:
+        cached = _tables.get(set_name)
+        if cached is not None and cached[0] is block_set:
+            return cached[1]
+
+    # Stored tables hold the values and the coupling corrections side by side
+    width = len(DESCRIPTOR_NAMES)
+    if block_set.descriptor_names == DESCRIPTOR_NAMES:
+        stacked = block_set.descriptors
+    else:
+        path = BLOCK_SET_FILES[set_name]
+        output = descriptor_path(path)
+        stacked = None
+        if os.path.exists(output) and os.path.getmtime(output) >= os.path.getmtime(
+            path
+        ):
+            stacked = np.load(output, mmap_mode="r")
+            if stacked.shape != (len(block_set), 2 * width):
+                stacked = None
+        if stacked is None:
+            computed = compute_descriptor_table(block_set.canonical_smiles.tolist())
+            stacked = np.hstack([computed.values, computed.couplings])
+            _save(output, stacked)
+    table = DescriptorTable(DESCRIPTOR_NAMES, stacked[:, :width], stacked[:, width:])
+
+    with _tables_lock:
+        _tables[set_name] = (block_set, table)
+    return table
@@ -0,0 +1,101 @@
+# web/services/blocks/fingerprints.py
+"""
+This module contains the fingerprint helpers for building blocks.
+
+Fingerprints are stored packed into uint64 words, one row per block, so that
+whole sets can be screened and compared with NumPy bitwise operations.
+
+Functions:
+    pack_bits: Pack a 0/1 bit array into uint64 words.
+    morgan_fingerprints: Compute packed Morgan fingerprints for SMILES.
+    pattern_fingerprint: Compute the packed pattern fingerprint of a molecule.
+    pattern_fingerprints: Compute packed pattern fingerprints for SMILES.
+"""
+
+# Standard Library Imports
+from typing import Sequence
+
+# External Imports
+import numpy as np
+from rdkit import Chem, DataStructs
+from rdkit.Chem import rdFingerprintGenerator
+
+DEFAULT_RADIUS: int = 2
+DEFAULT_N_BITS: int = 2048
+
+
+def pack_bits(bits: np.ndarray) -> np.ndarray:
+    """Pack a 0/1 bit array into uint64 words.
+
+    Args:
+        bits: An array of shape (..., n_bits) with n_bits a multiple of 64.
+
+    Returns:
+        An array of shape (..., n_bits // 64) with bit i of a row stored in
+        word i // 64 at bit position i % 64.
+    """
+    packed = np.packbits(np.asarray(bits, dtype=np.uint8), axis=-1, bitorder="little")
+    return np.ascontiguousarray(packed).view("<u8")
+
+
+def morgan_fingerprints(
+    smiles: Sequence[str], radius: int = DEFAULT_RADIUS, n_bits: int = DEFAULT_N_BITS
+) -> np.ndarray:
+    """Compute packed Morgan fingerprints for SMILES.
+
+    Args:
+        smiles: The canonical SMILES strings.
+        radius: The Morgan radius.
+        n_bits: The fingerprint length, a multiple of 64.
+
+    Returns:
+        A uint64 array of shape (len(smiles), n_bits // 64). Rows of SMILES
+        that RDKit cannot parse are all zero.
+    """
+    generator = rdFingerprintGenerator.GetMorganGenerator(radius=radius, fpSize=n_bits)
+    bits = np.zeros((len(smiles), n_bits), dtype=np.uint8)
+    for i, item in enumerate(smiles):
+        mol = Chem.MolFromSmiles(item) if item else None
+        if mol is not None:
+            bits[i] = generator.GetFingerprintAsNumPy(mol)
+    return pack_bits(bits)
+
+
+def pattern_fingerprint(mol: Chem.Mol, n_bits: int = DEFAULT_N_BITS) -> np.ndarray:
+    """Compute the packed pattern fingerprint of a molecule.
+
+    Pattern fingerprints are designed for substructure screening: every bit
+    set for a query is also set for any molecule that contains it. SMARTS
+    query molecules are supported.
+
+    Args:
+        mol: The molecule or query molecule.
+        n_bits: The fingerprint length, a multiple of 64.
+
+    Returns:
+        A uint64 array of shape (n_bits // 64,).
+    """
+    bits = np.zeros(n_bits, dtype=np.uint8)
+    DataStructs.ConvertToNumpyArray(Chem.PatternFingerprint(mol, fpSize=n_bits), bits)
+    return pack_bits(bits)
+
+
+def pattern_fingerprints(
+    smiles: Sequence[str], n_bits: int = DEFAULT_N_BITS
+) -> np.ndarray:
+    """Compute packed pattern fingerprints for SMILES.
+
+    Args:
+        smiles: The canonical SMILES strings.
+        n_bits: The fingerprint length, a multiple of 64.
+
+    Returns:
+        A uint64 array of shape (len(smiles), n_bits // 64). Rows of SMILES
+        that RDKit cannot parse are all zero, so they are never candidates.
+    """
+    packed = np.zeros((len(smiles), n_bits // 64), dtype="<u8")
+    for i, item in enumerate(smiles):
+        mol = Chem.MolFromSmiles(item) if item else None
+        if mol is not None:
+            packed[i] = pattern_fingerprint(mol, n_bits)
+    return packed
@@ -0,0 +1,248 @@
+# web/services/blocks/set_loader.py
+"""
+This module contains the column-wise loader for building block sets.
+
+Sets are read with only the columns the app needs and explicit dtypes, their
+SMILES are canonicalized once per unique value, and response records are
+built from column arrays rather than row by row.
+
+Classes:
+    BlockSet: A building block set held as column arrays.
+
+Functions:
+    canonicalize_batch: Canonicalize an array of SMILES strings.
+    read_block_set: Read a building block set file.
+    load_block_set: Load a named building block set, with caching.
+"""
+
+# Standard Library Imports
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import os
+import threading
+
+# External Imports
+import numpy as np
+import pandas as pd
+
+# Internal Imports
+from web.core.exceptions.blocks_exceptions import (
+    InvalidSmilesError,
+    UnknownBlockSetError,
+)
+from web.services.blocks.depiction_cache import canonicalize_smiles
+
+# Map set names to file paths
+BLOCK_SET_FILES: Dict[str, str] = {
+    "canonical": "test_building_blocks.csv",
+}
+
+# Columns read from a set file, mapped to the record field they populate
+BLOCK_SET_COLUMNS: Dict[str, str] = {
+    "name": "name",
+    "alt_name1": "code",
+    "alt_name2": "alt_code",
+    "smiles": "smiles",
+    "position": "position",
+}
+
+
+@dataclass
+class BlockSet:
+    """A building block set held as column arrays.
+
+    Attributes:
+        name: The name of the set.
+        names: The block names.
+        codes: The block codes.
+        alt_codes: The alternative block codes.
+        smiles: The SMILES strings, as written in the set file.
+        positions: The positions each block may occupy.
+        canonical_smiles: The canonical SMILES strings, empty where invalid.
+        descriptors: The descriptor table, one row per block, if compiled.
+        descriptor_names: The names of the descriptor table columns.
+        fingerprints: The packed uint64 fingerprints, one row per block, if
+            compiled.
+    """
+
+    name: str
+    names: np.ndarray
+    codes: np.ndarray
+    alt_codes: np.ndarray
+    smiles: np.ndarray
+    positions: np.ndarray
+    canonical_smiles: np.ndarray
+    descriptors: Optional[np.ndarray] = None
+    descriptor_names: Tuple[str, ...] = ()
+    fingerprints: Optional[np.ndarray] = None
+
+    def __len__(self) -> int:
+        return len(self.smiles)
+
+    def records(
+        self,
+        start: int = 0,
+        stop: Optional[int] = None,
+        image_urls: Optional[Sequence[str]] = None,
+    ) -> List[Dict[str, Any]]:
+        """Build response records for a slice of the set.
+
+        Args:
+            start: The index of the first block.
+            stop: The index after the last block.
+            image_urls: The depiction URL of each block in the slice.
+
+        Returns:
+            The building block records.
+        """
+        window = slice(start, stop)
+        columns = (
+            self.names[window].tolist(),
+            self.codes[window].tolist(),
+            self.alt_codes[window].tolist(),
+            self.smiles[window].tolist(),
+            self.positions[window].tolist(),
+        )
+        records = [
+            {
+                "name": name,
+                "code": code,
+                "alt_code": alt_code,
+                "smiles": smiles,
+                "position": position,
+                "set": self.name,
+            }
+            for name, code, alt_code, smiles, position in zip(*columns)
+        ]
+        if image_urls is not None:
+            for record, image_url in zip(records, image_urls):
+                record["image_url"] = image_url
+        return records
+
+    def records_at(
+        self, indices: Sequence[int], image_urls: Optional[Sequence[str]] = None
+    ) -> List[Dict[str, Any]]:
+        """Build response records for arbitrary blocks of the set.
+
+        Args:
+            indices: The indices of the blocks.
+            image_urls: The depiction URL of each block.
+
+        Returns:
+            The building block records, each with its index in the set.
+        """
+        records = [
+            {
+                "index": index,
+                "name": self.names[index],
+                "code": self.codes[index],
+                "alt_code": self.alt_codes[index],
+                "smiles": self.smiles[index],
+                "position": self.positions[index],
+                "set": self.name,
+            }
+            for index in indices
+        ]
+        if image_urls is not None:
+            for record, image_url in zip(records, image_urls):
+                record["image_url"] = image_url
+        return records
+
+
+def canonicalize_batch(smiles: np.ndarray) -> np.ndarray:
+    """Canonicalize an array of SMILES strings.
+
+    Each distinct SMILES string is parsed once, however often it repeats.
+
+    Args:
+        smiles: The SMILES strings.
+
+    Returns:
+        The canonical SMILES strings, empty where RDKit failed.
+    """
+    codes, uniques = pd.factorize(smiles, sort=False)
+    canonical = np.empty(len(uniques), dtype=object)
+    for i, item in enumerate(uniques):
+        try:
+            canonical[i] = canonicalize_smiles(item)
+        except InvalidSmilesError:
+            canonical[i] = ""
+    return canonical[codes]
+
+
+def read_block_set(path: str, name: str, canonicalize: bool = True) -> BlockSet:
+    """Read a building block set file.
+
+    Args:
+        path: The path of the CSV file.
+        name: The name of the set.
+        canonicalize: Whether to canonicalize the SMILES strings.
+
+    Returns:
+        The building block set.
+    """
+    df = pd.read_csv(
+        path,
+        usecols=list(BLOCK_SET_COLUMNS),
+        dtype={column: str for column in BLOCK_SET_COLUMNS},
+        keep_default_na=False,
+    )
+    smiles = df["smiles"].to_numpy(dtype=object)
+    return BlockSet(
+        name=name,
+        names=df["name"].to_numpy(dtype=object),
+        codes=df["alt_name1"].to_numpy(dtype=object),
+        alt_codes=df["alt_name2"].to_numpy(dtype=object),
+        smiles=smiles,
+        positions=df["position"].to_numpy(dtype=object),
+        canonical_smiles=canonicalize_batch(smiles) if canonicalize else smiles,
+    )
+
+
+_loaded: Dict[str, Tuple[Tuple[str, float], BlockSet]] = {}
+_loaded_lock: threading.Lock = threading.Lock()
+
+
+def load_block_set(set_name: str) -> BlockSet:
+    """Load a named building block set, with caching.
+
+    A compiled set next to the CSV file is memory-mapped in preference to the
+    CSV whenever it is at least as new. The set is re-read only when its file
+    changes on disk.
+
+    Args:
+        set_name: The name of the set.
+
+    Returns:
+        The building block set.
+
+    Raises:
+        UnknownBlockSetError: If the set name is not known.
+    """
+    if set_name not in BLOCK_SET_FILES:
+        raise UnknownBlockSetError(f"Unknown set: {set_name}")
+
+    # Imported here because the set store builds on this module
+    from web.services.blocks.set_store import compiled_path, open_block_set
+
+    path = BLOCK_SET_FILES[set_name]
+    compiled = compiled_path(path)
+    mtime = os.path.getmtime(path)
+    if os.path.exists(compiled) and os.path.getmtime(compiled) >= mtime:
+        path, mtime = compiled, os.path.getmtime(compiled)
+
+    with _loaded_lock:
+        cached = _loaded.get(set_name)
+        if cached is not None and cached[0] == (path, mtime):
+            return cached[1]
+
+    try:
+        block_set = open_block_set(path, set_name) if path == compiled else None
+    except ValueError:
+        # Compiled by an older format version; fall back to the CSV file
+        block_set = None
+    if block_set is None:
+        block_set = read_block_set(BLOCK_SET_FILES[set_name], set_name)
+    with _loaded_lock:
+        _loaded[set_name] = ((path, mtime), block_set)
+    return block_set
@@ -0,0 +1,286 @@
+# web/services/blocks/set_store.py
+"""
+This module contains the precompiled binary format for building block sets.
+
+A set is compiled offline from its CSV into a single columnar file holding
+the names, codes, positions, SMILES, canonical SMILES, descriptors (values
+and amide coupling corrections side by side) and packed fingerprints of
+every block. The app opens the file with mmap, so loading is
+close to free and every worker process on the host shares the same pages.
+
+File layout:
+    magic (4 bytes) | version (uint32) | header length (uint64) | header JSON
+    followed by the column buffers, each aligned to 64 bytes. The header maps
+    every column to the offset, dtype and shape of its buffer. String columns
+    are stored as an int64 offsets buffer plus a UTF-8 data buffer.
+
+Classes:
+    StringColumn: A read-only string column backed by a buffer.
+
+Functions:
+    compiled_path: Get the compiled file path for a set file.
+    compile_block_set: Compile a building block set file.
+    open_block_set: Open a compiled building block set.
+
+Usage:
+    python -m web.services.blocks.set_store <set name or CSV path> [-o OUTPUT]
+"""
+
+# Standard Library Imports
+from typing import Any, BinaryIO, Dict, List, Optional, Sequence, Union
+import argparse
+import json
+import mmap
+import os
+import struct
+import tempfile
+
+# External Imports
+import numpy as np
+
+# Internal Imports
+from web.services.blocks.descriptors import compute_descriptor_table
+from web.services.blocks.fingerprints import (
+    DEFAULT_N_BITS,
+    DEFAULT_RADIUS,
+    morgan_fingerprints,
+)
+from web.services.blocks.set_loader import BLOCK_SET_FILES, BlockSet, read_block_set
+
+MAGIC: bytes = b"PLBS"
+VERSION: int = 3
+ALIGNMENT: int = 64
+COMPILED_SUFFIX: str = ".plbs"
+_PREAMBLE = struct.Struct("<4sIQ")
+
+STRING_COLUMNS: List[str] = [
+    "names",
+    "codes",
+    "alt_codes",
+    "smiles",
+    "positions",
+    "canonical_smiles",
+]
+
+
+class StringColumn:
+    """A read-only string column backed by a buffer.
+
+    Strings are decoded on access, so slicing a column is free and only the
+    rows a request touches are ever materialized.
+
+    Attributes:
+        offsets: The int64 start offset of every string, plus the end offset.
+        data: The UTF-8 bytes of all strings.
+    """
+
+    def __init__(self, offsets: np.ndarray, data: np.ndarray) -> None:
+        """Initialize the string column.
+
+        Args:
+            offsets: The int64 start offset of every string, plus the end offset.
+            data: The UTF-8 bytes of all strings.
+        """
+        self.offsets: np.ndarray = offsets
+        self.data: np.ndarray = data
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index: Union[int, slice]) -> Any:
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step != 1:
+                raise ValueError("StringColumn slices must be contiguous")
+            return StringColumn(self.offsets[start : max(start, stop) + 1], self.data)
+        if index < 0:
+            index += len(self)
+        begin, end = self.offsets[index], self.offsets[index + 1]
+        return self.data[begin:end].tobytes().decode("utf-8")
+
+    def __iter__(self) -> Any:
+        return iter(self.tolist())
+
+    def tolist(self) -> List[str]:
+        """Decode every string in the column.
+
+        Returns:
+            The strings.
+        """
+        if len(self) == 0:
+            return []
+        base, stop = self.offsets[0], self.offsets[-1]
+        blob = self.data[base:stop].tobytes()
+        bounds = (self.offsets - base).tolist()
+        return [
+            blob[begin:end].decode("utf-8")
+            for begin, end in zip(bounds[:-1], bounds[1:])
+        ]
+
+
+def compiled_path(path: str) -> str:
+    """Get the compiled file path for a set file.
+
+    Args:
+        path: The path of the CSV file.
+
+    Returns:
+        The path of the compiled file next to it.
+    """
+    return os.path.splitext(path)[0] + COMPILED_SUFFIX
+
+
+def _encode_strings(values: Sequence[str]) -> Dict[str, np.ndarray]:
+    encoded = [value.encode("utf-8") for value in values]
+    offsets = np.zeros(len(encoded) + 1, dtype="<i8")
+    np.cumsum([len(value) for value in encoded], out=offsets[1:])
+    return {
+        "offsets": offsets,
+        "data": np.frombuffer(b"".join(encoded), dtype=np.uint8),
+    }
+
+
+def _align(position: int) -> int:
+    return -position % ALIGNMENT
+
+
+def _write_buffers(handle: BinaryIO, header: Dict[str, Any], buffers: list) -> None:
+    # Offsets depend on the header length, so lay the header out until stable
+    header_bytes = b""
+    while True:
+        position = _PREAMBLE.size + len(header_bytes)
+        position += _align(position)
+        for meta, array in buffers:
+            meta["offset"] = position
+            position += array.nbytes + _align(array.nbytes)
+        encoded = json.dumps(header, sort_keys=True).encode("utf-8")
+        stable = len(encoded) == len(header_bytes)
+        header_bytes = encoded
+        if stable:
+            break
+
+    handle.write(_PREAMBLE.pack(MAGIC, VERSION, len(header_bytes)))
+    handle.write(header_bytes)
+    handle.write(b"\0" * _align(handle.tell()))
+    for _, array in buffers:
+        handle.write(np.ascontiguousarray(array).tobytes())
+        handle.write(b"\0" * _align(array.nbytes))
+
+
+def compile_block_set(path: str, name: str, output: Optional[str] = None) -> str:
+    """Compile a building block set file.
+
+    Args:
+        path: The path of the CSV file.
+        name: The name of the set.
+        output: The path of the compiled file. Defaults to the CSV path with
+            the compiled suffix.
+
+    Returns:
+        The path of the compiled file.
+    """
+    output = output or compiled_path(path)
+    block_set = read_block_set(path, name)
+    canonical = block_set.canonical_smiles.tolist()
+
+    buffers: list = []
+    columns: Dict[str, Any] = {}
+
+    def add(array: np.ndarray) -> Dict[str, Any]:
+        meta = {"dtype": array.dtype.str, "shape": list(array.shape)}
+        buffers.append((meta, array))
+        return meta
+
+    for column in STRING_COLUMNS:
+        encoded = _encode_strings(getattr(block_set, column).tolist())
+        columns[column] = {key: add(value) for key, value in encoded.items()}
+    descriptors = compute_descriptor_table(block_set.canonical_smiles)
+    columns["descriptors"] = add(np.hstack([descriptors.values, descriptors.couplings]))
+    columns["fingerprints"] = add(morgan_fingerprints(canonical))
+
+    header = {
+        "name": name,
+        "rows": len(block_set),
+        "columns": columns,
+        "descriptor_names": list(descriptors.names),
+        "fingerprint": {
+            "type": "morgan",
+            "radius": DEFAULT_RADIUS,
+            "bits": DEFAULT_N_BITS,
+        },
+    }
+
+    # Write to a temporary file and rename it into place, so processes that
+    # have the previous version mapped keep a consistent view of it
+    directory = os.path.dirname(os.path.abspath(output))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as handle:
+            _write_buffers(handle, header, buffers)
+        os.replace(tmp_path, output)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+    return output
+
+
+def open_block_set(path: str, name: Optional[str] = None) -> BlockSet:
+    """Open a compiled building block set.
+
+    Args:
+        path: The path of the compiled file.
+        name: The name of the set. Defaults to the name it was compiled
+            with, which for a set compiled from a CSV path is the file name.
+
+    Returns:
+        The building block set, with every column backed by the mapped file.
+
+    Raises:
+        ValueError: If the file is not a compiled building block set.
+    """
+    with open(path, "rb") as handle:
+        buffer = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+
+    magic, version, header_length = _PREAMBLE.unpack_from(buffer, 0)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f"Not a compiled building block set: {path}")
+    header = json.loads(buffer[_PREAMBLE.size : _PREAMBLE.size + header_length])
+
+    def view(meta: Dict[str, Any]) -> np.ndarray:
+        dtype = np.dtype(meta["dtype"])
+        count = int(np.prod(meta["shape"]))
+        array = np.frombuffer(buffer, dtype=dtype, count=count, offset=meta["offset"])
+        return array.reshape(meta["shape"])
+
+    columns = header["columns"]
+    strings = {
+        column: StringColumn(
+            view(columns[column]["offsets"]), view(columns[column]["data"])
+        )
+        for column in STRING_COLUMNS
+    }
+    return BlockSet(
+        name=header["name"] if name is None else name,
+        descriptors=view(columns["descriptors"]),
+        descriptor_names=tuple(header["descriptor_names"]),
+        fingerprints=view(columns["fingerprints"]),
+        **strings,
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compile a building block set.")
+    parser.add_argument("set", help="A set name or the path of a set CSV file")
+    parser.add_argument("-o", "--output", help="The path of the compiled file")
+    args = parser.parse_args()
+
+    if args.set in BLOCK_SET_FILES:
+        path, name = BLOCK_SET_FILES[args.set], args.set
+    else:
+        path, name = args.set, os.path.splitext(os.path.basename(args.set))[0]
+    print(compile_block_set(path, name, args.output))
+
+
+if __name__ == "__main__":
+    main()
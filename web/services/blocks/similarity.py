@@ -0,0 +1,157 @@
+# web/services/blocks/similarity.py
+"""
+This module contains the bulk Tanimoto similarity search over building
+blocks.
+
+Fingerprints are packed uint64 rows. The index sorts the rows by popcount
+once, so a query only scores the contiguous range of blocks whose bit count
+can still reach the threshold (for Tanimoto >= t, a block with b bits can
+only match a query with a bits if t * a <= b <= a / t). That range is scored
+in batches with vectorized popcounts.
+
+Classes:
+    SimilarityIndex: The similarity index of one building block set.
+
+Functions:
+    popcount: Count the set bits of packed fingerprint rows.
+    get_similarity_index: Get the similarity index of a named set, with caching.
+"""
+
+# Standard Library Imports
+from typing import Dict, Optional, Tuple
+import math
+import threading
+
+# External Imports
+import numpy as np
+
+# Internal Imports
+from web.services.blocks.fingerprints import morgan_fingerprints
+from web.services.blocks.set_loader import BlockSet, load_block_set
+
+DEFAULT_BATCH_SIZE: int = 16384
+
+# Fallback for NumPy versions without np.bitwise_count
+_BYTE_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def popcount(words: np.ndarray) -> np.ndarray:
+    """Count the set bits of packed fingerprint rows.
+
+    Args:
+        words: A uint64 array of shape (..., n_words).
+
+    Returns:
+        An int64 array of shape (...) with the number of set bits per row.
+    """
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(words).sum(axis=-1, dtype=np.int64)
+    as_bytes = np.ascontiguousarray(words).view(np.uint8)
+    return _BYTE_POPCOUNT[as_bytes].sum(axis=-1, dtype=np.int64)
+
+
+class SimilarityIndex:
+    """The similarity index of one building block set.
+
+    Attributes:
+        block_set: The indexed building block set.
+        fingerprints: The packed fingerprints, one row per block.
+
+    Methods:
+        search: Get the blocks most similar to a query fingerprint.
+    """
+
+    def __init__(self, block_set: BlockSet, fingerprints: np.ndarray) -> None:
+        """Initialize the similarity index.
+
+        Args:
+            block_set: The indexed building block set.
+            fingerprints: The packed fingerprints, one row per block.
+        """
+        self.block_set: BlockSet = block_set
+        self.fingerprints: np.ndarray = fingerprints
+        counts = popcount(fingerprints)
+        self._order: np.ndarray = np.argsort(counts, kind="stable")
+        self._counts: np.ndarray = counts[self._order]
+        self._fingerprints: np.ndarray = np.ascontiguousarray(fingerprints[self._order])
+
+    def search(
+        self,
+        query: np.ndarray,
+        threshold: float = 0.5,
+        k: int = 10,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Get the blocks most similar to a query fingerprint.
+
+        Args:
+            query: The packed query fingerprint.
+            threshold: The minimum Tanimoto similarity, in [0, 1].
+            k: The maximum number of blocks to return.
+            batch_size: The number of blocks scored per NumPy pass.
+
+        Returns:
+            The block indices and their similarities, most similar first.
+        """
+        query_bits = int(popcount(query))
+        if query_bits == 0 or k < 1:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+
+        # Count bounds: only blocks in this popcount range can reach threshold
+        low = math.ceil(threshold * query_bits - 1e-9)
+        high = math.floor(query_bits / threshold + 1e-9) if threshold > 0 else None
+        start = int(np.searchsorted(self._counts, low, side="left"))
+        stop = (
+            len(self._counts)
+            if high is None
+            else int(np.searchsorted(self._counts, high, side="right"))
+        )
+
+        best_rows = np.empty(0, dtype=np.int64)
+        best_scores = np.empty(0)
+        for batch_start in range(start, stop, batch_size):
+            batch_stop = min(batch_start + batch_size, stop)
+            common = popcount(self._fingerprints[batch_start:batch_stop] & query)
+            union = query_bits + self._counts[batch_start:batch_stop] - common
+            scores = common / union
+            hits = np.flatnonzero(scores >= threshold)
+            best_rows = np.concatenate([best_rows, hits + batch_start])
+            best_scores = np.concatenate([best_scores, scores[hits]])
+            if len(best_scores) > k:
+                top = np.argpartition(-best_scores, k - 1)[:k]
+                best_rows, best_scores = best_rows[top], best_scores[top]
+
+        ranking = np.lexsort((self._order[best_rows], -best_scores))
+        return self._order[best_rows[ranking]], best_scores[ranking]
+
+
+_indexes: Dict[str, Tuple[BlockSet, SimilarityIndex]] = {}
+_indexes_lock: threading.Lock = threading.Lock()
+
+
+def get_similarity_index(set_name: str) -> SimilarityIndex:
+    """Get the similarity index of a named set, with caching.
+
+    Compiled sets carry their fingerprints; for CSV sets they are computed
+    once when the index is first built.
+
+    Args:
+        set_name: The name of the set.
+
+    Returns:
+        The similarity index.
+    """
+    block_set = load_block_set(set_name)
+    with _indexes_lock:
+        cached = _indexes.get(set_name)
+        if cached is not None and cached[0] is block_set:
+            return cached[1]
+
+    fingerprints: Optional[np.ndarray] = block_set.fingerprints
+    if fingerprints is None:
+        fingerprints = morgan_fingerprints(block_set.canonical_smiles.tolist())
+
+    index = SimilarityIndex(block_set, fingerprints)
+    with _indexes_lock:
+        _indexes[set_name] = (block_set, index)
+    return index
@@ -0,0 +1,234 @@
+# web/services/blocks/substructure_index.py
+"""
+This module contains the fingerprint-screened substructure index for
+building block sets.
+
+Every block's pattern fingerprint is stored packed into uint64 words. A
+SMARTS query first prunes the set to the blocks whose fingerprint contains
+every bit of the query's fingerprint, using one vectorized NumPy pass, and
+only those candidates are checked with an exact RDKit substructure match.
+The fingerprint matrix is persisted next to the set file and rebuilt only
+when the set changes.
+
+Classes:
+    SubstructureIndex: The substructure index of one building block set.
+
+Functions:
+    parse_smarts: Parse a SMARTS query.
+    index_path: Get the index file path for a set file.
+    build_substructure_index: Build and persist the index of a set file.
+    get_substructure_index: Get the index of a named set, with caching.
+    load_in_background: Load or build the index of a named set off-thread.
+"""
+
+# Standard Library Imports
+from typing import Dict, List, Optional, Set, Tuple
+import os
+import tempfile
+import threading
+
+# External Imports
+import numpy as np
+from rdkit import Chem
+
+# Internal Imports
+from web.core.exceptions.blocks_exceptions import InvalidSmartsError
+from web.services.blocks.fingerprints import (
+    DEFAULT_N_BITS,
+    pattern_fingerprint,
+    pattern_fingerprints,
+)
+from web.services.blocks.set_loader import BLOCK_SET_FILES, BlockSet, load_block_set
+
+INDEX_SUFFIX: str = ".ssidx.npy"
+
+
+class SubstructureIndex:
+    """The substructure index of one building block set.
+
+    Attributes:
+        block_set: The indexed building block set.
+        fingerprints: The packed pattern fingerprints, one row per block.
+
+    Methods:
+        screen: Get the blocks that pass the fingerprint screen.
+        search: Get the blocks that contain a SMARTS substructure.
+    """
+
+    def __init__(self, block_set: BlockSet, fingerprints: np.ndarray) -> None:
+        """Initialize the substructure index.
+
+        Args:
+            block_set: The indexed building block set.
+            fingerprints: The packed pattern fingerprints, one row per block.
+        """
+        self.block_set: BlockSet = block_set
+        self.fingerprints: np.ndarray = fingerprints
+        self._mols: List[Optional[Chem.Mol]] = [None] * len(block_set)
+        self._lock: threading.Lock = threading.Lock()
+
+    def _mol(self, index: int) -> Optional[Chem.Mol]:
+        mol = self._mols[index]
+        if mol is None:
+            smiles = self.block_set.canonical_smiles[index]
+            mol = Chem.MolFromSmiles(smiles) if smiles else None
+            with self._lock:
+                self._mols[index] = mol
+        return mol
+
+    def screen(self, query: Chem.Mol) -> np.ndarray:
+        """Get the blocks that pass the fingerprint screen.
+
+        Args:
+            query: The query molecule.
+
+        Returns:
+            The indices of the candidate blocks, in set order.
+        """
+        bits = pattern_fingerprint(query, self.fingerprints.shape[1] * 64)
+        return np.flatnonzero(((self.fingerprints & bits) == bits).all(axis=1))
+
+    def search(self, query: Chem.Mol, limit: Optional[int] = None) -> List[int]:
+        """Get the blocks that contain a SMARTS substructure.
+
+        Args:
+            query: The query molecule.
+            limit: The maximum number of matches to return.
+
+        Returns:
+            The indices of the matching blocks, in set order.
+        """
+        matches: List[int] = []
+        for index in self.screen(query).tolist():
+            mol = self._mol(index)
+            if mol is not None and mol.HasSubstructMatch(query):
+                matches.append(index)
+                if limit is not None and len(matches) >= limit:
+                    break
+        return matches
+
+
+def parse_smarts(smarts: str) -> Chem.Mol:
+    """Parse a SMARTS query.
+
+    Args:
+        smarts: The SMARTS string.
+
+    Returns:
+        The query molecule.
+
+    Raises:
+        InvalidSmartsError: If RDKit cannot parse the SMARTS string.
+    """
+    query = Chem.MolFromSmarts(smarts) if smarts else None
+    if query is None:
+        raise InvalidSmartsError(f"Invalid SMARTS: {smarts}")
+    query.UpdatePropertyCache(strict=False)
+    return query
+
+
+def index_path(path: str) -> str:
+    """Get the index file path for a set file.
+
+    Args:
+        path: The path of the set CSV file.
+
+    Returns:
+        The path of the index file next to it.
+    """
+    return os.path.splitext(path)[0] + INDEX_SUFFIX
+
+
+def build_substructure_index(
+    path: str, block_set: BlockSet, n_bits: int = DEFAULT_N_BITS
+) -> np.ndarray:
+    """Build and persist the index of a set file.
+
+    Args:
+        path: The path of the set CSV file.
+        block_set: The building block set read from it.
+        n_bits: The fingerprint length, a multiple of 64.
+
+    Returns:
+        The packed pattern fingerprints, one row per block.
+    """
+    fingerprints = pattern_fingerprints(block_set.canonical_smiles.tolist(), n_bits)
+    output = index_path(path)
+    fd, tmp_path = tempfile.mkstemp(
+        dir=os.path.dirname(os.path.abspath(output)), suffix=".tmp"
+    )
+    try:
+        with os.fdopen(fd, "wb") as handle:
+            np.save(handle, fingerprints)
+        os.replace(tmp_path, output)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+    return fingerprints
+
+
+_indexes: Dict[str, Tuple[BlockSet, SubstructureIndex]] = {}
+_indexes_lock: threading.Lock = threading.Lock()
+_loading: Set[str] = set()
+
+
+def get_substructure_index(set_name: str) -> SubstructureIndex:
+    """Get the index of a named set, with caching.
+
+    The persisted index is reused while it is newer than the set file and has
+    one row per block; otherwise it is rebuilt and persisted again.
+
+    Args:
+        set_name: The name of the set.
+
+    Returns:
+        The substructure index.
+    """
+    block_set = load_block_set(set_name)
+    with _indexes_lock:
+        cached = _indexes.get(set_name)
+        if cached is not None and cached[0] is block_set:
+            return cached[1]
+
+    path = BLOCK_SET_FILES[set_name]
+    output = index_path(path)
+    fingerprints = None
+    if os.path.exists(output) and os.path.getmtime(output) >= os.path.getmtime(path):
+        fingerprints = np.load(output, mmap_mode="r")
+        if fingerprints.shape[0] != len(block_set):
+            fingerprints = None
+    if fingerprints is None:
+        fingerprints = build_substructure_index(path, block_set)
+
+    index = SubstructureIndex(block_set, fingerprints)
+    with _indexes_lock:
+        _indexes[set_name] = (block_set, index)
+    return index
+
+
+def load_in_background(set_name: str) -> None:
+    """Load or build the index of a named set off-thread.
+
+    Called when a set is loaded, so the index is ready by the time the user
+    first searches it. Returns at once if the index of the loaded set is
+    ready or loading.
+
+    Args:
+        set_name: The name of the set.
+    """
+    block_set = load_block_set(set_name)
+    with _indexes_lock:
+        cached = _indexes.get(set_name)
+        if set_name in _loading or (cached is not None and cached[0] is block_set):
+            return
+        _loading.add(set_name)
+
+    def run() -> None:
+        try:
+            get_substructure_index(set_name)
+        finally:
+            with _indexes_lock:
+                _loading.discard(set_name)
+
+    threading.Thread(target=run, name=f"ssidx-{set_name}", daemon=True).start()
@@ -0,0 +1,143 @@
+# web/services/compute_settings.py
+"""
+This module contains the ComputeSettings class which holds the computation
+settings shared by the compute services.
+
+The settings are saved to a JSON file, so they survive a restart and every
+server process sees the same values: each process re-reads the file when
+it changes on disk.
+"""
+
+# Standard Library Imports
+from typing import Any, Dict, Optional, Tuple
+import json
+import multiprocessing
+import os
+import tempfile
+import threading
+
+DEFAULT_SETTINGS_PATH: str = os.environ.get(
+    "PEPLAB_SETTINGS_PATH",
+    os.path.join(
+        os.environ.get(
+            "PEPLAB_CACHE_DIR",
+            os.path.join(os.path.expanduser("~"), ".cache", "peplab"),
+        ),
+        "compute_settings.json",
+    ),
+)
+
+
+class ComputeSettings:
+    """
+    Holds the computation settings saved from the settings page.
+    Implements Singleton pattern so every service sees the same settings.
+    """
+
+    _instance: Optional["ComputeSettings"] = None
+    _lock: threading.Lock = threading.Lock()
+
+    def __new__(cls) -> "ComputeSettings":
+        """Create or return the singleton instance."""
+        with cls._lock:
+            if cls._instance is None:
+                cls._instance = super().__new__(cls)
+                cls._instance._path = DEFAULT_SETTINGS_PATH
+                cls._instance._version = None
+                cls._instance._max_threads = multiprocessing.cpu_count()
+                cls._instance._gpu_enabled = False
+        return cls._instance
+
+    def _file_version(self) -> Optional[Tuple[int, int]]:
+        """Get the modification time and size of the settings file."""
+        try:
+            stat = os.stat(self._path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _refresh(self) -> None:
+        """Re-read the settings file if it changed since it was last read."""
+        version = self._file_version()
+        if version is None or version == self._version:
+            return
+        try:
+            with open(self._path) as handle:
+                saved: Dict[str, Any] = json.load(handle)
+            max_threads = int(saved.get("max_threads", self._max_threads))
+            gpu_enabled = bool(saved.get("gpu_enabled", self._gpu_enabled))
+        except (OSError, ValueError, TypeError, AttributeError):
+            return
+        self._version = version
+        self._max_threads = min(max(max_threads, 1), multiprocessing.cpu_count())
+        self._gpu_enabled = gpu_enabled
+
+    def _save(self) -> None:
+        """Write the settings file atomically."""
+        directory = os.path.dirname(os.path.abspath(self._path))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as handle:
+                json.dump(
+                    {
+                        "max_threads": self._max_threads,
+                        "gpu_enabled": self._gpu_enabled,
+                    },
+                    handle,
+                )
+            os.replace(tmp_path, self._path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+        self._version = self._file_version()
+
+    @property
+    def max_threads(self) -> int:
+        """Get the maximum number of worker processes.
+
+        Returns:
+            int: The maximum number of worker processes
+        """
+        with self._lock:
+            self._refresh()
+            return self._max_threads
+
+    @property
+    def gpu_enabled(self) -> bool:
+        """Get whether GPU acceleration is enabled.
+
+        Returns:
+            bool: True if GPU acceleration is enabled
+        """
+        with self._lock:
+            self._refresh()
+            return self._gpu_enabled
+
+    def update(
+        self, max_threads: Optional[int] = None, gpu_enabled: Optional[bool] = None
+    ) -> None:
+        """Update and save the computation settings.
+
+        Args:
+            max_threads: The maximum number of worker processes
+            gpu_enabled: Whether GPU acceleration is enabled
+
+        Raises:
+            ValueError: If max_threads is not a positive number
+        """
+        if max_threads is not None and max_threads < 1:
+            raise ValueError("max_threads must be at least 1")
+        with self._lock:
+            self._refresh()
+            if max_threads is not None:
+                self._max_threads = min(max_threads, multiprocessing.cpu_count())
+            if gpu_enabled is not None:
+                self._gpu_enabled = gpu_enabled
+            self._save()
+
+    @classmethod
+    def reset(cls) -> None:
+        """Reset the singleton instance."""
+        cls._instance = None
@@ -0,0 +1,4 @@
+# web/services/design/__init__.py
+"""
+This package contains the library design engines.
+"""
@@ -0,0 +1,331 @@
+# web/services/design/combinatoric.py
+"""
+This module contains the lazy combinatorial library enumeration engine.
+
+Libraries are enumerated as chunks of integer block indices, one row per
+member, and are never materialized as a whole. The exact library size is
+available up front from closed-form counts, so callers can report progress
+and allocate output before any member is generated.
+
+Methods:
+    combination: k blocks out of n, unordered, without repetition.
+    permutation: k blocks out of n, ordered, without repetition.
+    cartesian: one block from each position's own block set.
+    nary: the Cartesian product of one block set with itself k times.
+    cyclic: sequences up to rotation (necklaces).
+    dihedral: sequences up to rotation and reflection (bracelets).
+
+Classes:
+    CombinatoricDesign: The parameters of a combinatorial library.
+
+Functions:
+    library_size: Get the exact size of a combinatorial library.
+    counted_size: Get a library's size if it can be counted without
+        enumerating the library.
+    enumerate_library: Enumerate a combinatorial library in chunks.
+    format_library: Format a combinatorial library as CSV text chunks.
+    format_members: Format chunks of library members as CSV text.
+"""
+
+# Standard Library Imports
+from dataclasses import dataclass, field
+from itertools import chain, combinations, islice, permutations, product
+from math import comb, perm, prod
+from typing import Iterable, Iterator, List, Optional, Sequence
+import csv
+import io
+
+# External Imports
+import numpy as np
+
+# Internal Imports
+from web.core.exceptions.design_exceptions import InvalidDesignError
+from web.services.design.constraints import (
+    Constraints,
+    count_constrained,
+    enumerate_constrained,
+)
+from web.services.design.necklaces import (
+    bracelet_count,
+    bracelets,
+    necklace_count,
+    necklaces,
+)
+
+METHODS = ("combination", "permutation", "cartesian", "nary", "cyclic", "dihedral")
+CONSTRAINED_METHODS = ("permutation", "cartesian", "nary")
+DEFAULT_CHUNK_SIZE: int = 65536
+
+
+@dataclass
+class CombinatoricDesign:
+    """The parameters of a combinatorial library.
+
+    Attributes:
+        method: The enumeration method, one of METHODS.
+        n_blocks: The number of blocks to choose from.
+        length: The number of blocks per member.
+        position_sets: For the cartesian method, the block indices allowed at
+            each position. Defaults to every block at every position.
+        constraints: Property bounds and block count limits, for the
+            methods in CONSTRAINED_METHODS.
+    """
+
+    method: str
+    n_blocks: int
+    length: int
+    position_sets: Optional[List[np.ndarray]] = field(default=None)
+    constraints: Optional[Constraints] = field(default=None)
+
+    def __post_init__(self) -> None:
+        """Validate the parameters.
+
+        Raises:
+            InvalidDesignError: If the parameters do not describe a library.
+        """
+        if self.method not in METHODS:
+            raise InvalidDesignError(f"Unknown combinatoric method: {self.method}")
+        if self.n_blocks < 1 or self.length < 1:
+            raise InvalidDesignError("n_blocks and length must be positive")
+        if self.position_sets is not None:
+            self.position_sets = [
+                np.asarray(blocks, dtype=np.int64) for blocks in self.position_sets
+            ]
+            if len(self.position_sets) != self.length:
+                raise InvalidDesignError(
+                    "position_sets must have one entry per position"
+                )
+            if any(len(blocks) == 0 for blocks in self.position_sets):
+                raise InvalidDesignError("Every position needs at least one block")
+        if self.constraints is not None and self.method not in CONSTRAINED_METHODS:
+            raise InvalidDesignError(f"Constraints are not supported for {self.method}")
+
+    @property
+    def radices(self) -> List[int]:
+        """The number of choices at each position of a product method."""
+        if self.method == "cartesian" and self.position_sets is not None:
+            return [len(blocks) for blocks in self.position_sets]
+        return [self.n_blocks] * self.length
+
+    @property
+    def allowed_blocks(self) -> List[np.ndarray]:
+        """The block indices allowed at each position."""
+        if self.method == "cartesian" and self.position_sets is not None:
+            return self.position_sets
+        return [np.arange(self.n_blocks, dtype=np.int64)] * self.length
+
+
+def library_size(design: CombinatoricDesign) -> int:
+    """Get the exact size of a combinatorial library.
+
+    Args:
+        design: The library design.
+
+    Returns:
+        The number of library members.
+
+    Raises:
+        InvalidDesignError: If a constrained library is too large to count.
+    """
+    n, k = design.n_blocks, design.length
+    if design.constraints is not None:
+        if design.method == "permutation":
+            # Distinct blocks do not decompose by position, so count members
+            return sum(len(chunk) for chunk in enumerate_library(design))
+        return count_constrained(design.allowed_blocks, n, design.constraints)
+    if design.method == "combination":
+        return comb(n, k)
+    if design.method == "permutation":
+        return perm(n, k)
+    if design.method == "cyclic":
+        return necklace_count(n, k)
+    if design.method == "dihedral":
+        return bracelet_count(n, k)
+    return prod(design.radices)
+
+
+def counted_size(design: CombinatoricDesign) -> Optional[int]:
+    """Get a library's size if it can be counted without enumerating it.
+
+    Constrained permutation libraries can only be counted by enumerating
+    every member, which takes too long for a request.
+
+    Args:
+        design: The library design.
+
+    Returns:
+        The number of library members, or None for constrained permutations.
+
+    Raises:
+        InvalidDesignError: If a constrained library is too large to count.
+    """
+    if design.constraints is not None and design.method == "permutation":
+        return None
+    return library_size(design)
+
+
+def _rechunk(
+    chunks: Iterable[np.ndarray], size: int, width: int
+) -> Iterator[np.ndarray]:
+    """Regroup a stream of row blocks into chunks of exactly size rows."""
+    pending: List[np.ndarray] = []
+    buffered = 0
+    for chunk in chunks:
+        pending.append(chunk)
+        buffered += len(chunk)
+        if buffered < size:
+            continue
+        merged = np.concatenate(pending)
+        full = len(merged) - len(merged) % size
+        for start in range(0, full, size):
+            yield merged[start : start + size]
+        pending = [merged[full:]]
+        buffered = len(pending[0])
+    if buffered:
+        yield np.concatenate(pending)
+    elif not pending:
+        yield np.empty((0, width), dtype=np.int64)
+
+
+def _product_blocks(radices: Sequence[int], chunk_size: int) -> Iterator[np.ndarray]:
+    """Enumerate a mixed-radix product in lexicographic order.
+
+    The trailing positions whose product fits in a chunk are expanded once
+    into a suffix table; the leading positions are walked with an odometer,
+    so memory stays bounded by the chunk size whatever the library size.
+    """
+    split = len(radices)
+    suffix_size = 1
+    while split > 0 and suffix_size * radices[split - 1] <= chunk_size:
+        split -= 1
+        suffix_size *= radices[split]
+    if split == len(radices):
+        grids = np.empty((1, 0), dtype=np.int64)
+    else:
+        grids = np.indices(radices[split:]).reshape(len(radices) - split, -1).T
+    for prefix in product(*(range(radix) for radix in radices[:split])):
+        block = np.empty((len(grids), len(radices)), dtype=np.int64)
+        block[:, :split] = prefix
+        block[:, split:] = grids
+        yield block
+
+
+def _from_tuples(
+    tuples: Iterator[tuple], width: int, chunk_size: int
+) -> Iterator[np.ndarray]:
+    """Pack an iterator of index tuples into chunks of rows."""
+    while True:
+        flat = np.fromiter(
+            chain.from_iterable(islice(tuples, chunk_size)),
+            dtype=np.int64,
+            count=-1,
+        )
+        if len(flat) == 0:
+            return
+        yield flat.reshape(-1, width)
+
+
+def enumerate_library(
+    design: CombinatoricDesign, chunk_size: int = DEFAULT_CHUNK_SIZE
+) -> Iterator[np.ndarray]:
+    """Enumerate a combinatorial library in chunks.
+
+    Members are produced in lexicographic order of their block indices. For
+    the cyclic and dihedral methods each member is the least rotation (or
+    rotation and reflection) of its equivalence class. Constrained designs
+    prune partial sequences during enumeration.
+
+    Args:
+        design: The library design.
+        chunk_size: The number of members per chunk. Every chunk but the
+            last has exactly this many rows.
+
+    Yields:
+        Integer arrays of block indices, shape (rows, length).
+    """
+    n, k = design.n_blocks, design.length
+    if design.constraints is not None:
+        chunks = enumerate_constrained(
+            design.allowed_blocks,
+            n,
+            design.constraints,
+            distinct=design.method == "permutation",
+            chunk_size=chunk_size,
+        )
+    elif design.method == "combination":
+        chunks = _from_tuples(combinations(range(n), k), k, chunk_size)
+    elif design.method == "permutation":
+        chunks = _from_tuples(permutations(range(n), k), k, chunk_size)
+    elif design.method == "cyclic":
+        chunks = _from_tuples(necklaces(n, k), k, chunk_size)
+    elif design.method == "dihedral":
+        chunks = _from_tuples(bracelets(n, k), k, chunk_size)
+    else:
+        chunks = _product_blocks(design.radices, chunk_size)
+        if design.method == "cartesian" and design.position_sets is not None:
+            sets = design.position_sets
+            chunks = (
+                np.stack([sets[i][block[:, i]] for i in range(k)], axis=1)
+                for block in chunks
+            )
+    yield from _rechunk(chunks, chunk_size, k)
+
+
+def format_library(
+    design: CombinatoricDesign,
+    codes: Sequence[str],
+    separator: str = "-",
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    start: int = 0,
+    stop: Optional[int] = None,
+) -> Iterator[str]:
+    """Format a combinatorial library as CSV text chunks.
+
+    Args:
+        design: The library design.
+        codes: The code of each block, used to spell out members.
+        separator: The separator between block codes.
+        chunk_size: The number of members generated at a time.
+        start: The rank of the first member, to resume an export.
+        stop: The rank to stop before. Defaults to the library size.
+
+    Yields:
+        The CSV header, then the CSV text of each chunk of members.
+    """
+    chunks = enumerate_library(design, chunk_size)
+    if start or stop is not None:
+        # Imported here as the ranking module builds on this one
+        from web.services.design.ranking import enumerate_range
+
+        chunks = enumerate_range(design, start, stop, chunk_size)
+    yield from format_members(chunks, codes, separator)
+
+
+def format_members(
+    chunks: Iterable[np.ndarray], codes: Sequence[str], separator: str = "-"
+) -> Iterator[str]:
+    """Format chunks of library members as CSV text.
+
+    Args:
+        chunks: Integer arrays of block indices, shape (rows, length).
+        codes: The code of each block, used to spell out members.
+        separator: The separator between block codes.
+
+    Yields:
+        The CSV header, then the CSV text of each chunk of members.
+    """
+    lookup = np.asarray(codes, dtype=object)
+    # Sequences only need CSV quoting when a code or the separator does
+    needs_quoting = any(
+        char in text for text in [*codes, separator] for char in ',"\r\n'
+    )
+    yield "Sequence\n"
+    for chunk in chunks:
+        rows = lookup[chunk].tolist()
+        if not needs_quoting:
+            yield "".join(separator.join(row) + "\n" for row in rows)
+            continue
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, lineterminator="\n")
+        writer.writerows([separator.join(row)] for row in rows)
+        yield buffer.getvalue()
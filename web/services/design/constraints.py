@@ -0,0 +1,388 @@
+# web/services/design/constraints.py
+"""
+This module contains constraint-aware enumeration and counting of libraries.
+
+Designs may restrict the blocks allowed at each position, bound additive
+properties such as molecular weight, and limit how often blocks occur.
+Rather than filtering a full enumeration, sequences are built depth first
+and a prefix is pruned as soon as the best and worst completions of its
+property sums fall outside the bounds, or its block counts can no longer
+meet the limits. The constrained library size is counted by dynamic
+programming over the reachable property sums and block counts.
+
+Property values are summed on a grid of the bound's resolution, so
+enumeration and counting agree exactly on which sequences are inside the
+bounds. With the default resolution a sum is within half a resolution step
+per position of its true value.
+
+Classes:
+    PropertyBound: A bound on an additive property.
+    CountLimit: A limit on how often a group of blocks occurs.
+    Constraints: The constraints of a library design.
+
+Functions:
+    position_sets_from_labels: Get position block sets from position labels.
+    enumerate_constrained: Enumerate a constrained library in chunks.
+    count_constrained: Count a constrained library.
+"""
+
+# Standard Library Imports
+from dataclasses import dataclass, field
+from typing import Iterator, List, Optional, Sequence, Tuple
+import math
+
+# External Imports
+import numpy as np
+
+# Internal Imports
+from web.core.exceptions.design_exceptions import InvalidDesignError
+
+DEFAULT_RESOLUTION: float = 0.01
+MAX_COUNT_STATES: int = 50_000_000
+
+# Position labels of the building block position column
+N_TERMINAL_LABELS = ("n", "n-term", "n_term", "nterm", "n-terminal", "first")
+C_TERMINAL_LABELS = ("c", "c-term", "c_term", "cterm", "c-terminal", "last")
+INTERNAL_LABELS = ("internal", "middle")
+ANY_LABELS = ("", "any", "all")
+
+
+@dataclass
+class PropertyBound:
+    """A bound on an additive property.
+
+    Attributes:
+        values: The contribution of each block, shape (n_blocks,), or of
+            each block at each position, shape (length, n_blocks). Blocks
+            with missing (NaN) values are excluded.
+        lower: The smallest allowed property sum.
+        upper: The largest allowed property sum.
+        resolution: The grid the property is summed on.
+    """
+
+    values: np.ndarray
+    lower: float = -math.inf
+    upper: float = math.inf
+    resolution: float = DEFAULT_RESOLUTION
+
+    def steps(self, length: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Get the per-position contributions in resolution steps.
+
+        Args:
+            length: The sequence length.
+
+        Returns:
+            The steps, shape (length, n_blocks), and which of them are valid.
+        """
+        values = np.asarray(self.values, dtype=float)
+        values = np.broadcast_to(values, (length, values.shape[-1]))
+        valid = np.isfinite(values)
+        steps = np.round(np.where(valid, values, 0.0) / self.resolution)
+        return steps.astype(np.int64), valid
+
+    def window(self) -> Tuple[Optional[int], Optional[int]]:
+        """Get the bounds in resolution steps, None where unbounded."""
+        lower = upper = None
+        if math.isfinite(self.lower):
+            lower = math.ceil(round(self.lower / self.resolution, 6))
+        if math.isfinite(self.upper):
+            upper = math.floor(round(self.upper / self.resolution, 6))
+        return lower, upper
+
+
+@dataclass
+class CountLimit:
+    """A limit on how often a group of blocks occurs.
+
+    Attributes:
+        blocks: The block indices of the group.
+        max_count: The most blocks of the group a sequence may hold.
+        min_count: The fewest blocks of the group a sequence must hold.
+    """
+
+    blocks: np.ndarray
+    max_count: int
+    min_count: int = 0
+
+
+@dataclass
+class Constraints:
+    """The constraints of a library design.
+
+    Attributes:
+        bounds: The additive property bounds.
+        limits: The block count limits.
+    """
+
+    bounds: List[PropertyBound] = field(default_factory=list)
+    limits: List[CountLimit] = field(default_factory=list)
+
+
+def position_sets_from_labels(labels: Sequence[str], length: int) -> List[np.ndarray]:
+    """Get position block sets from position labels.
+
+    A label is "any", "n-term", "c-term", "internal", or 1-based position
+    numbers separated by semicolons; several labels may be combined with
+    "|".
+
+    Args:
+        labels: The position label of each block.
+        length: The sequence length.
+
+    Returns:
+        The block indices allowed at each position.
+
+    Raises:
+        InvalidDesignError: If a label is not recognized.
+    """
+    allowed = np.zeros((length, len(labels)), dtype=bool)
+    for block, label in enumerate(labels):
+        for part in str(label).strip().lower().split("|"):
+            part = part.strip()
+            if part in ANY_LABELS:
+                allowed[:, block] = True
+            elif part in N_TERMINAL_LABELS:
+                allowed[0, block] = True
+            elif part in C_TERMINAL_LABELS:
+                allowed[-1, block] = True
+            elif part in INTERNAL_LABELS:
+                allowed[1:-1, block] = True
+            elif all(item.strip().isdigit() for item in part.split(";")):
+                for item in part.split(";"):
+                    if 1 <= int(item) <= length:
+                        allowed[int(item) - 1, block] = True
+            else:
+                raise InvalidDesignError(f"Unknown block position: {label}")
+    return [np.flatnonzero(row) for row in allowed]
+
+
+class _Plan:
+    """The pruning tables of a constrained design."""
+
+    def __init__(
+        self,
+        position_sets: List[np.ndarray],
+        n_blocks: int,
+        constraints: Constraints,
+    ) -> None:
+        length = len(position_sets)
+        self.length = length
+        self.steps: List[np.ndarray] = []
+        self.windows: List[Tuple[Optional[int], Optional[int]]] = []
+        usable = np.ones((length, n_blocks), dtype=bool)
+        for bound in constraints.bounds:
+            steps, valid = bound.steps(length)
+            if steps.shape[1] != n_blocks:
+                raise InvalidDesignError("A property bound has the wrong block count")
+            self.steps.append(steps)
+            self.windows.append(bound.window())
+            usable &= valid
+        self.sets = [
+            np.sort(blocks[usable[p, blocks]]) for p, blocks in enumerate(position_sets)
+        ]
+
+        # The smallest and largest sums the positions from p onwards add
+        self.min_rest: List[np.ndarray] = []
+        self.max_rest: List[np.ndarray] = []
+        for steps in self.steps:
+            lows = [steps[p, s].min() if len(s) else 0 for p, s in enumerate(self.sets)]
+            highs = [
+                steps[p, s].max() if len(s) else 0 for p, s in enumerate(self.sets)
+            ]
+            self.min_rest.append(np.concatenate([np.cumsum(lows[::-1])[::-1], [0]]))
+            self.max_rest.append(np.concatenate([np.cumsum(highs[::-1])[::-1], [0]]))
+
+        # How many positions from p onwards could still take a limited block;
+        # no sequence holds more limited blocks than it has positions
+        self.limits = [
+            CountLimit(limit.blocks, min(limit.max_count, length), limit.min_count)
+            for limit in constraints.limits
+        ]
+        self.members: List[np.ndarray] = []
+        self.capacity: List[np.ndarray] = []
+        for limit in self.limits:
+            member = np.zeros(n_blocks, dtype=bool)
+            member[np.asarray(limit.blocks, dtype=np.int64)] = True
+            self.members.append(member)
+            can_take = [member[s].any() for s in self.sets]
+            self.capacity.append(
+                np.concatenate([np.cumsum(can_take[::-1])[::-1], [0]]).astype(np.int64)
+            )
+
+    def feasible(
+        self, depth: int, rows: int, sums: List[np.ndarray], counts: List[np.ndarray]
+    ) -> np.ndarray:
+        """Check which prefixes of a depth can still be completed."""
+        keep = np.ones(rows, dtype=bool)
+        for i, (lower, upper) in enumerate(self.windows):
+            if upper is not None:
+                keep &= sums[i] + self.min_rest[i][depth] <= upper
+            if lower is not None:
+                keep &= sums[i] + self.max_rest[i][depth] >= lower
+        for i, limit in enumerate(self.limits):
+            keep &= counts[i] <= limit.max_count
+            keep &= counts[i] + self.capacity[i][depth] >= limit.min_count
+        return keep
+
+
+def _expand(
+    plan: _Plan,
+    prefixes: np.ndarray,
+    sums: List[np.ndarray],
+    counts: List[np.ndarray],
+    distinct: bool,
+    chunk_size: int,
+) -> Iterator[np.ndarray]:
+    """Extend prefixes depth first, pruning those that cannot complete."""
+    depth = prefixes.shape[1]
+    if depth == plan.length:
+        yield prefixes
+        return
+    candidates = plan.sets[depth]
+    if len(candidates) == 0:
+        return
+    step = max(1, chunk_size // len(candidates))
+    for start in range(0, len(prefixes), step):
+        window = slice(start, start + step)
+        piece = prefixes[window]
+        blocks = np.tile(candidates, len(piece))
+        extended = np.empty((len(blocks), depth + 1), dtype=np.int64)
+        extended[:, :depth] = np.repeat(piece, len(candidates), axis=0)
+        extended[:, depth] = blocks
+        new_sums = [
+            np.repeat(total[window], len(candidates)) + steps[depth, blocks]
+            for total, steps in zip(sums, plan.steps)
+        ]
+        new_counts = [
+            np.repeat(total[window], len(candidates)) + member[blocks]
+            for total, member in zip(counts, plan.members)
+        ]
+        keep = plan.feasible(depth + 1, len(blocks), new_sums, new_counts)
+        if distinct and depth:
+            keep &= ~(extended[:, :depth] == blocks[:, None]).any(axis=1)
+        if not keep.any():
+            continue
+        yield from _expand(
+            plan,
+            extended[keep],
+            [total[keep] for total in new_sums],
+            [total[keep] for total in new_counts],
+            distinct,
+            chunk_size,
+        )
+
+
+def enumerate_constrained(
+    position_sets: List[np.ndarray],
+    n_blocks: int,
+    constraints: Constraints,
+    distinct: bool = False,
+    chunk_size: int = 65536,
+) -> Iterator[np.ndarray]:
+    """Enumerate a constrained library in chunks.
+
+    Members are produced in lexicographic order of their block indices.
+    Memory is bounded by the chunk size times the sequence length.
+
+    Args:
+        position_sets: The block indices allowed at each position.
+        n_blocks: The number of blocks.
+        constraints: The constraints.
+        distinct: Whether a block may occur at most once per sequence.
+        chunk_size: The number of prefixes extended at a time.
+
+    Yields:
+        Integer arrays of block indices, shape (rows, length).
+    """
+    plan = _Plan(position_sets, n_blocks, constraints)
+    root = np.empty((1, 0), dtype=np.int64)
+    sums = [np.zeros(1, dtype=np.int64) for _ in plan.steps]
+    counts = [np.zeros(1, dtype=np.int64) for _ in plan.limits]
+    if plan.feasible(0, 1, sums, counts).all():
+        yield from _expand(plan, root, sums, counts, distinct, chunk_size)
+
+
+def count_constrained(
+    position_sets: List[np.ndarray],
+    n_blocks: int,
+    constraints: Constraints,
+) -> int:
+    """Count a constrained library.
+
+    Counts are propagated position by position over a table of the
+    reachable property sums and block counts, trimmed to the states that
+    can still complete inside the bounds.
+
+    Args:
+        position_sets: The block indices allowed at each position.
+        n_blocks: The number of blocks.
+        constraints: The constraints.
+
+    Returns:
+        The number of sequences satisfying the constraints.
+
+    Raises:
+        InvalidDesignError: If the table would be too large, in which case a
+            coarser bound resolution is needed.
+    """
+    plan = _Plan(position_sets, n_blocks, constraints)
+    if any(len(blocks) == 0 for blocks in plan.sets):
+        return 0
+    unconstrained = math.prod(len(blocks) for blocks in plan.sets)
+    dtype = np.int64 if unconstrained < 2**63 else object
+
+    # Each bound axis covers the sums [origin, origin + size)
+    origins = [0] * len(plan.steps)
+    count_shape = [limit.max_count + 1 for limit in plan.limits]
+    if math.prod(count_shape) > MAX_COUNT_STATES:
+        raise InvalidDesignError("Too many block count limits to count the library")
+    table = np.zeros([1] * len(plan.steps) + count_shape, dtype=dtype)
+    table[(0,) * table.ndim] = 1
+
+    for depth, candidates in enumerate(plan.sets):
+        lows = [int(steps[depth, candidates].min()) for steps in plan.steps]
+        highs = [int(steps[depth, candidates].max()) for steps in plan.steps]
+        shape = [
+            size + high - low for size, low, high in zip(table.shape, lows, highs)
+        ] + count_shape
+        if math.prod(shape) > MAX_COUNT_STATES:
+            raise InvalidDesignError(
+                "The constrained library is too large to count at this resolution"
+            )
+        extended = np.zeros(shape, dtype=dtype)
+        for block in candidates:
+            target: List[slice] = []
+            for i, steps in enumerate(plan.steps):
+                offset = int(steps[depth, block]) - lows[i]
+                target.append(slice(offset, offset + table.shape[i]))
+            source: List[slice] = [slice(None)] * len(plan.steps)
+            for member in plan.members:
+                if member[block]:
+                    # Counts past the limit fall off the end of the axis
+                    target.append(slice(1, None))
+                    source.append(slice(None, -1))
+                else:
+                    target.append(slice(None))
+                    source.append(slice(None))
+            extended[tuple(target)] += table[tuple(source)]
+        origins = [origin + low for origin, low in zip(origins, lows)]
+        table = extended
+
+        # Trim each bound axis to the sums that can still reach the window
+        trim: List[slice] = []
+        for i, (lower, upper) in enumerate(plan.windows):
+            first, last = origins[i], origins[i] + table.shape[i] - 1
+            if lower is not None:
+                first = max(first, lower - int(plan.max_rest[i][depth + 1]))
+            if upper is not None:
+                last = min(last, upper - int(plan.min_rest[i][depth + 1]))
+            if first > last:
+                return 0
+            trim.append(slice(first - origins[i], last - origins[i] + 1))
+            origins[i] = first
+        table = table[tuple(trim)]
+
+    for i, limit in enumerate(plan.limits):
+        axis = len(plan.steps) + i
+        table = np.take(table, range(limit.min_count, limit.max_count + 1), axis=axis)
+    return int(table.sum())
@@ -0,0 +1,318 @@
+# web/services/design/diversity.py
+"""
+This module contains the approximate diversity engine of library design.
+
+Members are compared as feature sets: the residue k-mers of their sequences,
+or the Morgan fingerprint bits of their blocks. Exact pairwise Tanimoto is
+quadratic in the library size, so large libraries are scored from MinHash
+signatures instead. The signature slot of a set is the minimum hash of its
+features, and two sets share a slot value with probability equal to their
+Tanimoto similarity.
+
+Two MinHash properties keep scoring linear. The signature of a union is the
+slotwise minimum of the signatures, so a member's fingerprint signature is
+the minimum over its blocks' signatures, computed once per block. And the
+number of member pairs that agree in a slot comes from the run lengths of
+the sorted slot values, so the mean pairwise similarity needs no pairs at
+all. Near-duplicate members are found by locality-sensitive hashing of
+signature bands, and candidates are kept only if their signatures agree in
+at least a threshold fraction of slots.
+
+Libraries up to exact_limit members are scored exactly instead.
+
+Classes:
+    MinHashDiversity: The diversity engine of one block set.
+
+Functions:
+    kmer_ids: Get the residue k-mer ids of members.
+"""
+
+# Standard Library Imports
+from typing import Optional
+
+# External Imports
+import numpy as np
+
+# Internal Imports
+from web.core.exceptions.design_exceptions import InvalidDesignError
+from web.services.blocks.fingerprints import pack_bits
+from web.services.blocks.similarity import popcount
+from web.services.design.hashing import mix64
+
+REPRESENTATIONS = ("kmer", "fingerprint")
+DEFAULT_KMER: int = 2
+DEFAULT_NUM_PERM: int = 64
+DEFAULT_BANDS: int = 16
+DEFAULT_EXACT_LIMIT: int = 256
+DEFAULT_DUPLICATE_THRESHOLD: float = 0.8
+# Signatures are gathered in member chunks to bound memory
+SIGNATURE_CHUNK_SIZE: int = 16384
+
+_EMPTY_SLOT = np.uint32(np.iinfo(np.uint32).max)
+
+
+def _feature_hashes(features: np.ndarray, seeds: np.ndarray) -> np.ndarray:
+    """Hash features once per signature slot, shape (features, slots)."""
+    keys = np.asarray(features).astype(np.uint64)[:, None] ^ seeds[None, :]
+    return (mix64(keys) >> np.uint64(32)).astype(np.uint32)
+
+
+def kmer_ids(members: np.ndarray, n_blocks: int, k: int = DEFAULT_KMER) -> np.ndarray:
+    """Get the residue k-mer ids of members.
+
+    Args:
+        members: The block indices, shape (..., length).
+        n_blocks: The number of blocks.
+        k: The k-mer length, capped at the member length.
+
+    Returns:
+        The id of each k-mer, shape (..., length - k + 1).
+
+    Raises:
+        InvalidDesignError: If k is not positive or k-mer ids overflow int64.
+    """
+    members = np.asarray(members, dtype=np.int64)
+    length = members.shape[-1]
+    k = min(k, length)
+    if k < 1:
+        raise InvalidDesignError("The k-mer length must be positive")
+    if n_blocks**k > np.iinfo(np.int64).max:
+        raise InvalidDesignError(f"{k}-mers of {n_blocks} blocks do not fit in int64")
+    windows = length - k + 1
+    ids = np.zeros(members.shape[:-1] + (windows,), dtype=np.int64)
+    for offset in range(k):
+        ids = ids * n_blocks + members[..., offset : offset + windows]
+    return ids
+
+
+class MinHashDiversity:
+    """The diversity engine of one block set.
+
+    Attributes:
+        n_blocks: The number of blocks.
+        representation: The member features, one of REPRESENTATIONS.
+        k: The k-mer length, for the kmer representation.
+        fingerprints: The packed block fingerprints, for the fingerprint
+            representation.
+        num_perm: The number of signature slots. More slots give a more
+            accurate estimate at a proportional cost.
+        bands: The number of LSH bands. More bands find less similar
+            near-duplicates.
+        exact_limit: The largest library scored exactly.
+        threshold: The estimated similarity from which two members are
+            near-duplicates.
+
+    Methods:
+        signatures: Compute the MinHash signatures of members.
+        similarity: Get the mean pairwise similarity of libraries.
+        score: Get the diversity of libraries.
+        near_duplicates: Find members with a near-duplicate by LSH.
+    """
+
+    def __init__(
+        self,
+        n_blocks: int,
+        representation: str = "kmer",
+        k: int = DEFAULT_KMER,
+        fingerprints: Optional[np.ndarray] = None,
+        num_perm: int = DEFAULT_NUM_PERM,
+        bands: int = DEFAULT_BANDS,
+        exact_limit: int = DEFAULT_EXACT_LIMIT,
+        threshold: float = DEFAULT_DUPLICATE_THRESHOLD,
+        seed: int = 0,
+    ) -> None:
+        """Initialize the diversity engine.
+
+        Args:
+            n_blocks: The number of blocks.
+            representation: The member features, one of REPRESENTATIONS.
+            k: The k-mer length, for the kmer representation.
+            fingerprints: The packed block fingerprints, one row per block,
+                for the fingerprint representation.
+            num_perm: The number of signature slots.
+            bands: The number of LSH bands, a divisor of num_perm.
+            exact_limit: The largest library scored exactly.
+            threshold: The estimated similarity from which two members are
+                near-duplicates, between 0 and 1.
+            seed: The seed of the hash functions.
+
+        Raises:
+            InvalidDesignError: If the parameters are inconsistent.
+        """
+        if representation not in REPRESENTATIONS:
+            raise InvalidDesignError(f"Unknown representation: {representation}")
+        if representation == "fingerprint" and fingerprints is None:
+            raise InvalidDesignError(
+                "The fingerprint representation needs fingerprints"
+            )
+        if num_perm < 1 or bands < 1 or num_perm % bands:
+            raise InvalidDesignError("bands must divide a positive num_perm")
+        if not 0.0 <= threshold <= 1.0:
+            raise InvalidDesignError("threshold must be between 0 and 1")
+        self.n_blocks: int = n_blocks
+        self.representation: str = representation
+        self.k: int = k
+        self.fingerprints: Optional[np.ndarray] = fingerprints
+        self.num_perm: int = num_perm
+        self.bands: int = bands
+        self.exact_limit: int = exact_limit
+        self.threshold: float = threshold
+        self._seeds: np.ndarray = (
+            np.random.default_rng(seed)
+            .integers(0, np.iinfo(np.int64).max, num_perm, dtype=np.int64)
+            .astype(np.uint64)
+        )
+        self._block_signatures: Optional[np.ndarray] = None
+        if representation == "fingerprint":
+            self._block_signatures = self._fingerprint_signatures(fingerprints)
+
+    def _fingerprint_signatures(self, fingerprints: np.ndarray) -> np.ndarray:
+        """Compute the signature of each block's fingerprint bits."""
+        as_bytes = np.ascontiguousarray(fingerprints).view(np.uint8)
+        bits = np.unpackbits(as_bytes, axis=1, bitorder="little").astype(bool)
+        table = _feature_hashes(np.arange(bits.shape[1]), self._seeds)
+        signatures = np.full((len(bits), self.num_perm), _EMPTY_SLOT)
+        for block, row in enumerate(bits):
+            if row.any():
+                signatures[block] = table[row].min(axis=0)
+        return signatures
+
+    def _packed_features(self, members: np.ndarray) -> np.ndarray:
+        """Pack each member's feature set into uint64 words."""
+        if self.representation == "fingerprint":
+            return np.bitwise_or.reduce(self.fingerprints[members], axis=-2)
+        ids = kmer_ids(members, self.n_blocks, self.k)
+        vocabulary, inverse = np.unique(ids, return_inverse=True)
+        inverse = inverse.reshape(ids.shape)
+        width = -(-len(vocabulary) // 64) * 64
+        bits = np.zeros(ids.shape[:-1] + (width,), dtype=np.uint8)
+        np.put_along_axis(bits, inverse, 1, axis=-1)
+        return pack_bits(bits)
+
+    def signatures(self, members: np.ndarray) -> np.ndarray:
+        """Compute the MinHash signatures of members.
+
+        Args:
+            members: The block indices, shape (..., length).
+
+        Returns:
+            The signatures, shape (..., num_perm).
+        """
+        members = np.asarray(members, dtype=np.int64)
+        flat = members.reshape(-1, members.shape[-1])
+        if self.representation == "fingerprint":
+            table, features = self._block_signatures, flat
+        else:
+            # Hash each distinct k-mer once, then gather by member
+            ids = kmer_ids(flat, self.n_blocks, self.k)
+            vocabulary, inverse = np.unique(ids, return_inverse=True)
+            table = _feature_hashes(vocabulary, self._seeds)
+            features = inverse.reshape(ids.shape)
+        signatures = np.empty((len(flat), self.num_perm), dtype=np.uint32)
+        for start in range(0, len(flat), SIGNATURE_CHUNK_SIZE):
+            chunk = features[start : start + SIGNATURE_CHUNK_SIZE]
+            signatures[start : start + len(chunk)] = table[chunk].min(axis=1)
+        return signatures.reshape(members.shape[:-1] + (self.num_perm,))
+
+    def _exact_similarity(self, members: np.ndarray) -> np.ndarray:
+        """Get the mean pairwise Tanimoto similarity by comparing all pairs."""
+        packed = self._packed_features(members)
+        counts = popcount(packed)
+        size = members.shape[-2]
+        totals = np.zeros(members.shape[:-2])
+        for row in range(size - 1):
+            common = popcount(packed[..., row : row + 1, :] & packed[..., row + 1 :, :])
+            union = counts[..., row : row + 1] + counts[..., row + 1 :] - common
+            # Two empty feature sets are identical
+            similar = np.where(union > 0, common / np.maximum(union, 1), 1.0)
+            totals += similar.sum(axis=-1)
+        return totals / (size * (size - 1) / 2)
+
+    def _estimated_similarity(self, members: np.ndarray) -> np.ndarray:
+        """Get the mean pairwise similarity from matching signature slots."""
+        ordered = np.sort(self.signatures(members), axis=-2)
+        size = ordered.shape[-2]
+        # Each member agrees with every earlier member of its run of equal values
+        rows = np.arange(size).reshape((size, 1))
+        same = np.zeros(ordered.shape, dtype=bool)
+        same[..., 1:, :] = ordered[..., 1:, :] == ordered[..., :-1, :]
+        run_starts = np.maximum.accumulate(np.where(same, 0, rows), axis=-2)
+        matching = (rows - run_starts).sum(axis=(-2, -1))
+        return matching / (self.num_perm * size * (size - 1) / 2)
+
+    def similarity(self, members: np.ndarray) -> np.ndarray:
+        """Get the mean pairwise similarity of libraries.
+
+        Libraries of up to exact_limit members are compared exactly, larger
+        ones are estimated from their signatures.
+
+        Args:
+            members: The block indices, shape (members, length) for one
+                library or (libraries, members, length).
+
+        Returns:
+            The mean Tanimoto similarity over member pairs, shape () or
+            (libraries,).
+
+        Raises:
+            InvalidDesignError: If a library has fewer than two members.
+        """
+        members = np.asarray(members, dtype=np.int64)
+        if members.shape[-2] < 2:
+            raise InvalidDesignError("Diversity needs two or more members")
+        if members.shape[-2] <= self.exact_limit:
+            return self._exact_similarity(members)
+        return self._estimated_similarity(members)
+
+    def score(self, members: np.ndarray) -> np.ndarray:
+        """Get the diversity of libraries.
+
+        Args:
+            members: The block indices, shape (members, length) for one
+                library or (libraries, members, length).
+
+        Returns:
+            The mean Tanimoto distance over member pairs, shape () or
+            (libraries,).
+        """
+        return 1.0 - self.similarity(members)
+
+    def near_duplicates(self, members: np.ndarray) -> np.ndarray:
+        """Find members with a near-duplicate by LSH.
+
+        Signatures are cut into bands, and members that agree on a whole
+        band are candidates. Pairs with similarity s become candidates with
+        probability 1 - (1 - s^r)^bands for r slots per band, a step near
+        (1 / bands)^(1 / r). Each member is checked against its neighbours
+        in the order of every band, and a candidate pair counts only if
+        its signatures agree in at least a threshold fraction of slots.
+
+        Args:
+            members: The block indices, shape (members, length) for one
+                library or (libraries, members, length).
+
+        Returns:
+            Whether each member has a near-duplicate in its library, shape
+            (members,) or (libraries, members).
+        """
+        members = np.asarray(members, dtype=np.int64)
+        signatures = self.signatures(members)
+        signatures = signatures.reshape((-1,) + signatures.shape[-2:])
+        rows = self.num_perm // self.bands
+        keys = np.zeros(signatures.shape[:-1] + (self.bands,), dtype=np.uint64)
+        for offset in range(rows):
+            keys = mix64(keys ^ signatures[..., offset::rows].astype(np.uint64))
+        duplicated = np.zeros(signatures.shape[:-1], dtype=bool)
+        for band in range(self.bands):
+            order = np.argsort(keys[..., band], axis=-1, kind="stable")
+            ordered = np.take_along_axis(keys[..., band], order, axis=-1)
+            library, position = np.nonzero(ordered[:, 1:] == ordered[:, :-1])
+            left = order[library, position]
+            right = order[library, position + 1]
+            agreement = (signatures[library, left] == signatures[library, right]).mean(
+                axis=-1
+            )
+            near = agreement >= self.threshold
+            duplicated[library[near], left[near]] = True
+            duplicated[library[near], right[near]] = True
+        return duplicated.reshape(members.shape[:-1])
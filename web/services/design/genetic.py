@@ -0,0 +1,450 @@
+# web/services/design/genetic.py
+"""
+This module contains the vectorized genetic algorithm engine.
+
+The whole population is one 2D integer array with a row per individual and
+a column per gene, each gene a block index. Selection, crossover and
+mutation are array operations over the whole population, and fitness
+functions score every individual in one call.
+
+For library design an individual is a whole library: its genome is the
+library's member sequences laid end to end, so gene g sits at position
+g % length of member g // length.
+
+Classes:
+    GeneticConfig: The parameters of a genetic algorithm run.
+    GeneticResult: The outcome of a genetic algorithm run.
+    GeneticEngine: The vectorized genetic algorithm engine.
+
+Functions:
+    property_fitness: Build a fitness function that targets a property.
+    mass_gap_fitness: Build a fitness function that spreads member masses.
+    diversity_fitness: Build a fitness function that diversifies members.
+    minhash_diversity_fitness: Build a fitness function that diversifies
+        member features.
+    run_strategy: Run a genetic design strategy.
+"""
+
+# Standard Library Imports
+from dataclasses import dataclass, field
+from typing import Callable, List, Optional, Sequence
+import math
+
+# External Imports
+import numpy as np
+
+# Internal Imports
+from web.core.exceptions.design_exceptions import InvalidDesignError
+from web.services.design.diversity import MinHashDiversity
+from web.services.design.mass_gap import DEFAULT_TOLERANCE_PPM, gap_statistics
+
+STRATEGIES = ("mass", "property", "diversity")
+
+FitnessFunction = Callable[[np.ndarray], np.ndarray]
+
+
+@dataclass
+class GeneticConfig:
+    """The parameters of a genetic algorithm run.
+
+    Attributes:
+        population_size: The number of individuals.
+        generations: The number of generations to evolve.
+        mutation_rate: The probability that a gene mutates per generation.
+        crossover_rate: The probability that a pair of parents recombines.
+        tournament_size: The number of individuals per selection tournament.
+        elitism: The number of best individuals copied unchanged.
+        seed: The random seed.
+    """
+
+    population_size: int = 100
+    generations: int = 50
+    mutation_rate: float = 0.1
+    crossover_rate: float = 0.9
+    tournament_size: int = 3
+    elitism: int = 1
+    seed: Optional[int] = None
+
+    def __post_init__(self) -> None:
+        """Validate the parameters.
+
+        Raises:
+            InvalidDesignError: If a parameter is out of range.
+        """
+        if self.population_size < 2 or self.generations < 0:
+            raise InvalidDesignError("The population needs at least two individuals")
+        if not 0.0 <= self.mutation_rate <= 1.0:
+            raise InvalidDesignError("The mutation rate must be between 0 and 1")
+        if not 0.0 <= self.crossover_rate <= 1.0:
+            raise InvalidDesignError("The crossover rate must be between 0 and 1")
+        if self.tournament_size < 1:
+            raise InvalidDesignError("Tournaments need at least one individual")
+        if not 0 <= self.elitism < self.population_size:
+            raise InvalidDesignError("Elitism must leave room for offspring")
+
+
+@dataclass
+class GeneticResult:
+    """The outcome of a genetic algorithm run.
+
+    Attributes:
+        population: The final population, shape (population_size, genes).
+        fitness: The fitness of the final population.
+        best: The best genome found over the whole run.
+        best_fitness: The fitness of the best genome.
+        best_history: The best fitness of each generation.
+        mean_history: The mean fitness of each generation.
+    """
+
+    population: np.ndarray
+    fitness: np.ndarray
+    best: np.ndarray
+    best_fitness: float
+    best_history: List[float] = field(default_factory=list)
+    mean_history: List[float] = field(default_factory=list)
+
+
+class GeneticEngine:
+    """The vectorized genetic algorithm engine.
+
+    Attributes:
+        gene_blocks: The blocks allowed at each gene, padded with -1, shape
+            (genes, max allowed).
+        gene_counts: The number of blocks allowed at each gene.
+        fitness: The batch fitness function, higher is better.
+        config: The run parameters.
+        rng: The random generator.
+
+    Methods:
+        initialize: Draw a random population.
+        select: Pick parents by tournament selection.
+        crossover: Recombine pairs of parents by uniform crossover.
+        mutate: Replace random genes with random allowed blocks.
+        run: Evolve a population.
+    """
+
+    def __init__(
+        self,
+        gene_blocks: Sequence[np.ndarray],
+        fitness: FitnessFunction,
+        config: GeneticConfig,
+    ) -> None:
+        """Initialize the engine.
+
+        Args:
+            gene_blocks: The block indices allowed at each gene.
+            fitness: The batch fitness function. It takes the population and
+                returns one float per individual, higher being better.
+            config: The run parameters.
+
+        Raises:
+            InvalidDesignError: If a gene allows no block.
+        """
+        if any(len(blocks) == 0 for blocks in gene_blocks):
+            raise InvalidDesignError("Every gene needs at least one allowed block")
+        width = max(len(blocks) for blocks in gene_blocks)
+        self.gene_blocks: np.ndarray = np.full((len(gene_blocks), width), -1)
+        for gene, blocks in enumerate(gene_blocks):
+            self.gene_blocks[gene, : len(blocks)] = blocks
+        self.gene_counts: np.ndarray = np.array([len(b) for b in gene_blocks])
+        self.fitness: FitnessFunction = fitness
+        self.config: GeneticConfig = config
+        self.rng: np.random.Generator = np.random.default_rng(config.seed)
+
+    def _random_genes(self, shape: tuple) -> np.ndarray:
+        """Draw random allowed blocks for every gene of shape (rows, genes)."""
+        picks = (self.rng.random(shape) * self.gene_counts).astype(np.int64)
+        return self.gene_blocks[np.arange(shape[1]), picks]
+
+    def initialize(self) -> np.ndarray:
+        """Draw a random population.
+
+        Returns:
+            The population, shape (population_size, genes).
+        """
+        return self._random_genes((self.config.population_size, len(self.gene_counts)))
+
+    def select(self, fitness: np.ndarray, count: int) -> np.ndarray:
+        """Pick parents by tournament selection.
+
+        Args:
+            fitness: The fitness of each individual.
+            count: The number of parents to pick.
+
+        Returns:
+            The row indices of the parents.
+        """
+        entrants = self.rng.integers(
+            0, len(fitness), (count, self.config.tournament_size)
+        )
+        winners = fitness[entrants].argmax(axis=1)
+        return entrants[np.arange(count), winners]
+
+    def crossover(self, parents: np.ndarray) -> np.ndarray:
+        """Recombine pairs of parents by uniform crossover.
+
+        Args:
+            parents: The parent genomes; rows 2i and 2i + 1 form a pair.
+
+        Returns:
+            The offspring genomes, one per parent.
+        """
+        first, second = parents[0::2], parents[1::2]
+        swap = self.rng.random(first.shape, dtype=np.float32) < 0.5
+        swap &= (self.rng.random(len(first)) < self.config.crossover_rate)[:, None]
+        offspring = parents.copy()
+        offspring[0::2] = np.where(swap, second, first)
+        offspring[1::2] = np.where(swap, first, second)
+        return offspring
+
+    def mutate(self, population: np.ndarray) -> np.ndarray:
+        """Replace random genes with random allowed blocks.
+
+        Args:
+            population: The genomes to mutate in place.
+
+        Returns:
+            The mutated genomes.
+        """
+        mask = (
+            self.rng.random(population.shape, dtype=np.float32)
+            < self.config.mutation_rate
+        )
+        rows, genes = np.nonzero(mask)
+        picks = (self.rng.random(len(genes)) * self.gene_counts[genes]).astype(np.int64)
+        population[rows, genes] = self.gene_blocks[genes, picks]
+        return population
+
+    def run(
+        self,
+        population: Optional[np.ndarray] = None,
+        callback: Optional[Callable[[int, np.ndarray, np.ndarray], None]] = None,
+    ) -> GeneticResult:
+        """Evolve a population.
+
+        Args:
+            population: The starting population. Defaults to a random one.
+            callback: Called after each generation with the generation
+                number, the population and its fitness.
+
+        Returns:
+            The outcome of the run.
+        """
+        config = self.config
+        population = self.initialize() if population is None else population.copy()
+        fitness = np.asarray(self.fitness(population), dtype=float)
+        result = GeneticResult(population, fitness, population[0], -math.inf)
+
+        offspring_count = config.population_size - config.elitism
+        pairs = (offspring_count + 1) // 2
+        for generation in range(config.generations + 1):
+            leader = int(fitness.argmax())
+            if fitness[leader] > result.best_fitness:
+                result.best = population[leader].copy()
+                result.best_fitness = float(fitness[leader])
+            result.best_history.append(float(fitness[leader]))
+            result.mean_history.append(float(fitness.mean()))
+            if callback is not None:
+                callback(generation, population, fitness)
+            if generation == config.generations:
+                break
+
+            parents = population[self.select(fitness, 2 * pairs)]
+            offspring = self.mutate(self.crossover(parents))[:offspring_count]
+            if config.elitism:
+                elite = np.argpartition(-fitness, config.elitism - 1)[: config.elitism]
+                offspring = np.concatenate([population[elite], offspring])
+            population = offspring
+            fitness = np.asarray(self.fitness(population), dtype=float)
+
+        result.population, result.fitness = population, fitness
+        return result
+
+
+def _members(population: np.ndarray, length: int) -> np.ndarray:
+    """View genomes as libraries, shape (population, members, length)."""
+    return population.reshape(len(population), -1, length)
+
+
+def _member_sums(population: np.ndarray, contributions: np.ndarray) -> np.ndarray:
+    """Sum per-position contributions over each member of each library."""
+    length = contributions.shape[0]
+    members = _members(population, length)
+    return contributions[np.arange(length), members].sum(axis=-1)
+
+
+def property_fitness(
+    contributions: np.ndarray,
+    target: Optional[float] = None,
+    maximize: bool = True,
+) -> FitnessFunction:
+    """Build a fitness function that targets a property.
+
+    Args:
+        contributions: What each block adds to the property at each position,
+            shape (length, n_blocks).
+        target: The property value to approach. If None, the property is
+            maximized or minimized instead.
+        maximize: Whether to maximize the property when there is no target.
+
+    Returns:
+        The fitness function, scoring each library by its mean member score.
+    """
+
+    def fitness(population: np.ndarray) -> np.ndarray:
+        values = _member_sums(population, contributions)
+        if target is not None:
+            values = -np.abs(values - target)
+        elif not maximize:
+            values = -values
+        return np.nan_to_num(values.mean(axis=1), nan=-np.inf)
+
+    return fitness
+
+
+def mass_gap_fitness(
+    contributions: np.ndarray,
+    tolerance_ppm: float = DEFAULT_TOLERANCE_PPM,
+    isotopes: int = 0,
+) -> FitnessFunction:
+    """Build a fitness function that spreads member masses.
+
+    Libraries are ranked first by how many members are resolved from every
+    other member, then by their smallest gap, which saturates at the
+    tolerance so that it only breaks ties.
+
+    Args:
+        contributions: What each block adds to the member mass at each
+            position, shape (length, n_blocks).
+        tolerance_ppm: The smallest gap at which two peaks are resolved.
+        isotopes: The number of heavy isotope peaks per member.
+
+    Returns:
+        The fitness function, scoring each library by its resolved members
+        plus a fraction for its smallest mass gap.
+    """
+
+    def fitness(population: np.ndarray) -> np.ndarray:
+        masses = _member_sums(population, contributions)
+        statistics = gap_statistics(masses, tolerance_ppm, isotopes)
+        gaps = statistics.min_gap_ppm
+        scores = statistics.resolved + gaps / (gaps + tolerance_ppm)
+        return np.where(np.isnan(masses).any(axis=1), -np.inf, scores)
+
+    return fitness
+
+
+def diversity_fitness(length: int, n_blocks: int) -> FitnessFunction:
+    """Build a fitness function that diversifies members.
+
+    The mean pairwise Hamming distance between members is computed from the
+    block counts at each position, in time linear in the library size.
+
+    Args:
+        length: The member length.
+        n_blocks: The number of blocks.
+
+    Returns:
+        The fitness function, scoring each library by the mean Hamming
+        distance between its members.
+    """
+
+    def fitness(population: np.ndarray) -> np.ndarray:
+        members = _members(population, length)
+        size = members.shape[1]
+        # Count every (library, position, block) triple with one bincount
+        keys = (
+            np.arange(len(population))[:, None, None] * length
+            + np.arange(length)[None, None, :]
+        ) * n_blocks + members
+        counts = np.bincount(
+            keys.ravel(), minlength=len(population) * length * n_blocks
+        )
+        squares = (counts.astype(float) ** 2).reshape(len(population), -1).sum(axis=1)
+        matching_pairs = (squares - size * length) / 2
+        total_pairs = size * (size - 1) / 2
+        return length - matching_pairs / total_pairs
+
+    return fitness
+
+
+def minhash_diversity_fitness(
+    diversity: MinHashDiversity, length: int
+) -> FitnessFunction:
+    """Build a fitness function that diversifies member features.
+
+    Args:
+        diversity: The diversity engine, which compares members by k-mers or
+            fingerprints, exactly or by MinHash depending on library size.
+        length: The member length.
+
+    Returns:
+        The fitness function, scoring each library by the mean Tanimoto
+        distance between its members, less the fraction of its members
+        with a near-duplicate, so clusters of near-identical members cost
+        more than their share of the mean.
+    """
+
+    def fitness(population: np.ndarray) -> np.ndarray:
+        members = _members(population, length)
+        duplicates = diversity.near_duplicates(members).mean(axis=-1)
+        return diversity.score(members) - duplicates
+
+    return fitness
+
+
+def run_strategy(
+    strategy: str,
+    position_sets: Sequence[np.ndarray],
+    library_size: int,
+    config: GeneticConfig,
+    contributions: Optional[np.ndarray] = None,
+    n_blocks: Optional[int] = None,
+    target: Optional[float] = None,
+    maximize: bool = True,
+    tolerance_ppm: float = DEFAULT_TOLERANCE_PPM,
+    isotopes: int = 0,
+    diversity: Optional[MinHashDiversity] = None,
+) -> GeneticResult:
+    """Run a genetic design strategy.
+
+    Args:
+        strategy: The strategy, one of STRATEGIES.
+        position_sets: The blocks allowed at each member position.
+        library_size: The number of members per library.
+        config: The run parameters.
+        contributions: The per-position property contributions, shape
+            (length, n_blocks); the mass for the mass strategy.
+        n_blocks: The number of blocks, for the diversity strategy.
+        target: The property target, for the property strategy.
+        maximize: Whether to maximize the property without a target.
+        tolerance_ppm: The resolving tolerance, for the mass strategy.
+        isotopes: The heavy isotope peaks per member, for the mass strategy.
+        diversity: The feature diversity engine, for the diversity strategy.
+            Members are compared by Hamming distance without one.
+
+    Returns:
+        The outcome of the run; genomes are libraries of library_size members.
+
+    Raises:
+        InvalidDesignError: If the strategy or its inputs are invalid.
+    """
+    length = len(position_sets)
+    if strategy == "property" and contributions is not None:
+        fitness = property_fitness(contributions, target, maximize)
+    elif strategy == "mass" and contributions is not None:
+        if library_size < 2:
+            raise InvalidDesignError("Mass differentiation needs two or more members")
+        fitness = mass_gap_fitness(contributions, tolerance_ppm, isotopes)
+    elif strategy == "diversity" and not (diversity is None and n_blocks is None):
+        if library_size < 2:
+            raise InvalidDesignError("Diversity optimization needs two or more members")
+        fitness = (
+            diversity_fitness(length, n_blocks)
+            if diversity is None
+            else minhash_diversity_fitness(diversity, length)
+        )
+    else:
+        raise InvalidDesignError(f"Unknown or incomplete genetic strategy: {strategy}")
+    gene_blocks = list(position_sets) * library_size
+    return GeneticEngine(gene_blocks, fitness, config).run()
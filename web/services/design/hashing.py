@@ -0,0 +1,274 @@
+# web/services/design/hashing.py
+"""
+This module contains the vectorized hashing helpers of library design.
+
+Sequences are hashed a whole batch at a time: every row of a block index
+array folds into one 64-bit key with the splitmix64 finalizer. A Bloom
+filter over those keys tracks which sequences have been seen in fixed
+memory, however many are inserted; it never misses a seen sequence and
+reports an unseen one as seen with probability error_rate. Where exact
+answers are needed, a key set stores the keys themselves in an open-
+addressing table at 8 to 16 bytes per key.
+
+Classes:
+    BloomFilter: A fixed-size Bloom filter over 64-bit keys.
+    KeySet: A growable open-addressing hash set of 64-bit keys.
+
+Functions:
+    mix64: Scramble uint64 values with the splitmix64 finalizer.
+    hash_rows: Hash each row of an integer array to a 64-bit key.
+"""
+
+# Standard Library Imports
+import math
+
+# External Imports
+import numpy as np
+
+# Internal Imports
+from web.core.exceptions.design_exceptions import InvalidDesignError
+
+_GOLDEN = np.uint64(0x9E3779B97F4A7C15)
+
+
+def mix64(values: np.ndarray) -> np.ndarray:
+    """Scramble uint64 values with the splitmix64 finalizer.
+
+    Args:
+        values: The uint64 values, any shape.
+
+    Returns:
+        The scrambled values, same shape.
+    """
+    values = values ^ (values >> np.uint64(30))
+    values = values * np.uint64(0xBF58476D1CE4E5B9)
+    values = values ^ (values >> np.uint64(27))
+    values = values * np.uint64(0x94D049BB133111EB)
+    return values ^ (values >> np.uint64(31))
+
+
+def hash_rows(rows: np.ndarray) -> np.ndarray:
+    """Hash each row of an integer array to a 64-bit key.
+
+    Args:
+        rows: The integer array, shape (..., width).
+
+    Returns:
+        The uint64 key of each row, shape (...).
+    """
+    rows = np.asarray(rows).astype(np.int64).view(np.uint64)
+    keys = np.full(rows.shape[:-1], np.uint64(rows.shape[-1]))
+    for column in range(rows.shape[-1]):
+        keys = mix64(keys * _GOLDEN + rows[..., column])
+    return keys
+
+
+class BloomFilter:
+    """A fixed-size Bloom filter over 64-bit keys.
+
+    Attributes:
+        n_bits: The number of bits.
+        n_hashes: The number of bits set per key.
+        count: The number of distinct keys added, as far as the filter can
+            tell.
+
+    Methods:
+        contains: Check which keys may have been added.
+        add: Add keys, reporting which ones are new.
+    """
+
+    def __init__(self, capacity: int, error_rate: float = 1e-3) -> None:
+        """Initialize an empty filter.
+
+        Args:
+            capacity: The number of keys the filter is sized for.
+            error_rate: The false positive rate at capacity.
+
+        Raises:
+            InvalidDesignError: If the capacity or error rate is out of range.
+        """
+        if capacity < 1 or not 0 < error_rate < 1:
+            raise InvalidDesignError("Bloom filters need capacity >= 1, 0 < error < 1")
+        n_bits = math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        self.n_bits: int = -(-n_bits // 64) * 64
+        self.n_hashes: int = max(1, round(self.n_bits / capacity * math.log(2)))
+        self.count: int = 0
+        self._words: np.ndarray = np.zeros(self.n_bits // 64, dtype=np.uint64)
+
+    def _positions(self, keys: np.ndarray) -> np.ndarray:
+        """Get the bit positions of keys by double hashing."""
+        first = mix64(keys)
+        second = mix64(first ^ _GOLDEN) | np.uint64(1)
+        steps = np.arange(self.n_hashes, dtype=np.uint64)
+        return (first[:, None] + steps * second[:, None]) % np.uint64(self.n_bits)
+
+    def contains(self, keys: np.ndarray) -> np.ndarray:
+        """Check which keys may have been added.
+
+        Args:
+            keys: The uint64 keys.
+
+        Returns:
+            False for keys never added, True for added keys and for a
+            fraction of about error_rate of the others.
+        """
+        positions = self._positions(np.asarray(keys, dtype=np.uint64).ravel())
+        words = self._words[positions >> np.uint64(6)]
+        bits = (words >> (positions & np.uint64(63))) & np.uint64(1)
+        return bits.astype(bool).all(axis=1)
+
+    def add(self, keys: np.ndarray) -> np.ndarray:
+        """Add keys, reporting which ones are new.
+
+        Args:
+            keys: The uint64 keys; repeats within the batch count once.
+
+        Returns:
+            Whether each key was absent before, True for the first
+            occurrence of each new key only.
+        """
+        keys = np.asarray(keys, dtype=np.uint64).ravel()
+        unique, first = np.unique(keys, return_index=True)
+        fresh = ~self.contains(unique)
+        positions = self._positions(unique[fresh]).ravel()
+        np.bitwise_or.at(
+            self._words,
+            positions >> np.uint64(6),
+            np.uint64(1) << (positions & np.uint64(63)),
+        )
+        self.count += int(fresh.sum())
+        new = np.zeros(len(keys), dtype=bool)
+        new[first[fresh]] = True
+        return new
+
+
+class KeySet:
+    """A growable open-addressing hash set of 64-bit keys.
+
+    Keys live in a power-of-two table of uint64 slots with linear probing,
+    zero marking an empty slot, and the zero key is tracked separately. A
+    batch is inserted with array operations, one probe step for all of its
+    keys at a time; colliding claims on an empty slot are settled by
+    writing every claim and reading back which one landed.
+
+    Attributes:
+        count: The number of keys in the set.
+
+    Methods:
+        contains: Check which keys are in the set.
+        add: Add keys, reporting which ones are new.
+    """
+
+    def __init__(self, capacity: int = 1024, max_load: float = 0.5) -> None:
+        """Initialize an empty set.
+
+        Args:
+            capacity: The number of keys to size the table for; it doubles
+                whenever it fills past max_load.
+            max_load: The largest fraction of occupied slots.
+
+        Raises:
+            InvalidDesignError: If the capacity or load is out of range.
+        """
+        if capacity < 1 or not 0 < max_load < 1:
+            raise InvalidDesignError("Key sets need capacity >= 1, 0 < load < 1")
+        self.max_load: float = max_load
+        self.count: int = 0
+        self._has_zero: bool = False
+        n_slots = 1 << max(4, math.ceil(math.log2(capacity / max_load)))
+        self._table: np.ndarray = np.zeros(n_slots, dtype=np.uint64)
+
+    def __len__(self) -> int:
+        return self.count
+
+    def _slots(self, keys: np.ndarray) -> np.ndarray:
+        """Get the home slot of each key."""
+        mask = np.uint64(len(self._table) - 1)
+        return (mix64(keys) & mask).astype(np.int64)
+
+    def contains(self, keys: np.ndarray) -> np.ndarray:
+        """Check which keys are in the set.
+
+        Args:
+            keys: The uint64 keys.
+
+        Returns:
+            Whether each key is in the set.
+        """
+        keys = np.asarray(keys, dtype=np.uint64).ravel()
+        found = keys == 0 if self._has_zero else np.zeros(len(keys), dtype=bool)
+        active = np.flatnonzero(keys != 0)
+        slots = self._slots(keys[active])
+        mask = len(self._table) - 1
+        while len(active):
+            current = self._table[slots]
+            hit = current == keys[active]
+            found[active[hit]] = True
+            # Probing stops at a match or at an empty slot
+            keep = ~hit & (current != 0)
+            active = active[keep]
+            slots = (slots[keep] + 1) & mask
+        return found
+
+    def _insert(self, keys: np.ndarray) -> np.ndarray:
+        """Insert nonzero keys, reporting the first occurrence of new ones."""
+        table = self._table
+        mask = len(table) - 1
+        landed_at = np.full(len(keys), -1, dtype=np.int64)
+        active = np.arange(len(keys))
+        slots = self._slots(keys)
+        while len(active):
+            current = table[slots]
+            pending = keys[active]
+            empty = np.flatnonzero(current == 0)
+            table[slots[empty]] = pending[empty]
+            landed = empty[table[slots[empty]] == pending[empty]]
+            landed_at[active[landed]] = slots[landed]
+            # Keys that found themselves are done; the rest move on, except
+            # losers of a claim, which look at the now-filled slot again
+            done = current == pending
+            done[landed] = True
+            slots = np.where(current != 0, (slots + 1) & mask, slots)
+            active = active[~done]
+            slots = slots[~done]
+        # Repeats of a key probe in step and land in the same slot together;
+        # only the first of them is new
+        landed = np.flatnonzero(landed_at >= 0)
+        order = np.sort(landed_at[landed] * len(keys) + landed)
+        first = np.ones(len(order), dtype=bool)
+        first[1:] = order[1:] // len(keys) != order[:-1] // len(keys)
+        new = np.zeros(len(keys), dtype=bool)
+        new[order[first] % len(keys)] = True
+        return new
+
+    def _grow(self) -> None:
+        """Double the table and reinsert its keys."""
+        keys = self._table[self._table != 0]
+        self._table = np.zeros(2 * len(self._table), dtype=np.uint64)
+        self._insert(keys)
+
+    def add(self, keys: np.ndarray) -> np.ndarray:
+        """Add keys, reporting which ones are new.
+
+        Args:
+            keys: The uint64 keys; repeats within the batch count once.
+
+        Returns:
+            Whether each key was absent before, True for the first
+            occurrence of each new key only.
+        """
+        keys = np.asarray(keys, dtype=np.uint64).ravel()
+        new = np.zeros(len(keys), dtype=bool)
+        zero = keys == 0
+        if not self._has_zero and zero.any():
+            new[np.argmax(zero)] = True
+            self._has_zero = True
+            self.count += 1
+        nonzero = np.flatnonzero(~zero)
+        # Grow for the worst case of every key being new
+        while self.count + len(nonzero) > self.max_load * len(self._table):
+            self._grow()
+        fresh = self._insert(keys[nonzero])
+        new[nonzero[fresh]] = True
+        self.count += int(fresh.sum())
+        return new
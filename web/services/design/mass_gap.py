@@ -0,0 +1,277 @@
+# web/services/design/mass_gap.py
+"""
+This module contains the mass-gap kernels of mass differentiation design.
+
+A library is resolvable by mass spectrometry when every member's peaks are
+far enough, relative to their mass, from every other member's peaks. After
+one sort, the closest peak of another member always sits next to a peak in
+sorted order, so each member's nearest gap comes from adjacent pairs and
+whole-library statistics cost O(N log N) instead of comparing all pairs.
+
+Peaks may include a member's isotope envelope, estimated from its mass with
+the averagine model, so that a heavy isotope of one member colliding with
+another member's monoisotopic peak counts as a collision.
+
+Classes:
+    GapStatistics: The mass-gap statistics of libraries.
+    MassGapIndex: An incrementally updated mass-gap index of one library.
+
+Functions:
+    isotope_envelope: Get the isotope peaks of masses.
+    gap_statistics: Compute the mass-gap statistics of libraries.
+"""
+
+# Standard Library Imports
+from dataclasses import dataclass
+from typing import List, Set
+import math
+
+# External Imports
+import numpy as np
+
+# Mass difference between the carbon-13 and carbon-12 isotopes
+NEUTRON_SPACING: float = 1.0033548378
+# Averagine carbons per dalton and the natural carbon-13 abundance
+AVERAGINE_CARBONS_PER_DA: float = 4.9384 / 111.1254
+CARBON13_ABUNDANCE: float = 0.0107
+DEFAULT_TOLERANCE_PPM: float = 5.0
+DEFAULT_MIN_INTENSITY: float = 0.05
+
+
+def isotope_envelope(
+    masses: np.ndarray, isotopes: int = 0, min_intensity: float = DEFAULT_MIN_INTENSITY
+) -> np.ndarray:
+    """Get the isotope peaks of masses.
+
+    Peak intensities follow a Poisson distribution in the number of
+    carbon-13 atoms of an averagine molecule of the same mass. Peaks weaker
+    than min_intensity relative to the strongest are dropped.
+
+    Args:
+        masses: The monoisotopic masses, any shape.
+        isotopes: The number of heavy isotope peaks to consider.
+        min_intensity: The weakest relative intensity kept.
+
+    Returns:
+        The peak masses, shape masses.shape + (isotopes + 1,), NaN where a
+        peak is dropped.
+    """
+    masses = np.asarray(masses, dtype=float)
+    shifts = np.arange(isotopes + 1) * NEUTRON_SPACING
+    peaks = masses[..., None] + shifts
+    if isotopes:
+        rate = masses[..., None] * AVERAGINE_CARBONS_PER_DA * CARBON13_ABUNDANCE
+        k = np.arange(isotopes + 1)
+        log_factorials = np.array([math.lgamma(i + 1) for i in k])
+        log_intensity = k * np.log(np.maximum(rate, 1e-300)) - log_factorials
+        relative = np.exp(log_intensity - log_intensity.max(axis=-1, keepdims=True))
+        peaks = np.where(relative >= min_intensity, peaks, np.nan)
+    return peaks
+
+
+@dataclass
+class GapStatistics:
+    """The mass-gap statistics of libraries.
+
+    Attributes:
+        nearest_ppm: The gap from each member to the closest peak of another
+            member, in ppm, shape (libraries, members).
+        min_gap_ppm: The smallest gap of each library.
+        resolved: The number of members of each library whose nearest gap is
+            at least the tolerance.
+    """
+
+    nearest_ppm: np.ndarray
+    min_gap_ppm: np.ndarray
+    resolved: np.ndarray
+
+
+def gap_statistics(
+    masses: np.ndarray,
+    tolerance_ppm: float = DEFAULT_TOLERANCE_PPM,
+    isotopes: int = 0,
+    min_intensity: float = DEFAULT_MIN_INTENSITY,
+) -> GapStatistics:
+    """Compute the mass-gap statistics of libraries.
+
+    Args:
+        masses: The member masses, shape (members,) for one library or
+            (libraries, members).
+        tolerance_ppm: The smallest gap at which two peaks are resolved.
+        isotopes: The number of heavy isotope peaks per member.
+        min_intensity: The weakest relative isotope intensity kept.
+
+    Returns:
+        The statistics, with a leading library axis.
+    """
+    masses = np.atleast_2d(np.asarray(masses, dtype=float))
+    libraries, members = masses.shape
+    peaks = isotope_envelope(masses, isotopes, min_intensity).reshape(libraries, -1)
+    owners = np.repeat(np.arange(members), isotopes + 1)
+
+    order = np.argsort(peaks, axis=1)
+    ordered = np.take_along_axis(peaks, order, axis=1)
+    ordered_owners = owners[order]
+    with np.errstate(invalid="ignore"):
+        gaps = np.diff(ordered, axis=1) / ordered[:, :-1] * 1e6
+    crossing = ordered_owners[:, 1:] != ordered_owners[:, :-1]
+    gaps = np.where(crossing & np.isfinite(gaps), gaps, np.inf)
+
+    # Each peak's nearest foreign neighbour, then each member's closest peak
+    padding = np.full((libraries, 1), np.inf)
+    per_peak = np.minimum(
+        np.concatenate([padding, gaps], axis=1),
+        np.concatenate([gaps, padding], axis=1),
+    )
+    unsorted = np.empty_like(per_peak)
+    np.put_along_axis(unsorted, order, per_peak, axis=1)
+    nearest = unsorted.reshape(libraries, members, -1).min(axis=2)
+    return GapStatistics(
+        nearest, nearest.min(axis=1), (nearest >= tolerance_ppm).sum(axis=1)
+    )
+
+
+class MassGapIndex:
+    """An incrementally updated mass-gap index of one library.
+
+    The peaks of all members are kept sorted. Changing one member's mass
+    moves its peaks by binary search, shifting only the peaks between the
+    old and new positions, and recomputes the nearest gaps of only the
+    members whose neighbours changed.
+
+    Attributes:
+        masses: The mass of each member.
+        tolerance_ppm: The smallest gap at which two peaks are resolved.
+        isotopes: The number of heavy isotope peaks per member.
+        min_intensity: The weakest relative isotope intensity kept.
+        peaks: The sorted peak masses.
+        owners: The member of each sorted peak.
+        member_peaks: The peak masses of each member.
+        nearest_ppm: The nearest gap of each member.
+        resolved: The number of resolved members.
+
+    Methods:
+        update: Change the mass of one member.
+        min_gap_ppm: Get the smallest gap of the library.
+    """
+
+    def __init__(
+        self,
+        masses: np.ndarray,
+        tolerance_ppm: float = DEFAULT_TOLERANCE_PPM,
+        isotopes: int = 0,
+        min_intensity: float = DEFAULT_MIN_INTENSITY,
+    ) -> None:
+        """Initialize the index.
+
+        Args:
+            masses: The member masses.
+            tolerance_ppm: The smallest gap at which two peaks are resolved.
+            isotopes: The number of heavy isotope peaks per member.
+            min_intensity: The weakest relative isotope intensity kept.
+        """
+        self.masses: np.ndarray = np.array(masses, dtype=float)
+        self.tolerance_ppm: float = tolerance_ppm
+        self.isotopes: int = isotopes
+        self.min_intensity: float = min_intensity
+
+        peaks = isotope_envelope(self.masses, isotopes, min_intensity).ravel()
+        owners = np.repeat(np.arange(len(self.masses)), isotopes + 1)
+        kept = np.isfinite(peaks)
+        order = np.argsort(peaks[kept], kind="stable")
+        self.peaks: np.ndarray = peaks[kept][order]
+        self.owners: np.ndarray = owners[kept][order]
+
+        self.member_peaks: List[np.ndarray] = [self._envelope(m) for m in self.masses]
+        statistics = gap_statistics(self.masses, tolerance_ppm, isotopes, min_intensity)
+        self.nearest_ppm: np.ndarray = statistics.nearest_ppm[0]
+        self.resolved: int = int(statistics.resolved[0])
+
+    def _envelope(self, mass: float) -> np.ndarray:
+        peaks = isotope_envelope(mass, self.isotopes, self.min_intensity)
+        return peaks[np.isfinite(peaks)]
+
+    def _locate(self, peak: float, member: int) -> int:
+        """Find the sorted position of one of a member's peaks."""
+        position = int(np.searchsorted(self.peaks, peak))
+        while self.owners[position] != member:
+            position += 1
+        return position
+
+    def _positions(self, member: int) -> List[int]:
+        """Find the sorted positions of a member's peaks."""
+        return [self._locate(peak, member) for peak in self.member_peaks[member]]
+
+    def _move(self, member: int, old: float, new: float) -> None:
+        """Move one of a member's peaks, shifting only the peaks in between."""
+        source = self._locate(old, member)
+        target = int(np.searchsorted(self.peaks, new))
+        if target > source:
+            target -= 1
+            self.peaks[source:target] = self.peaks[source + 1 : target + 1]
+            self.owners[source:target] = self.owners[source + 1 : target + 1]
+        else:
+            self.peaks[target + 1 : source + 1] = self.peaks[target:source]
+            self.owners[target + 1 : source + 1] = self.owners[target:source]
+        self.peaks[target] = new
+        self.owners[target] = member
+
+    def _neighbours(self, positions: List[int]) -> Set[int]:
+        """Get the members owning the peaks next to positions."""
+        found: Set[int] = set()
+        for position in positions:
+            for neighbour in (position - 1, position + 1):
+                if 0 <= neighbour < len(self.peaks):
+                    found.add(int(self.owners[neighbour]))
+        return found
+
+    def _gap(self, left: int, right: int) -> float:
+        if left < 0 or right >= len(self.peaks):
+            return math.inf
+        if self.owners[left] == self.owners[right]:
+            return math.inf
+        return (self.peaks[right] - self.peaks[left]) / self.peaks[left] * 1e6
+
+    def _nearest(self, member: int) -> float:
+        return min(
+            min(self._gap(position - 1, position), self._gap(position, position + 1))
+            for position in self._positions(member)
+        )
+
+    def update(self, member: int, mass: float) -> None:
+        """Change the mass of one member.
+
+        Args:
+            member: The member index.
+            mass: The member's new mass.
+        """
+        affected = self._neighbours(self._positions(member))
+        old_peaks, new_peaks = self.member_peaks[member], self._envelope(mass)
+        if len(old_peaks) == len(new_peaks):
+            for old, new in zip(old_peaks, new_peaks):
+                self._move(member, old, new)
+        else:
+            # The envelope changed size, so rebuild the arrays around it
+            positions = self._positions(member)
+            self.peaks = np.delete(self.peaks, positions)
+            self.owners = np.delete(self.owners, positions)
+            insert_at = np.searchsorted(self.peaks, new_peaks)
+            self.peaks = np.insert(self.peaks, insert_at, new_peaks)
+            self.owners = np.insert(self.owners, insert_at, member)
+        self.masses[member] = mass
+        self.member_peaks[member] = new_peaks
+        affected |= self._neighbours(self._positions(member))
+        affected.add(member)
+
+        for other in affected:
+            self.resolved -= int(self.nearest_ppm[other] >= self.tolerance_ppm)
+            self.nearest_ppm[other] = self._nearest(other)
+            self.resolved += int(self.nearest_ppm[other] >= self.tolerance_ppm)
+
+    def min_gap_ppm(self) -> float:
+        """Get the smallest gap of the library.
+
+        Returns:
+            The smallest nearest gap over all members, in ppm.
+        """
+        return float(self.nearest_ppm.min())
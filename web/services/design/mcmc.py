@@ -0,0 +1,489 @@
+# web/services/design/mcmc.py
+"""
+This module contains the parallel-tempering MCMC sequence sampler.
+
+Every chain at every temperature is one row of a padded 2D integer array of
+block indices, with its length kept alongside; rows past a chain's length
+hold PADDING. A step proposes one move for every row at once, scores all
+proposals with one call of the batch energy function and accepts them with
+one vectorized draw, so throughput grows with the number of chains rather
+than with Python loop iterations.
+
+Chains sample the Boltzmann distribution exp(-energy / temperature). Each
+temperature of the ladder holds the same number of chains, and replicas at
+neighbouring temperatures periodically exchange states so that the coldest
+chains, the ones reported, can escape local minima.
+
+Moves:
+    point: replace the block at one position.
+    swap: exchange the blocks at two positions.
+    insertion: insert a block at, or delete the block at, one position.
+
+Classes:
+    MCMCConfig: The parameters of a parallel-tempering run.
+    MCMCResult: The outcome of a parallel-tempering run.
+    ParallelTempering: The vectorized parallel-tempering sampler.
+
+Functions:
+    effective_sample_size: Estimate the effective sample size of traces.
+    property_sum: Build a function that sums a property over padded sequences.
+    property_energy: Build an energy function that targets a property.
+"""
+
+# Standard Library Imports
+from dataclasses import dataclass, field
+from typing import Callable, Optional, Sequence, Tuple
+
+# External Imports
+import numpy as np
+
+# Internal Imports
+from web.core.exceptions.design_exceptions import InvalidDesignError
+
+MOVES = ("point", "swap", "insertion")
+CRITERIA = ("metropolis", "glauber")
+PADDING: int = -1
+
+# Takes padded sequences and their lengths, returns one energy per row
+EnergyFunction = Callable[[np.ndarray, np.ndarray], np.ndarray]
+StepCallback = Callable[[int, np.ndarray, np.ndarray, np.ndarray], None]
+
+
+@dataclass
+class MCMCConfig:
+    """The parameters of a parallel-tempering run.
+
+    Attributes:
+        chains: The number of chains per temperature.
+        temperatures: The number of temperatures in the ladder.
+        t_min: The temperature of the reported chains.
+        t_max: The hottest temperature; the ladder is geometric in between.
+        steps: The number of steps to run.
+        min_length: The shortest sequence length.
+        max_length: The longest sequence length.
+        move_weights: The relative frequency of each move in MOVES.
+        swap_interval: The number of steps between replica exchanges.
+        criterion: The acceptance criterion, one of CRITERIA.
+        seed: The random seed.
+    """
+
+    chains: int = 16
+    temperatures: int = 4
+    t_min: float = 1.0
+    t_max: float = 10.0
+    steps: int = 1000
+    min_length: int = 8
+    max_length: int = 8
+    move_weights: Tuple[float, float, float] = (0.6, 0.2, 0.2)
+    swap_interval: int = 10
+    criterion: str = "metropolis"
+    seed: Optional[int] = None
+
+    def __post_init__(self) -> None:
+        """Validate the parameters.
+
+        Raises:
+            InvalidDesignError: If a parameter is out of range.
+        """
+        if self.chains < 1 or self.temperatures < 1 or self.steps < 0:
+            raise InvalidDesignError("chains and temperatures must be positive")
+        if not 0 < self.t_min <= self.t_max:
+            raise InvalidDesignError("Temperatures must satisfy 0 < t_min <= t_max")
+        if not 1 <= self.min_length <= self.max_length:
+            raise InvalidDesignError(
+                "Lengths must satisfy 1 <= min_length <= max_length"
+            )
+        if len(self.move_weights) != len(MOVES) or min(self.move_weights) < 0:
+            raise InvalidDesignError(f"move_weights needs one weight per move {MOVES}")
+        if sum(self.move_weights) <= 0:
+            raise InvalidDesignError("At least one move needs a positive weight")
+        if self.swap_interval < 1:
+            raise InvalidDesignError("swap_interval must be positive")
+        if self.criterion not in CRITERIA:
+            raise InvalidDesignError(f"Unknown acceptance criterion: {self.criterion}")
+
+    @property
+    def ladder(self) -> np.ndarray:
+        """The temperature of each rung, coldest first."""
+        return np.geomspace(self.t_min, self.t_max, self.temperatures)
+
+
+@dataclass
+class MCMCResult:
+    """The outcome of a parallel-tempering run.
+
+    Attributes:
+        sequences: The final states of the coldest chains, padded.
+        lengths: The lengths of the final states.
+        energies: The energies of the final states.
+        best: The lowest-energy sequence found by a coldest chain.
+        best_energy: The energy of the best sequence.
+        energy_trace: The energies of the coldest chains at every step,
+            shape (steps + 1, chains), empty unless the trace was kept.
+        acceptance: The move acceptance rate of every chain, shape
+            (temperatures, chains).
+        swap_acceptance: The exchange acceptance rate between each pair of
+            neighbouring temperatures.
+        ess: The effective sample size of each coldest chain's energies,
+            NaN unless the trace was kept.
+        temperatures: The temperature ladder.
+    """
+
+    sequences: np.ndarray
+    lengths: np.ndarray
+    energies: np.ndarray
+    best: np.ndarray
+    best_energy: float
+    energy_trace: np.ndarray
+    acceptance: np.ndarray
+    swap_acceptance: np.ndarray
+    ess: np.ndarray
+    temperatures: np.ndarray = field(default_factory=lambda: np.empty(0))
+
+
+def effective_sample_size(traces: np.ndarray) -> np.ndarray:
+    """Estimate the effective sample size of traces.
+
+    Autocorrelations are computed for all chains at once by FFT and summed
+    in adjacent pairs up to the first negative pair, Geyer's initial
+    positive sequence estimator.
+
+    Args:
+        traces: The sampled values, shape (steps, chains).
+
+    Returns:
+        The effective sample size of each chain. Constant traces count
+        every sample.
+    """
+    traces = np.asarray(traces, dtype=float)
+    steps = len(traces)
+    if steps < 2:
+        return np.full(traces.shape[1:], float(steps))
+    centered = traces - traces.mean(axis=0)
+    spectrum = np.fft.rfft(centered, n=2 * steps, axis=0)
+    autocovariance = np.fft.irfft(spectrum * np.conj(spectrum), axis=0)[:steps]
+    variance = autocovariance[0]
+    constant = variance <= 0
+    rho = autocovariance / np.where(constant, 1.0, variance)
+    pairs = rho[: steps - steps % 2].reshape(steps // 2, 2, -1).sum(axis=1)
+    positive = np.cumprod(pairs > 0, axis=0, dtype=bool)
+    tau = np.maximum(2 * (pairs * positive).sum(axis=0) - 1, 1.0)
+    return np.where(constant, float(steps), np.minimum(steps / tau, float(steps)))
+
+
+def property_sum(values: np.ndarray, couplings: np.ndarray) -> EnergyFunction:
+    """Build a function that sums a property over padded sequences.
+
+    Args:
+        values: What each block adds to the property, one per block.
+        couplings: What acylating each block's amine adds, one per block.
+
+    Returns:
+        The function, taking padded sequences and their lengths and
+        returning the property of each row.
+    """
+
+    def total(sequences: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+        mask = np.arange(sequences.shape[1]) < lengths[:, None]
+        blocks = np.where(mask, sequences, 0)
+        # Every block but the N-terminal one has its amine acylated
+        totals = np.where(mask, values[blocks], 0.0).sum(axis=1)
+        return totals + np.where(mask[:, 1:], couplings[blocks[:, 1:]], 0.0).sum(axis=1)
+
+    return total
+
+
+def property_energy(
+    values: np.ndarray,
+    couplings: np.ndarray,
+    target: Optional[float] = None,
+    maximize: bool = True,
+) -> EnergyFunction:
+    """Build an energy function that targets a property.
+
+    Args:
+        values: What each block adds to the property, one per block.
+        couplings: What acylating each block's amine adds, one per block.
+        target: The property value to approach. If None, the property is
+            maximized or minimized instead.
+        maximize: Whether to maximize the property when there is no target.
+
+    Returns:
+        The energy function, lower being better.
+    """
+    total = property_sum(values, couplings)
+
+    def energy(sequences: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+        totals = total(sequences, lengths)
+        if target is not None:
+            return np.abs(totals - target)
+        return -totals if maximize else totals
+
+    return energy
+
+
+class ParallelTempering:
+    """The vectorized parallel-tempering sampler.
+
+    Rows are laid out temperature-major: row t * chains + c is chain c at
+    rung t, so the coldest chains are the first config.chains rows.
+
+    Attributes:
+        blocks: The block indices a position may hold.
+        energy: The batch energy function, lower being better.
+        config: The run parameters.
+        rng: The random generator.
+        temperatures: The temperature of every row.
+
+    Methods:
+        initialize: Draw random starting sequences.
+        propose: Propose one move for every row.
+        step: Advance every row by one Metropolis-Hastings step.
+        exchange: Propose replica exchanges between neighbouring rungs.
+        run: Sample.
+    """
+
+    def __init__(
+        self, blocks: Sequence[int], energy: EnergyFunction, config: MCMCConfig
+    ) -> None:
+        """Initialize the sampler.
+
+        Args:
+            blocks: The block indices a position may hold.
+            energy: The batch energy function. It takes padded sequences and
+                their lengths and returns one float per row.
+            config: The run parameters.
+
+        Raises:
+            InvalidDesignError: If no block is allowed.
+        """
+        self.blocks: np.ndarray = np.asarray(blocks, dtype=np.int64)
+        if len(self.blocks) == 0:
+            raise InvalidDesignError("The sampler needs at least one block")
+        self.energy: EnergyFunction = energy
+        self.config: MCMCConfig = config
+        self.rng: np.random.Generator = np.random.default_rng(config.seed)
+        self.temperatures: np.ndarray = np.repeat(config.ladder, config.chains)
+        weights = np.asarray(config.move_weights, dtype=float)
+        self._move_cdf: np.ndarray = np.cumsum(weights / weights.sum())
+
+    def _random_blocks(self, count: int) -> np.ndarray:
+        return self.blocks[self.rng.integers(0, len(self.blocks), count)]
+
+    def initialize(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Draw random starting sequences.
+
+        Returns:
+            The padded sequences and their lengths, one row per chain and
+            temperature.
+        """
+        config = self.config
+        rows = len(self.temperatures)
+        lengths = self.rng.integers(config.min_length, config.max_length + 1, rows)
+        sequences = self._random_blocks(rows * config.max_length).reshape(rows, -1)
+        sequences[np.arange(config.max_length) >= lengths[:, None]] = PADDING
+        return sequences, lengths
+
+    def propose(
+        self, sequences: np.ndarray, lengths: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Propose one move for every row.
+
+        Insertions and deletions are equally likely under the insertion
+        move. Proposals that would leave the length bounds are returned
+        unchanged with a zero Hastings ratio, so they are always rejected.
+
+        Args:
+            sequences: The padded sequences.
+            lengths: The sequence lengths.
+
+        Returns:
+            The proposed sequences, their lengths and the log Hastings
+            ratio of each proposal.
+        """
+        config = self.config
+        rows, width = sequences.shape
+        index = np.arange(rows)
+        columns = np.arange(width)
+        moves = np.searchsorted(self._move_cdf, self.rng.random(rows), side="right")
+        moves = np.minimum(moves, len(MOVES) - 1)
+        proposed, new_lengths = sequences.copy(), lengths.copy()
+        log_ratio = np.zeros(rows)
+
+        point = moves == 0
+        spots = (self.rng.random(rows) * lengths).astype(np.int64)
+        proposed[index[point], spots[point]] = self._random_blocks(int(point.sum()))
+
+        swap = moves == 1
+        others = (self.rng.random(rows) * lengths).astype(np.int64)
+        rows_swap = index[swap]
+        proposed[rows_swap, spots[swap]] = sequences[rows_swap, others[swap]]
+        proposed[rows_swap, others[swap]] = sequences[rows_swap, spots[swap]]
+
+        indel = moves == 2
+        insert = indel & (self.rng.random(rows) < 0.5)
+        delete = indel & ~insert
+        # Insertion picks one of length + 1 gaps and a block, deletion one of
+        # length blocks, hence the Hastings ratios
+        gaps = (self.rng.random(rows) * (lengths + 1)).astype(np.int64)
+        source = np.where(columns > gaps[:, None], columns - 1, columns)
+        shifted = np.take_along_axis(sequences, source, axis=1)
+        shifted[index, np.minimum(gaps, width - 1)] = self._random_blocks(rows)
+        grow = insert & (lengths < config.max_length)
+        proposed[grow] = shifted[grow]
+        new_lengths[grow] += 1
+        log_ratio[grow] = np.log(len(self.blocks))
+
+        source = np.minimum(
+            np.where(columns >= spots[:, None], columns + 1, columns), width - 1
+        )
+        shrunk = np.take_along_axis(sequences, source, axis=1)
+        shrunk[index, lengths - 1] = PADDING
+        shrink = delete & (lengths > config.min_length)
+        proposed[shrink] = shrunk[shrink]
+        new_lengths[shrink] -= 1
+        log_ratio[shrink] = -np.log(len(self.blocks))
+
+        log_ratio[(insert & ~grow) | (delete & ~shrink)] = -np.inf
+        return proposed, new_lengths, log_ratio
+
+    def _accept(self, log_ratio: np.ndarray) -> np.ndarray:
+        """Draw acceptances for log acceptance ratios."""
+        draws = self.rng.random(len(log_ratio))
+        with np.errstate(over="ignore", invalid="ignore"):
+            if self.config.criterion == "glauber":
+                probability = 1.0 / (1.0 + np.exp(-log_ratio))
+            else:
+                probability = np.exp(np.minimum(log_ratio, 0.0))
+        return draws < np.nan_to_num(probability, nan=0.0)
+
+    def step(
+        self, sequences: np.ndarray, lengths: np.ndarray, energies: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """Advance every row by one Metropolis-Hastings step.
+
+        Args:
+            sequences: The padded sequences.
+            lengths: The sequence lengths.
+            energies: The sequence energies.
+
+        Returns:
+            The new sequences, lengths and energies, and whether each row
+            accepted its move.
+        """
+        proposed, new_lengths, log_ratio = self.propose(sequences, lengths)
+        new_energies = np.asarray(self.energy(proposed, new_lengths), dtype=float)
+        with np.errstate(invalid="ignore"):
+            log_ratio = log_ratio - (new_energies - energies) / self.temperatures
+        accepted = self._accept(np.where(np.isnan(new_energies), -np.inf, log_ratio))
+        sequences = np.where(accepted[:, None], proposed, sequences)
+        lengths = np.where(accepted, new_lengths, lengths)
+        energies = np.where(accepted, new_energies, energies)
+        return sequences, lengths, energies, accepted
+
+    def exchange(
+        self,
+        sequences: np.ndarray,
+        lengths: np.ndarray,
+        energies: np.ndarray,
+        parity: int,
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """Propose replica exchanges between neighbouring rungs.
+
+        Rungs 2i + parity and 2i + parity + 1 exchange the states of chains
+        with the same chain number, alternating the pairing between calls.
+
+        Args:
+            sequences: The padded sequences.
+            lengths: The sequence lengths.
+            energies: The sequence energies.
+            parity: Which rungs pair up, 0 or 1.
+
+        Returns:
+            The new sequences, lengths and energies, and whether each
+            proposed exchange was accepted, shape (pairs, chains).
+        """
+        chains = self.config.chains
+        rungs = np.arange(parity, self.config.temperatures - 1, 2)
+        if len(rungs) == 0:
+            return sequences, lengths, energies, np.zeros((0, chains), dtype=bool)
+        cold = (rungs[:, None] * chains + np.arange(chains)).ravel()
+        hot = cold + chains
+        beta = 1.0 / self.temperatures
+        log_ratio = (beta[cold] - beta[hot]) * (energies[cold] - energies[hot])
+        accepted = self._accept(log_ratio)
+        order = np.arange(len(energies))
+        order[cold[accepted]], order[hot[accepted]] = hot[accepted], cold[accepted]
+        return (
+            sequences[order],
+            lengths[order],
+            energies[order],
+            accepted.reshape(len(rungs), chains),
+        )
+
+    def run(
+        self,
+        state: Optional[Tuple[np.ndarray, np.ndarray]] = None,
+        callback: Optional[StepCallback] = None,
+        keep_trace: bool = True,
+    ) -> MCMCResult:
+        """Sample.
+
+        Args:
+            state: The starting padded sequences and lengths. Defaults to
+                random ones.
+            callback: Called after each step with the step number and the
+                sequences, lengths and energies of the coldest chains.
+            keep_trace: Whether to keep the energy trace for the ESS. Long
+                runs should stream to a callback instead, as the trace grows
+                with the number of steps.
+
+        Returns:
+            The outcome of the run.
+        """
+        config = self.config
+        chains, rungs = config.chains, config.temperatures
+        sequences, lengths = self.initialize() if state is None else state
+        energies = np.asarray(self.energy(sequences, lengths), dtype=float)
+
+        trace = np.empty((config.steps + 1 if keep_trace else 0, chains))
+        accepted_moves = np.zeros(len(energies))
+        swap_counts = np.zeros(max(rungs - 1, 0))
+        swap_accepted = np.zeros(max(rungs - 1, 0))
+        best, best_energy = sequences[0].copy(), np.inf
+        exchanges = 0
+        for step in range(config.steps + 1):
+            if step:
+                sequences, lengths, energies, accepted = self.step(
+                    sequences, lengths, energies
+                )
+                accepted_moves += accepted
+                if step % config.swap_interval == 0:
+                    parity = exchanges % 2
+                    sequences, lengths, energies, swapped = self.exchange(
+                        sequences, lengths, energies, parity
+                    )
+                    swap_counts[parity::2] += chains
+                    swap_accepted[parity::2] += swapped.sum(axis=1)
+                    exchanges += 1
+            cold = energies[:chains]
+            if keep_trace:
+                trace[step] = cold
+            leader = int(np.nanargmin(cold)) if not np.isnan(cold).all() else 0
+            if cold[leader] < best_energy:
+                best, best_energy = sequences[leader].copy(), float(cold[leader])
+            if callback is not None:
+                callback(step, sequences[:chains], lengths[:chains], cold)
+
+        return MCMCResult(
+            sequences=sequences[:chains],
+            lengths=lengths[:chains],
+            energies=energies[:chains],
+            best=best[best != PADDING],
+            best_energy=best_energy,
+            energy_trace=trace,
+            acceptance=(accepted_moves / max(config.steps, 1)).reshape(rungs, chains),
+            swap_acceptance=swap_accepted / np.maximum(swap_counts, 1),
+            ess=effective_sample_size(trace) if keep_trace else np.full(chains, np.nan),
+            temperatures=config.ladder,
+        )
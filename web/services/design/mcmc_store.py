@@ -0,0 +1,451 @@
+# web/services/design/mcmc_store.py
+"""
+This module contains the streaming output stage of MCMC design runs.
+
+A SampleStore is passed to ParallelTempering.run as its step callback and
+consumes the coldest chains as they run, so nothing grows with the number
+of steps:
+
+- Steps before burn_in are discarded.
+- Every thin-th step after burn-in updates the running statistics: the
+  block frequencies at each position, the means and variances of the
+  energy and of any extra properties, and the energy autocorrelation up to
+  max_lag thinned steps.
+- Every step after burn-in appends the sequences not seen before to a
+  binary store on disk. Seen sequences are tracked by a Bloom filter of
+  fixed size, so a small fraction (its error rate) of new sequences may be
+  skipped, but no sequence is written twice.
+
+The store file holds fixed-width records: the padded block indices, the
+length, the energy and the step at which the sequence was first visited.
+A JSON sidecar next to it records the layout and count, so read_samples
+can memory-map the file.
+
+Classes:
+    RunningMoments: Running means and variances of batched columns.
+    StreamingAutocorrelation: Running autocorrelation of parallel chains.
+    SampleStore: The streaming sample store of an MCMC run.
+
+Functions:
+    read_samples: Memory-map the records of a sample store.
+    write_samples_csv: Write the sequences of a sample store as CSV.
+"""
+
+# Standard Library Imports
+from typing import Any, Callable, Dict, Optional, Sequence, TextIO, Tuple
+import csv
+import json
+import os
+import tempfile
+
+# External Imports
+import numpy as np
+
+# Internal Imports
+from web.core.exceptions.design_exceptions import InvalidDesignError
+from web.services.design.hashing import BloomFilter, hash_rows
+from web.services.design.mcmc import PADDING
+
+METADATA_SUFFIX: str = ".json"
+DEFAULT_MAX_LAG: int = 50
+DEFAULT_CAPACITY: int = 10_000_000
+DEFAULT_ERROR_RATE: float = 1e-3
+DEFAULT_BUFFER_SIZE: int = 65536
+
+PropertyFunction = Callable[[np.ndarray, np.ndarray], np.ndarray]
+
+
+def _record_dtype(n_blocks: int, max_length: int) -> np.dtype:
+    block_dtype = np.int16 if n_blocks < np.iinfo(np.int16).max else np.int32
+    return np.dtype(
+        [
+            ("sequence", block_dtype, (max_length,)),
+            ("length", np.uint16),
+            ("energy", np.float64),
+            ("step", np.int64),
+        ]
+    )
+
+
+class RunningMoments:
+    """Running means and variances of batched columns.
+
+    Batches are merged with Chan's parallel update of Welford's algorithm,
+    which stays accurate over long runs where naive sums of squares lose
+    precision.
+
+    Attributes:
+        count: The number of rows seen.
+        mean: The mean of each column.
+
+    Methods:
+        update: Merge a batch of rows.
+        variance: Get the sample variance of each column.
+    """
+
+    def __init__(self, width: int) -> None:
+        """Initialize empty moments.
+
+        Args:
+            width: The number of columns.
+        """
+        self.count: int = 0
+        self.mean: np.ndarray = np.zeros(width)
+        self._m2: np.ndarray = np.zeros(width)
+
+    def update(self, rows: np.ndarray) -> None:
+        """Merge a batch of rows.
+
+        Args:
+            rows: The values, shape (rows, width).
+        """
+        rows = np.asarray(rows, dtype=float)
+        if len(rows) == 0:
+            return
+        batch_mean = rows.mean(axis=0)
+        batch_m2 = ((rows - batch_mean) ** 2).sum(axis=0)
+        total = self.count + len(rows)
+        delta = batch_mean - self.mean
+        self.mean = self.mean + delta * len(rows) / total
+        self._m2 = self._m2 + batch_m2 + delta**2 * self.count * len(rows) / total
+        self.count = total
+
+    def variance(self) -> np.ndarray:
+        """Get the sample variance of each column.
+
+        Returns:
+            The variances, NaN before two rows are seen.
+        """
+        if self.count < 2:
+            return np.full_like(self.mean, np.nan)
+        return self._m2 / (self.count - 1)
+
+
+class StreamingAutocorrelation:
+    """Running autocorrelation of parallel chains.
+
+    The last max_lag values of every chain sit in a ring buffer, and the
+    sums of lagged products are accumulated over all chains, so memory is
+    fixed by the number of chains and lags.
+
+    Attributes:
+        max_lag: The longest lag tracked.
+        count: The number of values seen per chain.
+
+    Methods:
+        update: Add the next value of every chain.
+        autocorrelation: Get the autocorrelation at each lag.
+        integrated_time: Get the integrated autocorrelation time.
+    """
+
+    def __init__(self, chains: int, max_lag: int = DEFAULT_MAX_LAG) -> None:
+        """Initialize an empty accumulator.
+
+        Args:
+            chains: The number of chains.
+            max_lag: The longest lag tracked.
+        """
+        self.max_lag: int = max_lag
+        self.count: int = 0
+        self._ring: np.ndarray = np.zeros((max_lag + 1, chains))
+        self._products: np.ndarray = np.zeros(max_lag + 1)
+        self._sum: float = 0.0
+
+    def update(self, values: np.ndarray) -> None:
+        """Add the next value of every chain.
+
+        Args:
+            values: One value per chain.
+        """
+        slot = self.count % (self.max_lag + 1)
+        self._ring[slot] = values
+        lags = np.arange(min(self.count, self.max_lag) + 1)
+        previous = self._ring[(slot - lags) % (self.max_lag + 1)]
+        self._products[lags] += (previous * values).sum(axis=1)
+        self._sum += float(np.sum(values))
+        self.count += 1
+
+    def autocorrelation(self) -> np.ndarray:
+        """Get the autocorrelation at each lag.
+
+        Returns:
+            The autocorrelation at lags 0 to max_lag, NaN for lags not yet
+            seen or when the values are constant.
+        """
+        chains = self._ring.shape[1]
+        pairs = np.maximum(self.count - np.arange(self.max_lag + 1), 0) * chains
+        if self.count == 0:
+            return np.full(self.max_lag + 1, np.nan)
+        mean = self._sum / (self.count * chains)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            covariance = self._products / pairs - mean**2
+            return covariance / covariance[0]
+
+    def integrated_time(self) -> float:
+        """Get the integrated autocorrelation time.
+
+        The autocorrelations are summed in adjacent pairs up to the first
+        negative pair.
+
+        Returns:
+            The integrated autocorrelation time in thinned steps, at least 1.
+        """
+        rho = np.nan_to_num(self.autocorrelation(), nan=0.0)
+        usable = len(rho) - len(rho) % 2
+        pairs = rho[:usable].reshape(-1, 2).sum(axis=1)
+        positive = np.cumprod(pairs > 0, dtype=bool)
+        return max(2.0 * float((pairs * positive).sum()) - 1.0, 1.0)
+
+
+class SampleStore:
+    """The streaming sample store of an MCMC run.
+
+    Attributes:
+        path: The path of the binary store file.
+        n_blocks: The number of blocks.
+        max_length: The longest sequence length.
+        burn_in: The number of initial steps discarded.
+        thin: The step interval between samples used for statistics.
+        samples: The number of samples used for statistics.
+        unique: The number of sequences written to the store.
+        frequencies: The block counts at each position, shape
+            (max_length, n_blocks).
+        energy: The running moments of the energy.
+        properties: The running moments of the extra properties.
+        autocorrelation: The running energy autocorrelation.
+
+    Methods:
+        flush: Write buffered records and the metadata.
+        close: Flush and close the store file.
+        summary: Get the run statistics.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        n_blocks: int,
+        max_length: int,
+        chains: int,
+        burn_in: int = 0,
+        thin: int = 1,
+        properties: Optional[PropertyFunction] = None,
+        property_names: Sequence[str] = (),
+        max_lag: int = DEFAULT_MAX_LAG,
+        capacity: int = DEFAULT_CAPACITY,
+        error_rate: float = DEFAULT_ERROR_RATE,
+        buffer_size: int = DEFAULT_BUFFER_SIZE,
+    ) -> None:
+        """Open a new store, replacing any store at the path.
+
+        Args:
+            path: The path of the binary store file.
+            n_blocks: The number of blocks.
+            max_length: The longest sequence length.
+            chains: The number of chains reported per step.
+            burn_in: The number of initial steps discarded.
+            thin: The step interval between samples used for statistics.
+            properties: A function of padded sequences and lengths returning
+                extra properties to track, shape (rows, len(property_names)).
+            property_names: The names of the extra properties.
+            max_lag: The longest autocorrelation lag, in thinned steps.
+            capacity: The number of unique sequences the store is sized for.
+            error_rate: The fraction of new sequences that may be skipped.
+            buffer_size: The number of records buffered between writes.
+
+        Raises:
+            InvalidDesignError: If burn_in or thin is out of range.
+        """
+        if burn_in < 0 or thin < 1:
+            raise InvalidDesignError("burn_in must be >= 0 and thin >= 1")
+        self.path: str = path
+        self.n_blocks: int = n_blocks
+        self.max_length: int = max_length
+        self.burn_in: int = burn_in
+        self.thin: int = thin
+        self.samples: int = 0
+        self.unique: int = 0
+        self.frequencies: np.ndarray = np.zeros((max_length, n_blocks), dtype=np.int64)
+        self.energy: RunningMoments = RunningMoments(1)
+        self.properties: RunningMoments = RunningMoments(len(property_names))
+        self.autocorrelation: StreamingAutocorrelation = StreamingAutocorrelation(
+            chains, max_lag
+        )
+        self._property_function: Optional[PropertyFunction] = properties
+        self._property_names: Tuple[str, ...] = tuple(property_names)
+        self._seen: BloomFilter = BloomFilter(capacity, error_rate)
+        self._dtype: np.dtype = _record_dtype(n_blocks, max_length)
+        self._buffer: np.ndarray = np.empty(buffer_size, dtype=self._dtype)
+        self._buffered: int = 0
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._handle = open(path, "wb")
+
+    def __enter__(self) -> "SampleStore":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    def __call__(
+        self,
+        step: int,
+        sequences: np.ndarray,
+        lengths: np.ndarray,
+        energies: np.ndarray,
+    ) -> None:
+        """Consume the coldest chains after one step.
+
+        Args:
+            step: The step number.
+            sequences: The padded sequences.
+            lengths: The sequence lengths.
+            energies: The sequence energies.
+        """
+        if step < self.burn_in:
+            return
+        self._append_new(step, sequences, lengths, energies)
+        if (step - self.burn_in) % self.thin:
+            return
+        self.samples += len(sequences)
+        valid = sequences != PADDING
+        positions = np.broadcast_to(np.arange(sequences.shape[1]), sequences.shape)
+        self.frequencies += np.bincount(
+            positions[valid] * self.n_blocks + sequences[valid],
+            minlength=self.frequencies.size,
+        ).reshape(self.frequencies.shape)
+        self.energy.update(energies[:, None])
+        if self._property_function is not None:
+            self.properties.update(self._property_function(sequences, lengths))
+        self.autocorrelation.update(energies)
+
+    def _append_new(
+        self,
+        step: int,
+        sequences: np.ndarray,
+        lengths: np.ndarray,
+        energies: np.ndarray,
+    ) -> None:
+        """Buffer the sequences not seen before."""
+        # The length is part of the key so padding never aliases a block
+        keys = hash_rows(np.column_stack([sequences, lengths]))
+        new = np.flatnonzero(self._seen.add(keys))
+        for start in range(0, len(new), len(self._buffer)):
+            rows = new[start : start + len(self._buffer)]
+            if self._buffered + len(rows) > len(self._buffer):
+                self._write_buffer()
+            records = self._buffer[self._buffered : self._buffered + len(rows)]
+            records["sequence"] = sequences[rows]
+            records["length"] = lengths[rows]
+            records["energy"] = energies[rows]
+            records["step"] = step
+            self._buffered += len(rows)
+        self.unique += len(new)
+
+    def _write_buffer(self) -> None:
+        self._buffer[: self._buffered].tofile(self._handle)
+        self._buffered = 0
+
+    def flush(self) -> None:
+        """Write buffered records and the metadata."""
+        self._write_buffer()
+        self._handle.flush()
+        metadata = {
+            "n_blocks": self.n_blocks,
+            "max_length": self.max_length,
+            "count": self.unique,
+        }
+        output = self.path + METADATA_SUFFIX
+        fd, tmp_path = tempfile.mkstemp(
+            dir=os.path.dirname(os.path.abspath(output)), suffix=".tmp"
+        )
+        try:
+            with os.fdopen(fd, "w") as handle:
+                json.dump(metadata, handle)
+            os.replace(tmp_path, output)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+    def close(self) -> None:
+        """Flush and close the store file."""
+        if not self._handle.closed:
+            self.flush()
+            self._handle.close()
+
+    def summary(self) -> Dict[str, Any]:
+        """Get the run statistics.
+
+        Returns:
+            The sample counts, the block frequencies at each position, the
+            energy and property moments, and the energy autocorrelation
+            with the effective sample size it implies.
+        """
+        counts = self.frequencies.sum(axis=1, keepdims=True)
+        tau = self.autocorrelation.integrated_time()
+        return {
+            "samples": self.samples,
+            "unique": self.unique,
+            "frequencies": (self.frequencies / np.maximum(counts, 1)).tolist(),
+            "energy_mean": float(self.energy.mean[0]),
+            "energy_variance": float(self.energy.variance()[0]),
+            "property_means": dict(
+                zip(self._property_names, self.properties.mean.tolist())
+            ),
+            "property_variances": dict(
+                zip(self._property_names, self.properties.variance().tolist())
+            ),
+            "autocorrelation": self.autocorrelation.autocorrelation().tolist(),
+            "integrated_time": tau,
+            "ess": self.samples / tau,
+        }
+
+
+def read_samples(path: str) -> np.ndarray:
+    """Memory-map the records of a sample store.
+
+    Args:
+        path: The path of the binary store file.
+
+    Returns:
+        The records, with fields sequence, length, energy and step.
+    """
+    with open(path + METADATA_SUFFIX) as handle:
+        metadata = json.load(handle)
+    dtype = _record_dtype(metadata["n_blocks"], metadata["max_length"])
+    if metadata["count"] == 0:
+        return np.empty(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode="r", shape=(metadata["count"],))
+
+
+def write_samples_csv(
+    path: str,
+    handle: TextIO,
+    codes: Sequence[str],
+    separator: str = "-",
+    chunk_size: int = DEFAULT_BUFFER_SIZE,
+) -> int:
+    """Write the sequences of a sample store as CSV.
+
+    Args:
+        path: The path of the binary store file.
+        handle: The text file to write to.
+        codes: The code of each block, used to spell out sequences.
+        separator: The separator between block codes.
+        chunk_size: The number of records converted at a time.
+
+    Returns:
+        The number of sequences written.
+    """
+    records = read_samples(path)
+    lookup = np.asarray(codes, dtype=object)
+    writer = csv.writer(handle, lineterminator="\n")
+    writer.writerow(["Sequence", "Energy"])
+    for start in range(0, len(records), chunk_size):
+        chunk = records[start : start + chunk_size]
+        writer.writerows(
+            [separator.join(lookup[sequence[:length]]), energy]
+            for sequence, length, energy in zip(
+                chunk["sequence"], chunk["length"].tolist(), chunk["energy"].tolist()
+            )
+        )
+    return len(records)
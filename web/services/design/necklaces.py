@@ -0,0 +1,151 @@
+# web/services/design/necklaces.py
+"""
+This module contains the necklace and bracelet generators of cyclic libraries.
+
+A cyclic peptide is the same molecule under every rotation of its sequence,
+and, when its residues are symmetric, under reflection too. Necklaces and
+bracelets are the lexicographically least representatives of these classes,
+generated directly in constant amortized time rather than by enumerating
+and deduplicating every linear sequence.
+
+Functions:
+    necklaces: Generate the necklaces of a length over an alphabet.
+    bracelets: Generate the bracelets of a length over an alphabet.
+    necklace_count: Count necklaces with Burnside's lemma.
+    bracelet_count: Count bracelets with Burnside's lemma.
+"""
+
+# Standard Library Imports
+from math import gcd
+from typing import Iterator, List, Tuple
+
+
+def necklaces(n_blocks: int, length: int) -> Iterator[Tuple[int, ...]]:
+    """Generate the necklaces of a length over an alphabet.
+
+    Uses the Fredricksen-Kessler-Maiorana algorithm, which walks the
+    prenecklaces in lexicographic order and keeps those whose period
+    divides the length.
+
+    Args:
+        n_blocks: The alphabet size.
+        length: The necklace length.
+
+    Yields:
+        Each necklace as a tuple of block indices, in lexicographic order.
+    """
+    a = [0] * (length + 1)
+    yield tuple(a[1:])
+    while True:
+        i = length
+        while i > 0 and a[i] == n_blocks - 1:
+            i -= 1
+        if i == 0:
+            return
+        a[i] += 1
+        for j in range(i + 1, length + 1):
+            a[j] = a[j - i]
+        if length % i == 0:
+            yield tuple(a[1:])
+
+
+def bracelets(n_blocks: int, length: int) -> Iterator[Tuple[int, ...]]:
+    """Generate the bracelets of a length over an alphabet.
+
+    Uses Sawada's algorithm, which extends necklace prefixes and prunes any
+    whose reversal is certain to be smaller, so that only the least
+    representative of each rotation and reflection class is produced.
+
+    Args:
+        n_blocks: The alphabet size.
+        length: The bracelet length.
+
+    Yields:
+        Each bracelet as a tuple of block indices, in lexicographic order.
+    """
+    n = length
+    a: List[int] = [0] * (n + 2)
+
+    def check_reversal(t: int, i: int) -> int:
+        # Compare the prefix a[i + 1..t] with its reversal
+        for j in range(i + 1, (t + 1) // 2 + 1):
+            if a[j] < a[t - j + 1]:
+                return 0
+            if a[j] > a[t - j + 1]:
+                return -1
+        return 1
+
+    def extend(
+        t: int, p: int, r: int, u: int, v: int, reversal_smaller: bool
+    ) -> Iterator[Tuple[int, ...]]:
+        # p is the period of the prefix, u and v the lengths of its leading
+        # and trailing runs of a[1], and r where its reversal check starts
+        if t - 1 > (n - r) // 2 + r:
+            if a[t - 1] > a[n - t + 2 + r]:
+                reversal_smaller = False
+            elif a[t - 1] < a[n - t + 2 + r]:
+                reversal_smaller = True
+        if t > n:
+            if not reversal_smaller and n % p == 0:
+                yield tuple(a[1 : n + 1])
+            return
+        a[t] = a[t - p]
+        v = v + 1 if a[t] == a[1] else 0
+        if u == t - 1 and a[t - 1] == a[1]:
+            u += 1
+        if t == n and u != n and a[n] == a[1]:
+            pass
+        elif u == v:
+            reversal = check_reversal(t, u)
+            if reversal == 0:
+                yield from extend(t + 1, p, r, u, v, reversal_smaller)
+            elif reversal == 1:
+                yield from extend(t + 1, p, t, u, v, False)
+        else:
+            yield from extend(t + 1, p, r, u, v, reversal_smaller)
+        if u == t:
+            u -= 1
+        for block in range(a[t - p] + 1, n_blocks):
+            a[t] = block
+            yield from extend(t + 1, t, r, u, 0, reversal_smaller)
+
+    for first in range(n_blocks):
+        a[1] = first
+        yield from extend(2, 1, 1, 1, 1, False)
+
+
+def _totient(n: int) -> int:
+    return sum(1 for k in range(1, n + 1) if gcd(n, k) == 1)
+
+
+def necklace_count(n_blocks: int, length: int) -> int:
+    """Count necklaces with Burnside's lemma.
+
+    Args:
+        n_blocks: The alphabet size.
+        length: The necklace length.
+
+    Returns:
+        The number of necklaces.
+    """
+    divisors = [d for d in range(1, length + 1) if length % d == 0]
+    total = sum(_totient(d) * n_blocks ** (length // d) for d in divisors)
+    return total // length
+
+
+def bracelet_count(n_blocks: int, length: int) -> int:
+    """Count bracelets with Burnside's lemma.
+
+    Args:
+        n_blocks: The alphabet size.
+        length: The bracelet length.
+
+    Returns:
+        The number of bracelets.
+    """
+    k, n = n_blocks, length
+    if n % 2:
+        reflections = n * k ** ((n + 1) // 2)
+    else:
+        reflections = (n // 2) * (k ** (n // 2 + 1) + k ** (n // 2))
+    return (n * necklace_count(k, n) + reflections) // (2 * n)
@@ -0,0 +1,291 @@
+# web/services/design/random_sampling.py
+"""
+This module contains the random sampling design engine.
+
+Members are drawn a batch at a time as block index arrays, each position
+from its own weighted distribution over the blocks. Weighted positions are
+drawn by inverse transform through a guide table: a uniform draw falls in
+one of GUIDE_SIZE equal buckets, which names its block outright unless a
+block boundary falls inside it, and only the draws in those few buckets
+need a binary search. Positions with equal weights are drawn as integers.
+
+Repeated members are dropped as they are drawn. Up to exact_limit members
+are tracked exactly in a key set, keyed by their rank in the product of
+all blocks when that fits in 64 bits; beyond it a Bloom filter tracks them
+in fixed memory and drops about one in a million new members as well.
+
+A reservoir keeps k members drawn uniformly from a stream of unknown
+length, such as a constrained combinatorial library. It follows Li's
+Algorithm L, jumping ahead by geometric skips, so only the O(k log(n / k))
+members that enter the reservoir cost more than a comparison.
+
+Classes:
+    WeightedSampler: Draws library members from per-position weights.
+    Reservoir: A uniform sample of k members from a stream.
+"""
+
+# Standard Library Imports
+from typing import Iterator, Optional, Sequence, Union
+import math
+
+# External Imports
+import numpy as np
+
+# Internal Imports
+from web.core.exceptions.design_exceptions import InvalidDesignError
+from web.services.design.hashing import BloomFilter, KeySet, hash_rows
+
+SAMPLING_MODES = ("draw", "reservoir")
+GUIDE_SIZE: int = 4096
+DEFAULT_BATCH_SIZE: int = 1 << 20
+DEFAULT_EXACT_LIMIT: int = 1 << 25
+DEFAULT_DRAW_FACTOR: int = 16
+DEDUPLICATION_ERROR_RATE = 1e-6
+
+
+class WeightedSampler:
+    """Draws library members from per-position weights.
+
+    Attributes:
+        length: The number of positions.
+        n_blocks: The number of blocks.
+        support: The number of distinct members with nonzero probability.
+
+    Methods:
+        draw: Draw members, repeats included.
+        sample: Draw distinct members.
+    """
+
+    def __init__(
+        self, weights: Sequence[np.ndarray], seed: Optional[int] = None
+    ) -> None:
+        """Initialize a sampler.
+
+        Args:
+            weights: The weight of each block at each position, shape
+                (length, n_blocks). Blocks with zero weight are never drawn.
+            seed: The random seed.
+
+        Raises:
+            InvalidDesignError: If a weight is negative or not finite, or a
+                position has no positive weight.
+        """
+        weights = np.asarray(weights, dtype=float)
+        if weights.ndim != 2 or weights.size == 0:
+            raise InvalidDesignError("Weights need shape (length, n_blocks)")
+        if not np.isfinite(weights).all() or (weights < 0).any():
+            raise InvalidDesignError("Weights must be finite and non-negative")
+        if not (weights > 0).any(axis=1).all():
+            raise InvalidDesignError("Every position needs a block with weight")
+        self.length: int = weights.shape[0]
+        self.n_blocks: int = weights.shape[1]
+        self.support: int = math.prod(int(n) for n in (weights > 0).sum(axis=1))
+        self._rng = np.random.default_rng(seed)
+        # Members are keyed by their rank when every rank fits in 64 bits
+        self._radices: Optional[np.ndarray] = None
+        if self.n_blocks**self.length <= 1 << 64:
+            self._radices = np.uint64(self.n_blocks) ** np.arange(
+                self.length, dtype=np.uint64
+            )
+        self._positions = [self._position_table(row) for row in weights]
+
+    @staticmethod
+    def _position_table(weights: np.ndarray) -> tuple:
+        """Get the allowed blocks, or the cdf and guide table, of a position."""
+        allowed = np.flatnonzero(weights > 0)
+        if np.all(weights[allowed] == weights[allowed[0]]):
+            return (allowed,)
+        cdf = np.cumsum(weights) / weights.sum()
+        cdf[allowed[-1] :] = 1.0
+        edges = np.arange(GUIDE_SIZE + 1) / GUIDE_SIZE
+        first = np.searchsorted(cdf, edges[:-1], side="right")
+        last = np.minimum(np.searchsorted(cdf, edges[1:], side="right"), allowed[-1])
+        # Buckets split by a block boundary are resolved per draw
+        guide = np.where(first == last, first, -1)
+        return (allowed, cdf, guide)
+
+    def draw(self, n: int) -> np.ndarray:
+        """Draw members, repeats included.
+
+        Args:
+            n: The number of members.
+
+        Returns:
+            Integer arrays of block indices, shape (n, length).
+        """
+        # Positions are drawn into contiguous rows of a transposed array
+        columns = np.empty((self.length, n), dtype=np.int64)
+        for position, table in enumerate(self._positions):
+            if len(table) == 1:
+                allowed = table[0]
+                drawn = self._rng.integers(0, len(allowed), n)
+                columns[position] = (
+                    drawn if len(allowed) == self.n_blocks else allowed[drawn]
+                )
+                continue
+            _, cdf, guide = table
+            uniform = self._rng.random(n)
+            blocks = guide[(uniform * GUIDE_SIZE).astype(np.int64)]
+            split = np.flatnonzero(blocks < 0)
+            blocks[split] = np.searchsorted(cdf, uniform[split], side="right")
+            columns[position] = blocks
+        return columns.T
+
+    def _keys(self, members: np.ndarray) -> np.ndarray:
+        """Get the 64-bit key of each member."""
+        if self._radices is None:
+            return hash_rows(members)
+        keys = np.zeros(len(members), dtype=np.uint64)
+        for position in range(self.length):
+            keys += members[:, position].astype(np.uint64) * self._radices[position]
+        return keys
+
+    def sample(
+        self,
+        size: int,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        exact_limit: int = DEFAULT_EXACT_LIMIT,
+        max_draws: Optional[int] = None,
+    ) -> Iterator[np.ndarray]:
+        """Draw distinct members.
+
+        Members come out in the order they are first drawn. Heavily skewed
+        weights can leave most of the support unlikely, so drawing stops
+        after max_draws members whether or not size were found.
+
+        Args:
+            size: The number of distinct members.
+            batch_size: The largest number of members drawn at once.
+            exact_limit: The largest size tracked exactly; larger samples
+                use a Bloom filter.
+            max_draws: The most members to draw, repeats included. Defaults
+                to DEFAULT_DRAW_FACTOR times size.
+
+        Returns:
+            An iterator of integer arrays of block indices, shape
+            (rows, length).
+
+        Raises:
+            InvalidDesignError: If the size is out of range.
+        """
+        if not 1 <= size <= self.support:
+            raise InvalidDesignError(
+                f"size must be between 1 and the {self.support} possible members"
+            )
+        if batch_size < 1:
+            raise InvalidDesignError("batch_size must be positive")
+        if max_draws is None:
+            max_draws = DEFAULT_DRAW_FACTOR * size
+        seen: Union[KeySet, BloomFilter] = (
+            KeySet(size)
+            if size <= exact_limit
+            else BloomFilter(size, DEDUPLICATION_ERROR_RATE)
+        )
+        return self._sample(size, batch_size, max_draws, seen)
+
+    def _sample(
+        self,
+        size: int,
+        batch_size: int,
+        max_draws: int,
+        seen: Union[KeySet, BloomFilter],
+    ) -> Iterator[np.ndarray]:
+        """Draw distinct members, dropping those already seen."""
+        found = drawn = 0
+        while found < size and drawn < max_draws:
+            # Draw a little more than is missing, as some will be repeats
+            n = min(batch_size, max_draws - drawn, max(2 * (size - found), 1024))
+            members = self.draw(n)
+            drawn += n
+            members = members[seen.add(self._keys(members))][: size - found]
+            found += len(members)
+            if len(members):
+                yield members
+
+
+class Reservoir:
+    """A uniform sample of k members from a stream.
+
+    Attributes:
+        k: The sample size.
+        seen: The number of members streamed so far.
+
+    Methods:
+        add: Stream a chunk of members through the reservoir.
+        members: Get the sampled members.
+    """
+
+    def __init__(self, k: int, seed: Optional[int] = None) -> None:
+        """Initialize an empty reservoir.
+
+        Args:
+            k: The sample size.
+            seed: The random seed.
+
+        Raises:
+            InvalidDesignError: If k is not positive.
+        """
+        if k < 1:
+            raise InvalidDesignError("Reservoir size must be positive")
+        self.k: int = k
+        self.seen: int = 0
+        self._rng = np.random.default_rng(seed)
+        self._rows: Optional[np.ndarray] = None
+        self._filled: int = 0
+        # The weight of the current skip distribution, and the stream index
+        # of the next member to enter the reservoir
+        self._weight: float = 1.0
+        self._next: float = math.inf
+
+    def _uniform(self) -> float:
+        """Draw a uniform number in (0, 1]."""
+        return 1.0 - self._rng.random()
+
+    def _skip(self) -> None:
+        """Jump to the next stream index that enters the reservoir."""
+        denominator = math.log1p(-self._weight)
+        if denominator == 0.0:
+            self._next = math.inf
+            return
+        self._next += math.floor(math.log(self._uniform()) / denominator) + 1
+
+    def add(self, chunk: np.ndarray) -> None:
+        """Stream a chunk of members through the reservoir.
+
+        Args:
+            chunk: Integer arrays of block indices, shape (rows, length).
+
+        Raises:
+            InvalidDesignError: If the chunk length differs from earlier ones.
+        """
+        chunk = np.asarray(chunk)
+        if self._rows is None:
+            self._rows = np.empty((self.k, chunk.shape[1]), dtype=chunk.dtype)
+        if chunk.shape[1:] != self._rows.shape[1:]:
+            raise InvalidDesignError("Reservoir members must have one length")
+        start = self.seen
+        self.seen += len(chunk)
+        fill = min(self.k - self._filled, len(chunk))
+        if fill:
+            self._rows[self._filled : self._filled + fill] = chunk[:fill]
+            self._filled += fill
+            if self._filled == self.k:
+                self._weight = math.exp(math.log(self._uniform()) / self.k)
+                self._next = self.k - 1
+                self._skip()
+        while self._next < self.seen:
+            slot = self._rng.integers(0, self.k)
+            self._rows[slot] = chunk[int(self._next) - start]
+            self._weight *= math.exp(math.log(self._uniform()) / self.k)
+            self._skip()
+
+    def members(self) -> np.ndarray:
+        """Get the sampled members.
+
+        Returns:
+            The sampled members, shape (min(k, seen), length), in no
+            particular order.
+        """
+        if self._rows is None:
+            return np.empty((0, 0), dtype=np.int64)
+        return self._rows[: self._filled].copy()
@@ -0,0 +1,362 @@
+# web/services/design/ranking.py
+"""
+This module contains the rank and unrank functions of combinatorial libraries.
+
+Every member of a cartesian, n-ary, permutation or combination library has a
+rank, its position in the library's lexicographic enumeration order. Ranking
+and unranking are bijections computed in O(length) arithmetic steps, so any
+member can be fetched, any index range enumerated and uniform samples drawn
+without enumerating the members before them.
+
+Constrained designs have no closed-form ranking and are not supported.
+Ranks are Python integers and may exceed 64 bits. Batch functions use
+vectorized int64 arithmetic when the library fits and fall back to exact
+Python integers otherwise.
+
+Functions:
+    is_ranked: Check whether a design supports ranking.
+    rank: Get the rank of a library member.
+    unrank: Get the library member at a rank.
+    unrank_many: Get the library members at an array of ranks.
+    check_range: Validate a range of library ranks.
+    enumerate_range: Enumerate a range of library ranks in chunks.
+    sample: Draw a uniform random sample of library members.
+"""
+
+# Standard Library Imports
+from math import comb, perm
+from typing import Iterator, List, Optional, Sequence
+import random
+
+# External Imports
+import numpy as np
+
+# Internal Imports
+from web.core.exceptions.design_exceptions import InvalidDesignError
+from web.services.design.combinatoric import (
+    DEFAULT_CHUNK_SIZE,
+    CombinatoricDesign,
+    library_size,
+)
+
+RANKED_METHODS = ("combination", "permutation", "cartesian", "nary")
+INT64_LIMIT: int = 2**63 - 1
+
+
+def is_ranked(design: CombinatoricDesign) -> bool:
+    """Check whether a design supports ranking.
+
+    Args:
+        design: The library design.
+
+    Returns:
+        True for unconstrained designs of a ranked method.
+    """
+    return design.method in RANKED_METHODS and design.constraints is None
+
+
+def _check_ranked(design: CombinatoricDesign) -> None:
+    if design.constraints is not None:
+        raise InvalidDesignError("Ranking is not supported for constrained designs")
+    if design.method not in RANKED_METHODS:
+        raise InvalidDesignError(f"Ranking is not supported for {design.method}")
+
+
+def _check_rank(design: CombinatoricDesign, value: int) -> int:
+    size = library_size(design)
+    if not 0 <= value < size:
+        raise InvalidDesignError(f"Rank {value} is outside the library of {size}")
+    return size
+
+
+def _to_blocks(design: CombinatoricDesign, digits: np.ndarray) -> np.ndarray:
+    """Map per-position choice digits of a product method to block indices."""
+    if design.method != "cartesian" or design.position_sets is None:
+        return digits
+    sets = design.position_sets
+    return np.stack([sets[i][digits[..., i]] for i in range(design.length)], axis=-1)
+
+
+def _to_digits(design: CombinatoricDesign, member: Sequence[int]) -> List[int]:
+    """Map the block indices of a product method member to choice digits."""
+    if design.method != "cartesian" or design.position_sets is None:
+        return [int(block) for block in member]
+    digits = []
+    for blocks, block in zip(design.position_sets, member):
+        matches = np.flatnonzero(blocks == block)
+        if len(matches) == 0:
+            raise InvalidDesignError(f"Block {block} is not allowed at its position")
+        digits.append(int(matches[0]))
+    return digits
+
+
+def rank(design: CombinatoricDesign, member: Sequence[int]) -> int:
+    """Get the rank of a library member.
+
+    Args:
+        design: The library design.
+        member: The block indices of the member.
+
+    Returns:
+        The rank of the member.
+
+    Raises:
+        InvalidDesignError: If the method is not ranked or the member is not
+            in the library.
+    """
+    _check_ranked(design)
+    n, k = design.n_blocks, design.length
+    if len(member) != k or any(not 0 <= int(block) < n for block in member):
+        raise InvalidDesignError("The member is not in the library")
+
+    if design.method in ("cartesian", "nary"):
+        value = 0
+        for radix, digit in zip(design.radices, _to_digits(design, member)):
+            value = value * radix + digit
+        return value
+
+    if design.method == "permutation":
+        if len(set(int(block) for block in member)) != k:
+            raise InvalidDesignError("Permutation members cannot repeat blocks")
+        value, used = 0, set()
+        for i, block in enumerate(int(block) for block in member):
+            smaller_unused = block - sum(1 for other in used if other < block)
+            value += smaller_unused * perm(n - 1 - i, k - 1 - i)
+            used.add(block)
+        return value
+
+    value, previous = 0, -1
+    for i, block in enumerate(int(block) for block in member):
+        if block <= previous:
+            raise InvalidDesignError("Combination members must be increasing")
+        value += sum(comb(n - 1 - y, k - 1 - i) for y in range(previous + 1, block))
+        previous = block
+    return value
+
+
+def unrank(design: CombinatoricDesign, value: int) -> np.ndarray:
+    """Get the library member at a rank.
+
+    Args:
+        design: The library design.
+        value: The rank of the member.
+
+    Returns:
+        The block indices of the member.
+
+    Raises:
+        InvalidDesignError: If the method is not ranked or the rank is out of
+            range.
+    """
+    _check_ranked(design)
+    _check_rank(design, value)
+    n, k = design.n_blocks, design.length
+    member: List[int] = []
+
+    if design.method in ("cartesian", "nary"):
+        for radix in reversed(design.radices):
+            value, digit = divmod(value, radix)
+            member.append(digit)
+        return _to_blocks(design, np.asarray(member[::-1], dtype=np.int64))
+
+    if design.method == "permutation":
+        unused = list(range(n))
+        for i in range(k):
+            digit, value = divmod(value, perm(n - 1 - i, k - 1 - i))
+            member.append(unused.pop(digit))
+        return np.asarray(member, dtype=np.int64)
+
+    block = 0
+    for i in range(k):
+        while True:
+            count = comb(n - 1 - block, k - 1 - i)
+            if value < count:
+                break
+            value -= count
+            block += 1
+        member.append(block)
+        block += 1
+    return np.asarray(member, dtype=np.int64)
+
+
+def _fits_int64(design: CombinatoricDesign) -> bool:
+    """Check whether the vectorized unranking arithmetic fits in int64."""
+    n, k = design.n_blocks, design.length
+    if design.method == "combination":
+        return max(comb(n, j) for j in range(k + 1)) <= INT64_LIMIT
+    return library_size(design) <= INT64_LIMIT
+
+
+def unrank_many(design: CombinatoricDesign, ranks: np.ndarray) -> np.ndarray:
+    """Get the library members at an array of ranks.
+
+    Args:
+        design: The library design.
+        ranks: The ranks of the members.
+
+    Returns:
+        The block indices of the members, shape (len(ranks), length).
+
+    Raises:
+        InvalidDesignError: If the method is not ranked or a rank is out of
+            range.
+    """
+    _check_ranked(design)
+    n, k = design.n_blocks, design.length
+    if not _fits_int64(design):
+        members = [unrank(design, int(value)) for value in ranks]
+        return np.asarray(members, dtype=np.int64).reshape(-1, k)
+
+    remainder = np.array(ranks, dtype=np.int64)
+    if len(remainder) and (
+        remainder.min() < 0 or remainder.max() >= library_size(design)
+    ):
+        raise InvalidDesignError("A rank is outside the library")
+    members = np.empty((len(remainder), k), dtype=np.int64)
+    rows = np.arange(len(remainder))
+
+    if design.method in ("cartesian", "nary"):
+        for i, radix in reversed(list(enumerate(design.radices))):
+            remainder, members[:, i] = np.divmod(remainder, radix)
+        return _to_blocks(design, members)
+
+    if design.method == "permutation":
+        unused = np.ones((len(remainder), n), dtype=bool)
+        for i in range(k):
+            digit, remainder = np.divmod(remainder, perm(n - 1 - i, k - 1 - i))
+            block = (np.cumsum(unused, axis=1) > digit[:, None]).argmax(axis=1)
+            members[:, i] = block
+            unused[rows, block] = False
+        return members
+
+    # The combinations whose position i is below x, given the earlier
+    # positions are below every candidate, for each x
+    lower = np.zeros(len(remainder), dtype=np.int64)
+    for i in range(k):
+        counts = [comb(n - 1 - y, k - 1 - i) for y in range(n)]
+        prefix = np.concatenate([[0], np.cumsum(counts, dtype=np.int64)])
+        target = remainder + prefix[lower]
+        block = np.searchsorted(prefix, target, side="right") - 1
+        remainder = target - prefix[block]
+        members[:, i] = block
+        lower = block + 1
+    return members
+
+
+def _product_range(radices: Sequence[int], start: int, count: int) -> np.ndarray:
+    """Get count consecutive product digits from start, for any library size."""
+    carry = np.arange(count, dtype=np.int64)
+    digits = np.empty((count, len(radices)), dtype=np.int64)
+    start_digits = []
+    for radix in reversed(radices):
+        start, digit = divmod(start, radix)
+        start_digits.append(digit)
+    for i, (radix, digit) in enumerate(zip(reversed(radices), start_digits)):
+        carry, digits[:, len(radices) - 1 - i] = np.divmod(carry + digit, radix)
+    return digits
+
+
+def check_range(design: CombinatoricDesign, start: int, stop: Optional[int]) -> int:
+    """Validate a range of library ranks.
+
+    Args:
+        design: The library design.
+        start: The first rank of the range.
+        stop: The rank to stop before, or None for the library size.
+
+    Returns:
+        The rank to stop before.
+
+    Raises:
+        InvalidDesignError: If the method is not ranked or the range is
+            outside the library.
+    """
+    _check_ranked(design)
+    size = library_size(design)
+    stop = size if stop is None else stop
+    if not 0 <= start <= stop <= size:
+        raise InvalidDesignError(f"Range {start}:{stop} is outside the library")
+    return stop
+
+
+def enumerate_range(
+    design: CombinatoricDesign,
+    start: int = 0,
+    stop: Optional[int] = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> Iterator[np.ndarray]:
+    """Enumerate a range of library ranks in chunks.
+
+    Args:
+        design: The library design.
+        start: The first rank to enumerate.
+        stop: The rank to stop before. Defaults to the library size.
+        chunk_size: The number of members per chunk.
+
+    Yields:
+        Integer arrays of block indices, shape (rows, length).
+
+    Raises:
+        InvalidDesignError: If the method is not ranked or the range is
+            outside the library.
+    """
+    stop = check_range(design, start, stop)
+    for offset in range(start, stop, chunk_size):
+        count = min(chunk_size, stop - offset)
+        if design.method in ("cartesian", "nary"):
+            digits = _product_range(design.radices, offset, count)
+            yield _to_blocks(design, digits)
+        elif _fits_int64(design):
+            yield unrank_many(design, np.arange(offset, offset + count))
+        else:
+            yield unrank_many(design, range(offset, offset + count))
+
+
+def sample(
+    design: CombinatoricDesign,
+    count: int,
+    seed: Optional[int] = None,
+    replace: bool = False,
+) -> np.ndarray:
+    """Draw a uniform random sample of library members.
+
+    Args:
+        design: The library design.
+        count: The number of members to draw.
+        seed: The random seed.
+        replace: Whether a member may be drawn more than once.
+
+    Returns:
+        The block indices of the members, shape (count, length), in rank
+        order when drawn without replacement.
+
+    Raises:
+        InvalidDesignError: If the method is not ranked or the library has
+            fewer than count members to draw without replacement.
+    """
+    _check_ranked(design)
+    size = library_size(design)
+    if not replace and count > size:
+        raise InvalidDesignError(f"Cannot draw {count} members from {size}")
+
+    if size > INT64_LIMIT:
+        generator = random.Random(seed)
+        if replace:
+            return unrank_many(
+                design, [generator.randrange(size) for _ in range(count)]
+            )
+        drawn = set()
+        while len(drawn) < count:
+            drawn.add(generator.randrange(size))
+        return unrank_many(design, sorted(drawn))
+
+    rng = np.random.default_rng(seed)
+    if replace:
+        return unrank_many(design, rng.integers(0, size, count))
+    if count * 4 > size:
+        return unrank_many(design, np.sort(rng.permutation(size)[:count]))
+    ranks = np.unique(rng.integers(0, size, count))
+    while len(ranks) < count:
+        extra = rng.integers(0, size, count - len(ranks))
+        ranks = np.unique(np.concatenate([ranks, extra]))
+    return unrank_many(design, ranks)
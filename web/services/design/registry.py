@@ -0,0 +1,495 @@
+# web/services/design/registry.py
+"""
+This module contains the registry of library design methods.
+
+Each design method registers its page template, its display name and
+description, the schema of the request arguments it takes, and the runner
+of each of its strategies. Runners are named by import path and imported
+on first use, so engines and their dependencies are only loaded once a
+request needs them, and dispatching a request is a dictionary lookup.
+
+Classes:
+    Parameter: A request argument of a design method.
+    DesignMethod: A registered library design method.
+    DesignRegistry: The registered design methods, by name.
+
+Constants:
+    DESIGN_METHODS: The registry of the built-in design methods.
+"""
+
+# Standard Library Imports
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterator, Mapping, Optional, Tuple
+import importlib
+
+# Internal Imports
+from web.core.exceptions.design_exceptions import InvalidDesignError
+
+FALSE_VALUES = ("false", "0", "no", "off")
+
+
+@dataclass(frozen=True)
+class Parameter:
+    """A request argument of a design method.
+
+    Attributes:
+        name: The argument name.
+        kind: The argument type: str, int, float or bool.
+        default: The value when the argument is absent.
+        description: What the argument controls.
+        choices: The allowed values, or empty for any value.
+        multiple: Whether the argument may be repeated, giving a list.
+
+    Methods:
+        parse: Get the argument's value from request arguments.
+        schema: Describe the argument as JSON-compatible data.
+    """
+
+    name: str
+    kind: type = str
+    default: Any = None
+    description: str = ""
+    choices: Tuple[Any, ...] = ()
+    multiple: bool = False
+
+    def _convert(self, raw: str) -> Any:
+        """Convert a raw argument to the parameter's type."""
+        if self.kind is bool:
+            return raw.strip().lower() not in FALSE_VALUES
+        try:
+            value = self.kind(raw)
+        except ValueError:
+            raise InvalidDesignError(f"Invalid {self.name}: {raw}")
+        if self.choices and value not in self.choices:
+            raise InvalidDesignError(f"Unknown {self.name}: {raw}")
+        return value
+
+    def parse(self, args: Mapping[str, Any]) -> Any:
+        """Get the argument's value from request arguments.
+
+        Args:
+            args: The request arguments; repeated arguments need a
+                ``getlist`` method, as on Werkzeug's MultiDict.
+
+        Returns:
+            The converted value, the default if the argument is absent, or
+            a list of values for repeated arguments.
+
+        Raises:
+            InvalidDesignError: If the value cannot be converted or is not
+                one of the choices.
+        """
+        if self.multiple:
+            return [self._convert(raw) for raw in args.getlist(self.name)]
+        raw = args.get(self.name)
+        if raw is None:
+            return self.default
+        return self._convert(raw)
+
+    def schema(self) -> Dict[str, Any]:
+        """Describe the argument as JSON-compatible data.
+
+        Returns:
+            The name, type, default, description, choices and repetition.
+        """
+        return {
+            "name": self.name,
+            "type": self.kind.__name__,
+            "default": self.default,
+            "description": self.description,
+            "choices": list(self.choices),
+            "multiple": self.multiple,
+        }
+
+
+@dataclass(frozen=True)
+class DesignMethod:
+    """A registered library design method.
+
+    Attributes:
+        name: The method name, as used in URLs and by DesignType.
+        display_name: The name shown in the interface.
+        description: A one-line description for the design hub.
+        template: The template of the method's page.
+        runners: The import path of each strategy's runner, written as
+            ``module:attribute``.
+        parameters: The request arguments the method takes.
+
+    Methods:
+        parse: Get the method's arguments from request arguments.
+        schema: Describe the method as JSON-compatible data.
+    """
+
+    name: str
+    display_name: str
+    description: str
+    template: str
+    runners: Mapping[str, str] = field(default_factory=dict)
+    parameters: Tuple[Parameter, ...] = ()
+
+    def parse(self, args: Mapping[str, Any]) -> Dict[str, Any]:
+        """Get the method's arguments from request arguments.
+
+        Args:
+            args: The request arguments.
+
+        Returns:
+            The value of every parameter, by name.
+
+        Raises:
+            InvalidDesignError: If an argument is invalid.
+        """
+        return {parameter.name: parameter.parse(args) for parameter in self.parameters}
+
+    def schema(self) -> Dict[str, Any]:
+        """Describe the method as JSON-compatible data.
+
+        Returns:
+            The method's names, strategies and parameters.
+        """
+        return {
+            "name": self.name,
+            "display_name": self.display_name,
+            "description": self.description,
+            "strategies": list(self.runners),
+            "parameters": [parameter.schema() for parameter in self.parameters],
+        }
+
+
+class DesignRegistry:
+    """The registered design methods, by name.
+
+    Methods:
+        register: Register a design method.
+        get: Get a design method by name.
+        display_names: Get the display name of every method.
+        descriptions: Get the description of every method.
+        runner: Get the runner of a method's strategy, importing it if needed.
+    """
+
+    def __init__(self) -> None:
+        """Initialize an empty registry."""
+        self._methods: Dict[str, DesignMethod] = {}
+        self._runners: Dict[str, Callable[..., Any]] = {}
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._methods
+
+    def __iter__(self) -> Iterator[DesignMethod]:
+        return iter(self._methods.values())
+
+    def __len__(self) -> int:
+        return len(self._methods)
+
+    def register(self, method: DesignMethod) -> DesignMethod:
+        """Register a design method.
+
+        Args:
+            method: The design method.
+
+        Returns:
+            The design method.
+
+        Raises:
+            InvalidDesignError: If a method of the same name is registered.
+        """
+        if method.name in self._methods:
+            raise InvalidDesignError(f"Design method already registered: {method.name}")
+        self._methods[method.name] = method
+        return method
+
+    def get(self, name: str) -> Optional[DesignMethod]:
+        """Get a design method by name.
+
+        Args:
+            name: The method name.
+
+        Returns:
+            The design method, or None if none is registered by that name.
+        """
+        return self._methods.get(name)
+
+    def display_names(self) -> Dict[str, str]:
+        """Get the display name of every method.
+
+        Returns:
+            The display names, by method name, in registration order.
+        """
+        return {name: method.display_name for name, method in self._methods.items()}
+
+    def descriptions(self) -> Dict[str, str]:
+        """Get the description of every method.
+
+        Returns:
+            The descriptions, by method name, in registration order.
+        """
+        return {name: method.description for name, method in self._methods.items()}
+
+    def runner(self, name: str, strategy: str) -> Callable[..., Any]:
+        """Get the runner of a method's strategy, importing it if needed.
+
+        Args:
+            name: The method name.
+            strategy: The strategy name.
+
+        Returns:
+            The runner.
+
+        Raises:
+            InvalidDesignError: If the method or strategy is unknown.
+        """
+        method = self._methods.get(name)
+        if method is None:
+            raise InvalidDesignError(f"Unknown design method: {name}")
+        path = method.runners.get(strategy)
+        if path is None:
+            raise InvalidDesignError(f"Unknown {name} strategy: {strategy}")
+        if path not in self._runners:
+            module, _, attribute = path.partition(":")
+            self._runners[path] = getattr(importlib.import_module(module), attribute)
+        return self._runners[path]
+
+
+_SET = Parameter("set", str, "canonical", "The building block set")
+_SEPARATOR = Parameter("separator", str, "-", "The separator between block codes")
+_PROPERTIES = Parameter(
+    "properties", bool, False, "Whether to write each member's properties"
+)
+_SEED = Parameter("seed", int, None, "The random seed")
+_PROPERTY = Parameter("property", str, "mol_wt", "The descriptor to design for")
+_TARGET = Parameter("target", float, None, "The descriptor value to aim for")
+_MAXIMIZE = Parameter(
+    "maximize", bool, True, "Whether to maximize the descriptor without a target"
+)
+_COMBINATORIC_METHODS = (
+    "combination",
+    "permutation",
+    "cartesian",
+    "nary",
+    "cyclic",
+    "dihedral",
+)
+_LIBRARY = (
+    _SET,
+    Parameter("length", int, None, "The member length"),
+    Parameter("codes", str, None, "Comma-separated block codes to use"),
+    Parameter(
+        "positions",
+        str,
+        None,
+        "Semicolon-separated groups of the block codes at each position",
+    ),
+    Parameter(
+        "bound", str, None, "A property bound, as name:lower:upper", multiple=True
+    ),
+    Parameter(
+        "limit",
+        str,
+        None,
+        "A block count limit, as codes:max or codes:min:max",
+        multiple=True,
+    ),
+)
+
+DESIGN_METHODS = DesignRegistry()
+
+DESIGN_METHODS.register(
+    DesignMethod(
+        name="combinatoric",
+        display_name="Combinatorial",
+        description="Generate a peptide library using combinatorial methods",
+        template="design/combinatoric.html",
+        runners={
+            method: "web.services.design.combinatoric:enumerate_library"
+            for method in _COMBINATORIC_METHODS
+        },
+        parameters=(
+            *_LIBRARY,
+            Parameter("start", int, 0, "The rank of the first member to export"),
+            Parameter("stop", int, None, "The rank to stop the export before"),
+            _SEPARATOR,
+            _PROPERTIES,
+        ),
+    )
+)
+
+DESIGN_METHODS.register(
+    DesignMethod(
+        name="generative",
+        display_name="Generative AI",
+        description="Generate a peptide library using generative AI models",
+        template="design/generative.html",
+    )
+)
+
+DESIGN_METHODS.register(
+    DesignMethod(
+        name="genetic",
+        display_name="Genetic Algorithm",
+        description=(
+            "Generate a peptide library through simulated evolution "
+            "using genetic algorithms"
+        ),
+        template="design/genetic.html",
+        runners={
+            strategy: "web.services.design.genetic:run_strategy"
+            for strategy in ("mass", "property", "diversity")
+        },
+        parameters=(
+            _SET,
+            Parameter("length", int, 8, "The member length"),
+            Parameter(
+                "library_size",
+                int,
+                None,
+                "The members per library; 1 for property, otherwise 20",
+            ),
+            Parameter("population_size", int, 100, "The libraries per generation"),
+            Parameter("generations", int, 50, "The number of generations"),
+            Parameter("mutation_rate", float, 0.1, "The per-block mutation rate"),
+            _SEED,
+            _PROPERTY,
+            _TARGET,
+            _MAXIMIZE,
+            Parameter(
+                "tolerance_ppm", float, 5.0, "The mass resolution, in ppm, for mass"
+            ),
+            Parameter(
+                "isotopes", int, 0, "The heavy isotope peaks per member, for mass"
+            ),
+            Parameter(
+                "representation",
+                str,
+                "hamming",
+                "The member comparison, for diversity",
+                choices=("hamming", "kmer", "fingerprint"),
+            ),
+            Parameter("kmer", int, 2, "The k-mer length, for kmer diversity"),
+            Parameter("num_perm", int, 64, "The MinHash permutations, for diversity"),
+            Parameter("bands", int, 16, "The LSH bands, for diversity"),
+            _SEPARATOR,
+        ),
+    )
+)
+
+DESIGN_METHODS.register(
+    DesignMethod(
+        name="mcmc",
+        display_name="Markov Chain Monte Carlo",
+        description="Generate a peptide library using Markov Chain Monte Carlo sampling",
+        template="design/mcmc.html",
+        runners={"parallel-tempering": "web.services.design.mcmc:ParallelTempering"},
+        parameters=(
+            _SET,
+            _PROPERTY,
+            _TARGET,
+            _MAXIMIZE,
+            Parameter("min_length", int, 8, "The shortest sequence length"),
+            Parameter("max_length", int, 8, "The longest sequence length"),
+            Parameter("chains", int, 16, "The chains per temperature"),
+            Parameter("temperatures", int, 4, "The rungs of the temperature ladder"),
+            Parameter("t_min", float, 1.0, "The coldest temperature"),
+            Parameter("t_max", float, 10.0, "The hottest temperature"),
+            Parameter("steps", int, 1000, "The steps per chain"),
+            Parameter(
+                "moves",
+                str,
+                "0.6,0.2,0.2",
+                "Comma-separated point, swap and insertion move weights",
+            ),
+            Parameter("swap_interval", int, 10, "The steps between replica swaps"),
+            Parameter(
+                "criterion",
+                str,
+                "metropolis",
+                "The acceptance criterion",
+                choices=("metropolis", "glauber"),
+            ),
+            _SEED,
+            Parameter("burn_in", int, 0, "The steps skipped before sampling"),
+            Parameter("thin", int, 1, "The steps between kept samples"),
+            _SEPARATOR,
+        ),
+    )
+)
+
+DESIGN_METHODS.register(
+    DesignMethod(
+        name="fractal",
+        display_name="Fractal-Based",
+        description="Generate a peptide library using fractal-based patterns",
+        template="design/fractal.html",
+        runners={
+            "space-filling": "web.services.design.space_filling:space_filling_sample",
+            "self-similar": "web.services.design.substitution:expand_self_similar",
+            "recursive": "web.services.design.substitution:expand_recursive",
+        },
+        parameters=(
+            _SET,
+            Parameter(
+                "length",
+                int,
+                None,
+                "The member length, or the window length for self-similar, 10 by default",
+            ),
+            *_LIBRARY[2:],
+            Parameter(
+                "method",
+                str,
+                "cartesian",
+                "The product library to fill, for space-filling",
+                choices=("cartesian", "nary"),
+            ),
+            _PROPERTY,
+            Parameter(
+                "curve",
+                str,
+                "hilbert",
+                "The space-filling curve",
+                choices=("hilbert", "zorder"),
+            ),
+            Parameter("rules", str, "", "Substitution rules, as lhs -> rhs | rhs"),
+            Parameter("axiom", str, None, "The starting block codes, for self-similar"),
+            Parameter("start", str, None, "The start symbol, for recursive"),
+            Parameter("depth", int, 8, "The generations or derivation depth"),
+            Parameter("min_length", int, 1, "The shortest sequence, for recursive"),
+            Parameter("max_length", int, 10, "The longest sequence, for recursive"),
+            Parameter("size", int, 1000, "The number of members"),
+            Parameter("seed", int, 0, "The random seed, for space-filling"),
+            _SEPARATOR,
+            _PROPERTIES,
+        ),
+    )
+)
+
+DESIGN_METHODS.register(
+    DesignMethod(
+        name="random",
+        display_name="Random Sampling",
+        description="Generate a peptide library using random sampling",
+        template="design/random.html",
+        runners={
+            "draw": "web.services.design.random_sampling:WeightedSampler",
+            "reservoir": "web.services.design.random_sampling:Reservoir",
+        },
+        parameters=(
+            _SET,
+            Parameter("length", int, None, "The member length, 10 by default for draw"),
+            *_LIBRARY[2:],
+            Parameter(
+                "method",
+                str,
+                "nary",
+                "The combinatorial library to sample, for reservoir",
+                choices=_COMBINATORIC_METHODS,
+            ),
+            Parameter(
+                "weights", str, "", "Comma-separated code:weight pairs, for draw"
+            ),
+            Parameter("size", int, 1000, "The number of members"),
+            _SEED,
+            _SEPARATOR,
+            _PROPERTIES,
+        ),
+    )
+)
@@ -0,0 +1,452 @@
+# web/services/design/sharding.py
+"""
+This module contains the multi-process sharded library generator.
+
+The rank space of a library is split into contiguous shards that worker
+processes write to their own files. As every shard covers a rank range and
+shards are merged in range order, the merged output is the library in rank
+order, identical to a single-process export. A finished shard is renamed
+into place atomically, so when a worker crashes only the shards that did
+not finish are run again.
+
+Cyclic, dihedral and constrained libraries have no rank order and are
+written by a single worker.
+
+Functions:
+    design_fingerprint: Fingerprint everything that determines the contents
+        of a library.
+    plan_shards: Split a library's rank space into shards.
+    generate_library: Generate a library to disk with a process pool.
+    generate_in_background: Generate a library in a background thread.
+    generation_status: Get the status of a background generation.
+"""
+
+# Standard Library Imports
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from itertools import islice
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+# External Imports
+import numpy as np
+
+# Internal Imports
+from web.core.exceptions.design_exceptions import LibraryGenerationError
+from web.services.blocks.depiction_cache import DEFAULT_CACHE_DIR
+from web.services.compute_settings import ComputeSettings
+from web.services.design.combinatoric import (
+    DEFAULT_CHUNK_SIZE,
+    CombinatoricDesign,
+    enumerate_library,
+    format_members,
+    library_size,
+)
+from web.services.design.ranking import enumerate_range, is_ranked
+
+DEFAULT_LIBRARY_DIR: str = os.environ.get(
+    "PEPLAB_LIBRARY_DIR", os.path.join(DEFAULT_CACHE_DIR, "libraries")
+)
+SHARDS_PER_WORKER: int = 4
+MIN_SHARD_SIZE: int = 100_000
+DEFAULT_MAX_RETRIES: int = 2
+# A running generation refreshes its status file every heartbeat; one not
+# refreshed for a lease has been interrupted
+STATUS_HEARTBEAT_INTERVAL: float = 5.0
+STATUS_LEASE_TIMEOUT: float = 60.0
+MAX_ERROR_LENGTH: int = 1000
+
+_running: Dict[str, threading.Thread] = {}
+_lock = threading.Lock()
+
+
+def plan_shards(
+    design: CombinatoricDesign, n_shards: int
+) -> List[Tuple[int, Optional[int]]]:
+    """Split a library's rank space into shards.
+
+    Args:
+        design: The library design.
+        n_shards: The number of shards wanted.
+
+    Returns:
+        The (start, stop) rank range of each shard, in rank order. Libraries
+        without a rank order get a single shard covering everything.
+    """
+    if not is_ranked(design):
+        return [(0, None)]
+    size = library_size(design)
+    n_shards = max(1, min(n_shards, -(-size // MIN_SHARD_SIZE)))
+    bounds = [size * i // n_shards for i in range(n_shards + 1)]
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def design_fingerprint(
+    design: CombinatoricDesign, codes: Sequence[str], separator: str = "-"
+) -> str:
+    """Fingerprint everything that determines the contents of a library.
+
+    Args:
+        design: The library design.
+        codes: The code of each block, used to spell out members.
+        separator: The separator between block codes.
+
+    Returns:
+        A SHA-256 hex digest, equal for designs that spell the same library.
+    """
+    return _fingerprint(_design_plan(design, codes, separator))
+
+
+def _design_plan(
+    design: CombinatoricDesign, codes: Sequence[str], separator: str
+) -> Dict[str, Any]:
+    """Describe a library design as JSON-compatible data."""
+    position_sets = design.position_sets or []
+    constraints = design.constraints
+    return {
+        "bounds": [
+            [
+                np.asarray(bound.values).tolist(),
+                bound.lower,
+                bound.upper,
+                bound.resolution,
+            ]
+            for bound in (constraints.bounds if constraints else [])
+        ],
+        "limits": [
+            [np.asarray(limit.blocks).tolist(), limit.max_count, limit.min_count]
+            for limit in (constraints.limits if constraints else [])
+        ],
+        "method": design.method,
+        "n_blocks": design.n_blocks,
+        "length": design.length,
+        "position_sets": [np.asarray(blocks).tolist() for blocks in position_sets],
+        "codes": list(codes),
+        "separator": separator,
+    }
+
+
+def _fingerprint(plan: Dict[str, Any]) -> str:
+    return hashlib.sha256(json.dumps(plan).encode()).hexdigest()
+
+
+def _plan_fingerprint(
+    design: CombinatoricDesign,
+    codes: Sequence[str],
+    separator: str,
+    shards: List[Tuple[int, Optional[int]]],
+) -> str:
+    """Fingerprint everything that determines the contents of the shards."""
+    return _fingerprint({**_design_plan(design, codes, separator), "shards": shards})
+
+
+def _prepare_work_dir(work_dir: str, fingerprint: str) -> None:
+    """Create the shard directory, clearing shards of a different plan."""
+    manifest = os.path.join(work_dir, "plan.sha256")
+    if os.path.isdir(work_dir):
+        try:
+            with open(manifest) as file:
+                if file.read() == fingerprint:
+                    return
+        except FileNotFoundError:
+            pass
+        shutil.rmtree(work_dir)
+    os.makedirs(work_dir)
+    with open(manifest, "w") as file:
+        file.write(fingerprint)
+
+
+def _write_shard(
+    design: CombinatoricDesign,
+    codes: Sequence[str],
+    separator: str,
+    chunk_size: int,
+    shard: Tuple[int, Optional[int]],
+    path: str,
+) -> int:
+    """Write the members of one shard in a worker process.
+
+    The shard file starts with its member count instead of the CSV header,
+    so the merge can count the library without enumerating it again.
+    """
+    start, stop = shard
+    members = (
+        enumerate_range(design, start, stop, chunk_size)
+        if start or stop is not None
+        else enumerate_library(design, chunk_size)
+    )
+    count = 0
+
+    def counted() -> Iterator[np.ndarray]:
+        nonlocal count
+        for chunk in members:
+            count += len(chunk)
+            yield chunk
+
+    handle, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(handle, "w", newline="") as file:
+            # The count line has a fixed width to be rewritten in place
+            file.write(f"{0:020d}\n")
+            file.writelines(
+                islice(format_members(counted(), codes, separator), 1, None)
+            )
+            file.seek(0)
+            file.write(f"{count:020d}\n")
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+    return count
+
+
+def _merge_shards(paths: List[str], output: str) -> int:
+    """Merge shard files in rank order into the output file.
+
+    The shards cover consecutive rank ranges, so merging them in rank order
+    is a streaming concatenation in shard order.
+
+    Returns:
+        The number of members written, summed from the shards' counts.
+    """
+    directory = os.path.dirname(os.path.abspath(output))
+    handle, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    count = 0
+    try:
+        with os.fdopen(handle, "w", newline="") as file:
+            file.write("Sequence\n")
+            for path in paths:
+                with open(path, newline="") as shard:
+                    count += int(shard.readline())
+                    shutil.copyfileobj(shard, file)
+        os.replace(temp_path, output)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+    return count
+
+
+def generate_library(
+    design: CombinatoricDesign,
+    codes: Sequence[str],
+    output: str,
+    separator: str = "-",
+    max_workers: Optional[int] = None,
+    n_shards: Optional[int] = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    max_retries: int = DEFAULT_MAX_RETRIES,
+) -> int:
+    """Generate a library to disk with a process pool.
+
+    Shards are written to a work directory next to the output. Shards left
+    there by an interrupted run of the same output are reused, and shards
+    whose worker failed are run again up to max_retries times. The work
+    directory is removed once the generation completes or fails.
+
+    Args:
+        design: The library design.
+        codes: The code of each block, used to spell out members.
+        output: The path of the CSV file to write.
+        separator: The separator between block codes.
+        max_workers: The number of worker processes. Defaults to the
+            compute settings' thread limit.
+        n_shards: The number of shards. Defaults to a few per worker.
+        chunk_size: The number of members generated at a time.
+        max_retries: How many times failed shards are run again.
+
+    Returns:
+        The number of members written.
+
+    Raises:
+        LibraryGenerationError: If shards still fail after every retry.
+    """
+    work_dir = f"{output}.shards"
+    try:
+        max_workers = max_workers or ComputeSettings().max_threads
+        shards = plan_shards(design, n_shards or max_workers * SHARDS_PER_WORKER)
+        fingerprint = _plan_fingerprint(design, codes, separator, shards)
+        _prepare_work_dir(work_dir, fingerprint)
+        paths = [
+            os.path.join(work_dir, f"shard-{index:05d}.csv")
+            for index in range(len(shards))
+        ]
+
+        errors: List[str] = []
+        for _ in range(max_retries + 1):
+            pending = [
+                index for index, path in enumerate(paths) if not os.path.exists(path)
+            ]
+            if not pending:
+                break
+            errors = []
+            workers = min(max_workers, len(pending))
+            # A fresh pool per attempt, as a crashed worker breaks the whole pool
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                futures: Dict[int, Future] = {
+                    index: pool.submit(
+                        _write_shard,
+                        design,
+                        codes,
+                        separator,
+                        chunk_size,
+                        shards[index],
+                        paths[index],
+                    )
+                    for index in pending
+                }
+                for index, future in futures.items():
+                    try:
+                        future.result()
+                    except (BrokenProcessPool, OSError) as error:
+                        errors.append(f"shard {index}: {error!r}")
+        if errors:
+            raise LibraryGenerationError(
+                f"{len(errors)} shard(s) failed after {max_retries} retries: "
+                f"{errors[0]}"
+            )
+        return _merge_shards(paths, output)
+    except BaseException as error:
+        # A background generation's status must not stay running until its
+        # lease expires
+        if os.path.exists(_status_path(output)):
+            _write_status(output, "failed", _error_message(error))
+        raise
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def _error_message(error: BaseException) -> str:
+    """Get the status message of a failed generation."""
+    message = (
+        error.message
+        if isinstance(error, LibraryGenerationError)
+        else f"{type(error).__name__}: {error}"
+    )
+    return message[:MAX_ERROR_LENGTH]
+
+
+def _status_path(output: str) -> str:
+    """Get the path of the status file of a library being generated."""
+    return f"{output}.status"
+
+
+def _write_status(output: str, status: str, error: Optional[str] = None) -> None:
+    """Write the status of a background generation, atomically."""
+    tmp_path = f"{_status_path(output)}.tmp"
+    with open(tmp_path, "w") as handle:
+        json.dump({"status": status, "error": error}, handle)
+    os.replace(tmp_path, _status_path(output))
+
+
+def _read_status(output: str) -> Optional[Tuple[str, Optional[str]]]:
+    """Read the status of a background generation from its status file.
+
+    Returns:
+        The status and error message, or None if there is no status file.
+        A running generation whose lease has expired is reported failed.
+    """
+    path = _status_path(output)
+    try:
+        with open(path) as handle:
+            status = json.load(handle)
+        modified = os.path.getmtime(path)
+    except (OSError, ValueError):
+        return None
+    if status["status"] == "running" and time.time() - modified > STATUS_LEASE_TIMEOUT:
+        return "failed", "Generation was interrupted"
+    return status["status"], status["error"]
+
+
+def generate_in_background(
+    library_id: str,
+    design: CombinatoricDesign,
+    codes: Sequence[str],
+    separator: str = "-",
+    library_dir: str = DEFAULT_LIBRARY_DIR,
+) -> str:
+    """Generate a library in a background thread.
+
+    Generating the same library id again while it runs is a no-op, and an
+    already generated library is not generated again. The status is kept
+    in a file beside the library, so every server process sees it, and a
+    generation that failed or was interrupted is started again.
+
+    Args:
+        library_id: The identifier of the library, used as its file name.
+        design: The library design.
+        codes: The code of each block, used to spell out members.
+        separator: The separator between block codes.
+        library_dir: The directory to write the library to.
+
+    Returns:
+        The path of the library file.
+    """
+    os.makedirs(library_dir, exist_ok=True)
+    output = os.path.join(library_dir, f"{library_id}.csv")
+
+    def run() -> None:
+        done = threading.Event()
+
+        def heartbeat() -> None:
+            while not done.wait(STATUS_HEARTBEAT_INTERVAL):
+                try:
+                    os.utime(_status_path(output))
+                except OSError:
+                    return
+
+        threading.Thread(
+            target=heartbeat, name=f"library-{library_id}-heartbeat", daemon=True
+        ).start()
+        try:
+            generate_library(design, codes, output, separator)
+        except Exception as error:
+            _write_status(output, "failed", _error_message(error))
+        else:
+            os.unlink(_status_path(output))
+        finally:
+            done.set()
+            with _lock:
+                _running.pop(library_id, None)
+
+    with _lock:
+        if library_id in _running or os.path.exists(output):
+            return output
+        status = _read_status(output)
+        if status is not None and status[0] == "running":
+            return output
+        _write_status(output, "running")
+        thread = threading.Thread(target=run, name=f"library-{library_id}", daemon=True)
+        _running[library_id] = thread
+        thread.start()
+    return output
+
+
+def generation_status(
+    library_id: str, library_dir: str = DEFAULT_LIBRARY_DIR
+) -> Tuple[str, Optional[str]]:
+    """Get the status of a background generation.
+
+    Args:
+        library_id: The identifier of the library.
+        library_dir: The directory the library is written to.
+
+    Returns:
+        The status, one of "running", "complete", "failed" or "unknown",
+        and the error message of a failed generation.
+    """
+    with _lock:
+        if library_id in _running:
+            return "running", None
+    output = os.path.join(library_dir, f"{library_id}.csv")
+    status = _read_status(output)
+    if status is not None:
+        return status
+    if os.path.exists(output):
+        return "complete", None
+    return "unknown", None
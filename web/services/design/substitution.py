@@ -0,0 +1,707 @@
+# web/services/design/substitution.py
+"""
+This module contains the substitution-rule generators of fractal design.
+
+Sequences grow from rules that replace a symbol with a motif. Expanding a
+deep rule set symbol by symbol takes time and memory exponential in the
+depth, so expansions are built as a hash-consed graph instead: every
+distinct expansion is a single node, made once and shared wherever it
+occurs, and a depth-d expansion costs O(d * rules) nodes however long its
+sequences grow. Sequences are streamed out of the graph in chunks, and
+small expansions are materialized once and reused.
+
+Strategies:
+    self-similar: deterministic rules over block codes that rewrite every
+        block of the word at once (a D0L system). The library is the
+        distinct windows of the word after some generations.
+    recursive: grammar rules with nonterminals and alternatives. The
+        library is every sequence derivable within some depth.
+
+Rules are written ``lhs -> rhs | rhs``, one per line or separated by
+semicolons, with whitespace between symbols. An empty alternative derives
+the empty sequence.
+
+Classes:
+    ExpansionGraph: A hash-consed graph of rule expansions.
+
+Functions:
+    parse_rules: Parse substitution rules.
+    expand_self_similar: Build the word of a self-similar rule set.
+    expand_recursive: Build the sequences of a recursive rule set.
+    self_similar_library: Stream the distinct windows of a self-similar word.
+    recursive_library: Stream the distinct sequences of a recursive rule set.
+"""
+
+# Standard Library Imports
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+import re
+
+# External Imports
+import numpy as np
+
+# Internal Imports
+from web.core.exceptions.design_exceptions import InvalidDesignError
+from web.services.design.combinatoric import DEFAULT_CHUNK_SIZE
+from web.services.design.hashing import BloomFilter, hash_rows
+
+SUBSTITUTION_STRATEGIES = ("self-similar", "recursive")
+MAX_DEPTH = 1024
+DEFAULT_MAX_LENGTH = 64
+DEFAULT_LEAF_SIZE = 1024
+DEFAULT_CACHE_SIZE = 1 << 22
+DEDUPLICATION_ERROR_RATE = 1e-6
+# Derivation counts saturate here, as ambiguous rules such as S -> S S
+# have counts that grow doubly exponentially with the depth
+MAX_COUNT = 1 << 62
+
+# Node kinds: a single block, the empty sequence, a concatenation of two
+# nodes, and a choice between alternative nodes
+_LEAF, _EMPTY, _PAIR, _UNION = range(4)
+
+Rules = Dict[str, List[Tuple[str, ...]]]
+
+
+class ExpansionGraph:
+    """A hash-consed graph of rule expansions.
+
+    Nodes are interned by kind and children, so building an expansion that
+    already exists returns the existing node. Children are always made
+    before their parents, so node ids are a topological order.
+
+    Attributes:
+        max_length: The longest sequence length counted and enumerated.
+        leaf_size: Words up to this length are materialized and reused.
+        cache_size: The number of cached block indices across languages.
+        chunk_size: The target number of rows per enumerated chunk.
+
+    Methods:
+        leaf: Get the node of a single block.
+        empty: Get the node of the empty sequence.
+        concat: Get the node of a concatenation.
+        union: Get the node of a choice between alternatives.
+        length: Get the length of a word node.
+        block_at: Get the block at a position of a word node.
+        word: Stream the blocks of a word node.
+        windows: Enumerate the windows of a word node, one visit per
+            distinct node.
+        counts: Count the derivations of each length of a node, up to
+            MAX_COUNT.
+        members: Enumerate the sequences of one length of a node.
+    """
+
+    def __init__(
+        self,
+        max_length: int = DEFAULT_MAX_LENGTH,
+        leaf_size: int = DEFAULT_LEAF_SIZE,
+        cache_size: int = DEFAULT_CACHE_SIZE,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+    ) -> None:
+        """Initialize an empty graph.
+
+        Args:
+            max_length: The longest sequence length counted and enumerated.
+            leaf_size: Words up to this length are materialized and reused.
+            cache_size: The number of cached block indices across languages.
+            chunk_size: The target number of rows per enumerated chunk.
+
+        Raises:
+            InvalidDesignError: If a size is not positive.
+        """
+        if min(max_length, leaf_size, chunk_size) < 1 or cache_size < 0:
+            raise InvalidDesignError("Expansion graph sizes must be positive")
+        self.max_length: int = max_length
+        self.leaf_size: int = leaf_size
+        self.cache_size: int = cache_size
+        self.chunk_size: int = chunk_size
+        self._nodes: List[Tuple[int, Tuple[int, ...]]] = []
+        self._ids: Dict[Tuple[int, Tuple[int, ...]], int] = {}
+        # Word length of each node, or None for nodes with alternatives
+        self._lengths: List[Optional[int]] = []
+        self._counts: List[List[int]] = []
+        self._words: Dict[int, np.ndarray] = {}
+        self._languages: Dict[Tuple[int, int], Optional[np.ndarray]] = {}
+        self._cached: int = 0
+
+    def __len__(self) -> int:
+        return len(self._nodes)
+
+    def _intern(
+        self, kind: int, children: Tuple[int, ...], length: Optional[int]
+    ) -> int:
+        """Get the node of a kind and children, making it if it is new."""
+        key = (kind, children)
+        node = self._ids.get(key)
+        if node is None:
+            node = len(self._nodes)
+            self._ids[key] = node
+            self._nodes.append(key)
+            self._lengths.append(length)
+        return node
+
+    def leaf(self, block: int) -> int:
+        """Get the node of a single block.
+
+        Args:
+            block: The block index.
+
+        Returns:
+            The node id.
+        """
+        return self._intern(_LEAF, (int(block),), 1)
+
+    def empty(self) -> int:
+        """Get the node of the empty sequence.
+
+        Returns:
+            The node id.
+        """
+        return self._intern(_EMPTY, (), 0)
+
+    def concat(self, nodes: Sequence[Optional[int]]) -> Optional[int]:
+        """Get the node of a concatenation.
+
+        Concatenations are folded from the right into pairs, so motifs that
+        end the same way share their tails.
+
+        Args:
+            nodes: The nodes to concatenate, in order. None stands for an
+                expansion with no sequences.
+
+        Returns:
+            The node id, or None if any part has no sequences.
+        """
+        if any(node is None for node in nodes):
+            return None
+        parts = [node for node in nodes if self._nodes[node][0] != _EMPTY]
+        if not parts:
+            return self.empty()
+        node = parts[-1]
+        for left in reversed(parts[:-1]):
+            lengths = (self._lengths[left], self._lengths[node])
+            length = None if None in lengths else lengths[0] + lengths[1]
+            node = self._intern(_PAIR, (left, node), length)
+        return node
+
+    def union(self, nodes: Sequence[Optional[int]]) -> Optional[int]:
+        """Get the node of a choice between alternatives.
+
+        Nested choices are flattened and repeated alternatives merged, so
+        the same set of alternatives always gives the same node.
+
+        Args:
+            nodes: The alternative nodes. None stands for an expansion with
+                no sequences and is dropped.
+
+        Returns:
+            The node id, or None if no alternative has sequences.
+        """
+        children = set()
+        for node in nodes:
+            if node is None:
+                continue
+            kind, grandchildren = self._nodes[node]
+            children.update(grandchildren if kind == _UNION else (node,))
+        if not children:
+            return None
+        if len(children) == 1:
+            return children.pop()
+        return self._intern(_UNION, tuple(sorted(children)), None)
+
+    def length(self, node: int) -> int:
+        """Get the length of a word node.
+
+        Args:
+            node: The node id.
+
+        Returns:
+            The number of blocks in the word.
+
+        Raises:
+            InvalidDesignError: If the node has alternatives.
+        """
+        length = self._lengths[node]
+        if length is None:
+            raise InvalidDesignError("Expansions with alternatives are not words")
+        return length
+
+    def block_at(self, node: int, index: int) -> int:
+        """Get the block at a position of a word node.
+
+        Args:
+            node: The node id.
+            index: The position in the word.
+
+        Returns:
+            The block index.
+
+        Raises:
+            InvalidDesignError: If the node has alternatives or the position
+                is out of range.
+        """
+        if not 0 <= index < self.length(node):
+            raise InvalidDesignError(f"Position {index} is outside the word")
+        while self._nodes[node][0] == _PAIR:
+            left, right = self._nodes[node][1]
+            if index < self._lengths[left]:
+                node = left
+            else:
+                index -= self._lengths[left]
+                node = right
+        return self._nodes[node][1][0]
+
+    def _materialize(self, node: int) -> np.ndarray:
+        """Get the blocks of a short word node, caching every sub-word."""
+        words = self._words
+        stack = [node]
+        while stack:
+            top = stack[-1]
+            if top in words:
+                stack.pop()
+                continue
+            kind, children = self._nodes[top]
+            if kind == _PAIR:
+                missing = [child for child in children if child not in words]
+                if missing:
+                    stack.extend(missing)
+                    continue
+                words[top] = np.concatenate([words[child] for child in children])
+            else:
+                words[top] = np.asarray(children, dtype=np.int64)
+            stack.pop()
+        return words[node]
+
+    def word(
+        self, node: int, start: int = 0, stop: Optional[int] = None
+    ) -> Iterator[np.ndarray]:
+        """Stream the blocks of a word node.
+
+        Whole sub-words outside ``start`` and ``stop`` are skipped by their
+        lengths, so a stream can cover any stretch of a word too long to
+        expand.
+
+        Args:
+            node: The node id.
+            start: The position to start from.
+            stop: The position to stop before, or None for the end.
+
+        Yields:
+            Chunks of about chunk_size block indices.
+
+        Raises:
+            InvalidDesignError: If the node has alternatives.
+        """
+        remaining = self.length(node) if stop is None else stop
+        remaining -= start
+        stack = [node]
+        pieces: List[np.ndarray] = []
+        size = 0
+        while stack and remaining > 0:
+            node = stack.pop()
+            length = self._lengths[node]
+            if length <= start:
+                start -= length
+                continue
+            if length > self.leaf_size:
+                left, right = self._nodes[node][1]
+                stack.extend((right, left))
+                continue
+            piece = self._materialize(node)[start : start + remaining]
+            pieces.append(piece)
+            size += len(piece)
+            remaining -= len(piece)
+            start = 0
+            if size >= self.chunk_size:
+                yield np.concatenate(pieces)
+                pieces, size = [], 0
+        if pieces:
+            yield np.concatenate(pieces)
+
+    def windows(self, node: int, length: int) -> Iterator[np.ndarray]:
+        """Enumerate the windows of a word node, one visit per distinct node.
+
+        Every window lies either inside a sub-word of at most leaf_size
+        blocks or across the middle of a longer pair, and a shared node
+        holds the same windows wherever it occurs. Visiting each distinct
+        node once therefore finds every distinct window, in time that
+        depends on the size of the graph rather than of the word.
+
+        Args:
+            node: The node id.
+            length: The window length.
+
+        Yields:
+            Integer arrays of windows, shape (rows, length). Windows may
+            repeat between and within arrays.
+
+        Raises:
+            InvalidDesignError: If the node has alternatives.
+        """
+        self.length(node)
+        visited = set()
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            if node in visited:
+                continue
+            visited.add(node)
+            if self._lengths[node] <= self.leaf_size:
+                blocks = self._materialize(node)
+            else:
+                left, right = self._nodes[node][1]
+                stack.extend((right, left))
+                if length == 1:
+                    continue
+                tail = max(0, self._lengths[left] - length + 1)
+                blocks = np.concatenate(
+                    [*self.word(left, tail), *self.word(right, 0, length - 1)]
+                )
+            if len(blocks) >= length:
+                yield np.lib.stride_tricks.sliding_window_view(blocks, length)
+
+    def counts(self, node: int) -> List[int]:
+        """Count the derivations of each length of a node, up to MAX_COUNT.
+
+        A sequence derived in several ways is counted once per derivation,
+        so the counts bound the number of distinct sequences from above.
+        Counts saturate at MAX_COUNT, which keeps them machine-sized for
+        ambiguous rules; a count is zero exactly when no sequence of that
+        length is derivable.
+
+        Args:
+            node: The node id.
+
+        Returns:
+            The number of derivations of each length up to max_length,
+            capped at MAX_COUNT.
+        """
+        table = self._counts
+        # Children come before parents, so one pass in id order suffices
+        for current in range(len(table), node + 1):
+            kind, children = self._nodes[current]
+            counts = [0] * (self.max_length + 1)
+            if kind == _LEAF:
+                counts[1] = 1
+            elif kind == _EMPTY:
+                counts[0] = 1
+            elif kind == _UNION:
+                for child in children:
+                    counts = [
+                        min(a + b, MAX_COUNT) for a, b in zip(counts, table[child])
+                    ]
+            else:
+                left, right = table[children[0]], table[children[1]]
+                for split, ways in enumerate(left):
+                    if ways:
+                        for length in range(split, self.max_length + 1):
+                            counts[length] = min(
+                                counts[length] + ways * right[length - split],
+                                MAX_COUNT,
+                            )
+            table.append(counts)
+        return table[node]
+
+    def members(self, node: int, length: int) -> Iterator[np.ndarray]:
+        """Enumerate the sequences of one length of a node.
+
+        Languages of up to chunk_size rows are deduplicated and cached
+        while the cache has room, so shared sub-expansions are enumerated
+        once. Larger languages are streamed and may repeat a sequence that
+        has several derivations.
+
+        Args:
+            node: The node id.
+            length: The sequence length, at most max_length.
+
+        Yields:
+            Integer arrays of block indices, shape (rows, length).
+
+        Raises:
+            InvalidDesignError: If the length is out of range.
+        """
+        if not 0 <= length <= self.max_length:
+            raise InvalidDesignError(f"length must be between 0 and {self.max_length}")
+        if not self.counts(node)[length]:
+            return
+        key = (node, length)
+        if key in self._languages:
+            cached = self._languages[key]
+            if cached is not None:
+                yield cached
+                return
+            yield from self._expand(node, length)
+            return
+        # Collect the language until it outgrows a chunk or the cache
+        limit = min(self.chunk_size, (self.cache_size - self._cached) // max(length, 1))
+        chunks: List[np.ndarray] = []
+        rows = 0
+        expansion = self._expand(node, length)
+        for chunk in expansion:
+            chunks.append(chunk)
+            rows += len(chunk)
+            if rows > limit:
+                self._languages[key] = None
+                yield from chunks
+                yield from expansion
+                return
+        language = np.unique(np.concatenate(chunks), axis=0)
+        self._languages[key] = language
+        self._cached += language.size
+        yield language
+
+    def _expand(self, node: int, length: int) -> Iterator[np.ndarray]:
+        """Enumerate the sequences of one length of a node from its children."""
+        kind, children = self._nodes[node]
+        if kind == _LEAF:
+            yield np.asarray([children], dtype=np.int64)
+        elif kind == _EMPTY:
+            yield np.empty((1, 0), dtype=np.int64)
+        elif kind == _UNION:
+            for child in children:
+                yield from self.members(child, length)
+        else:
+            left, right = children
+            left_counts, right_counts = self.counts(left), self.counts(right)
+            for split in range(length + 1):
+                if not left_counts[split] or not right_counts[length - split]:
+                    continue
+                for prefixes in self.members(left, split):
+                    for suffixes in self.members(right, length - split):
+                        step = max(1, self.chunk_size // len(suffixes))
+                        for start in range(0, len(prefixes), step):
+                            block = prefixes[start : start + step]
+                            yield np.concatenate(
+                                [
+                                    np.repeat(block, len(suffixes), axis=0),
+                                    np.tile(suffixes, (len(block), 1)),
+                                ],
+                                axis=1,
+                            )
+
+
+def parse_rules(text: str) -> Rules:
+    """Parse substitution rules.
+
+    Args:
+        text: Rules written ``lhs -> rhs | rhs``, one per line or separated
+            by semicolons. Rules for the same symbol add alternatives.
+
+    Returns:
+        The alternatives of each symbol, as tuples of symbols.
+
+    Raises:
+        InvalidDesignError: If a rule is malformed or there are none.
+    """
+    rules: Rules = {}
+    for line in filter(str.strip, re.split(r"[;\n]", text)):
+        lhs, arrow, rhs = line.partition("->")
+        if not arrow or len(lhs.split()) != 1:
+            raise InvalidDesignError(f"Invalid rule: {line.strip()}")
+        alternatives = rules.setdefault(lhs.strip(), [])
+        alternatives.extend(tuple(part.split()) for part in rhs.split("|"))
+    if not rules:
+        raise InvalidDesignError("No substitution rules given")
+    return rules
+
+
+def _check_depth(depth: int) -> None:
+    """Check that an expansion depth is in range."""
+    if not 0 <= depth <= MAX_DEPTH:
+        raise InvalidDesignError(f"Depth must be between 0 and {MAX_DEPTH}")
+
+
+def expand_self_similar(
+    graph: ExpansionGraph,
+    rules: Rules,
+    axiom: Sequence[str],
+    generations: int,
+    lookup: Dict[str, int],
+) -> int:
+    """Build the word of a self-similar rule set.
+
+    Every generation rewrites each block of the word by its rule; blocks
+    without a rule stay as they are. The expansion of each block at each
+    generation is built once, from the previous generation's expansions.
+
+    Args:
+        graph: The graph to build in.
+        rules: One alternative for each rewritten block code.
+        axiom: The block codes of the starting word.
+        generations: The number of rewriting generations.
+        lookup: The block index of each code.
+
+    Returns:
+        The node of the word after the last generation.
+
+    Raises:
+        InvalidDesignError: If a symbol is not a block code, a block has
+            several rules, or the depth is out of range.
+    """
+    _check_depth(generations)
+    symbols = set(axiom) | set(rules)
+    for symbol, alternatives in rules.items():
+        if len(alternatives) != 1:
+            raise InvalidDesignError(f"Self-similar rules need one motif: {symbol}")
+        symbols.update(alternatives[0])
+    unknown = sorted(symbols - set(lookup))
+    if unknown:
+        raise InvalidDesignError(f"Unknown block code: {unknown[0]}")
+    if not axiom:
+        raise InvalidDesignError("The axiom must not be empty")
+
+    expansions = {symbol: graph.leaf(lookup[symbol]) for symbol in symbols}
+    for _ in range(generations):
+        expansions = {
+            symbol: (
+                graph.concat([expansions[part] for part in rules[symbol][0]])
+                if symbol in rules
+                else node
+            )
+            for symbol, node in expansions.items()
+        }
+    return graph.concat([expansions[symbol] for symbol in axiom])
+
+
+def expand_recursive(
+    graph: ExpansionGraph,
+    rules: Rules,
+    start: str,
+    depth: int,
+    lookup: Dict[str, int],
+) -> Optional[int]:
+    """Build the sequences of a recursive rule set.
+
+    The expansion of each nonterminal at each depth is the choice between
+    its alternatives, built from the previous depth's expansions, so a
+    nonterminal reached from many places is expanded once per depth.
+    Expansion stops early once no expansion changes.
+
+    Args:
+        graph: The graph to build in.
+        rules: The alternatives of each nonterminal; symbols that are block
+            codes are terminals.
+        start: The start nonterminal.
+        depth: The maximum derivation depth.
+        lookup: The block index of each code.
+
+    Returns:
+        The node of all sequences derivable from the start within the
+        depth, or None if there are none.
+
+    Raises:
+        InvalidDesignError: If a rule rewrites a block code, a symbol is
+            undefined, or the depth is out of range.
+    """
+    _check_depth(depth)
+    for symbol, alternatives in rules.items():
+        if symbol in lookup:
+            raise InvalidDesignError(f"Block codes cannot be rewritten: {symbol}")
+        for part in (part for alternative in alternatives for part in alternative):
+            if part not in lookup and part not in rules:
+                raise InvalidDesignError(f"Unknown symbol: {part}")
+    if start not in rules:
+        raise InvalidDesignError(f"Unknown start symbol: {start}")
+
+    expansions: Dict[str, Optional[int]] = {symbol: None for symbol in rules}
+    for _ in range(depth):
+        previous = expansions
+        expansions = {
+            symbol: graph.union(
+                [
+                    graph.concat(
+                        [
+                            (
+                                graph.leaf(lookup[part])
+                                if part in lookup
+                                else previous[part]
+                            )
+                            for part in alternative
+                        ]
+                    )
+                    for alternative in alternatives
+                ]
+            )
+            for symbol, alternatives in rules.items()
+        }
+        if expansions == previous:
+            break
+    return expansions[start]
+
+
+def _distinct(chunks: Iterable[np.ndarray], size: int) -> Iterator[np.ndarray]:
+    """Drop repeated rows from chunks, stopping after size distinct rows.
+
+    Rows are tracked by a Bloom filter sized for ``size`` rows, so about
+    one in a million new rows is also dropped.
+    """
+    seen = BloomFilter(size, DEDUPLICATION_ERROR_RATE)
+    for chunk in chunks:
+        remaining = size - seen.count
+        rows = chunk[seen.add(hash_rows(chunk))]
+        if len(rows):
+            yield rows[:remaining]
+        if len(rows) >= remaining:
+            return
+
+
+def self_similar_library(
+    graph: ExpansionGraph, word: int, length: int, size: int
+) -> Iterator[np.ndarray]:
+    """Stream the distinct windows of a self-similar word.
+
+    Windows are collected from each distinct node of the word once, so
+    words far too long to expand are covered in full.
+
+    Args:
+        graph: The graph holding the word.
+        word: The word node.
+        length: The window length.
+        size: The maximum number of members.
+
+    Returns:
+        An iterator of integer arrays of block indices, shape (rows, length).
+
+    Raises:
+        InvalidDesignError: If the length or size is not positive.
+    """
+    if length < 1 or size < 1:
+        raise InvalidDesignError("length and size must be positive")
+    return _distinct(graph.windows(word, length), size)
+
+
+def recursive_library(
+    graph: ExpansionGraph,
+    language: Optional[int],
+    min_length: int,
+    max_length: int,
+    size: int,
+) -> Iterator[np.ndarray]:
+    """Stream the distinct sequences of a recursive rule set.
+
+    Sequences come out shortest first, and sequences with several
+    derivations only once.
+
+    Args:
+        graph: The graph holding the language.
+        language: The node of the sequences, or None if there are none.
+        min_length: The shortest sequence length.
+        max_length: The longest sequence length, at most graph.max_length.
+        size: The maximum number of members.
+
+    Returns:
+        An iterator of integer arrays of block indices, shape (rows, length).
+
+    Raises:
+        InvalidDesignError: If the lengths or size are out of range.
+    """
+    if not 1 <= min_length <= max_length <= graph.max_length or size < 1:
+        raise InvalidDesignError(
+            f"Lengths must satisfy 1 <= min <= max <= {graph.max_length}"
+        )
+    if language is None:
+        return iter(())
+    chunks = (
+        chunk
+        for length in range(min_length, max_length + 1)
+        for chunk in graph.members(language, length)
+    )
+    return _distinct(chunks, size)
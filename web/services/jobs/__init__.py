@@ -0,0 +1,5 @@
+# web/services/jobs/__init__.py
+"""
+This package contains the background job system that runs long design,
+optimization and modeling requests outside the request threads.
+"""
@@ -0,0 +1,362 @@
+# web/services/jobs/scheduler.py
+"""
+This module contains the background job scheduler.
+
+A job is a request to a design, optimization or modeling route, run in a
+worker process instead of a request thread. The scheduler thread claims
+queued jobs from the job table, highest priority first, and starts a worker
+process for each while fewer than max_workers are running. Each worker is
+forked from the server, so it runs the route in the same application, and
+saves the response body as the job's result. Routes that would otherwise
+hand their work to a background thread check running_in_job and run it to
+completion instead, as the worker exits once the response is written.
+
+A worker process per job, rather than a shared pool, lets a running job be
+cancelled by stopping its process, and keeps a crash from taking down
+other jobs. The scheduler renews the leases of the jobs it runs every
+HEARTBEAT_INTERVAL seconds, and queues again any job whose lease is older
+than LEASE_TIMEOUT, as its server has exited or hung. The scheduler starts
+with the application, so queued and orphaned jobs resume after a restart
+without waiting for a request.
+
+Classes:
+    JobScheduler: Runs queued jobs in worker processes.
+
+Functions:
+    running_in_job: Check whether the current request runs as a job.
+    get_job_scheduler: Get the process-wide job scheduler.
+"""
+
+# Standard Library Imports
+from typing import Dict, Optional, Sequence, Tuple
+import atexit
+import json
+import multiprocessing
+import os
+import threading
+import time
+
+# External Imports
+from flask import Flask, has_request_context, request
+from werkzeug.exceptions import HTTPException
+from werkzeug.http import parse_options_header
+
+# Internal Imports
+from web.core.exceptions.job_exceptions import InvalidJobError
+from web.services.blocks.depiction_cache import DEFAULT_CACHE_DIR
+from web.services.compute_settings import ComputeSettings
+from web.services.jobs.store import CANCELLED, Job, JobStore
+
+DEFAULT_JOB_DIR: str = os.environ.get(
+    "PEPLAB_JOB_DIR", os.path.join(DEFAULT_CACHE_DIR, "jobs")
+)
+DEFAULT_POLL_INTERVAL: float = 0.5
+HEARTBEAT_INTERVAL: float = 5.0
+LEASE_TIMEOUT: float = 60.0
+JOB_BLUEPRINTS = ("design", "optimization", "modeling")
+MAX_ERROR_LENGTH: int = 1000
+# The WSGI environ key naming the job a request runs as
+JOB_ENVIRON_KEY = "peplab.job_id"
+
+
+def result_path(job_dir: str, job_id: str) -> str:
+    """Get the path of a job's result file.
+
+    Args:
+        job_dir: The directory of the job table and results.
+        job_id: The job identifier.
+
+    Returns:
+        The path of the result file.
+    """
+    return os.path.join(job_dir, f"{job_id}.result")
+
+
+def running_in_job() -> bool:
+    """Check whether the current request runs as a job.
+
+    Returns:
+        True inside a job's worker process, where the request may take as
+        long as it needs but must finish its work before responding.
+    """
+    return has_request_context() and JOB_ENVIRON_KEY in request.environ
+
+
+def _error_message(body: bytes, status_code: int) -> str:
+    """Get the error message of a failed response."""
+    try:
+        message = json.loads(body)["error"]
+    except (ValueError, KeyError, TypeError):
+        message = body.decode("utf-8", "replace").strip()
+    return f"{status_code}: {message}"[:MAX_ERROR_LENGTH]
+
+
+def _write_outcome(output: str, outcome: Dict[str, Optional[str]]) -> None:
+    """Write a job's outcome next to its result, atomically."""
+    tmp_path = f"{output}.outcome.tmp"
+    with open(tmp_path, "w") as handle:
+        json.dump(outcome, handle)
+    os.replace(tmp_path, f"{output}.outcome")
+
+
+def _run_job(app: Flask, job: Job, output: str) -> None:
+    """Run a job's request in a worker process and save its response.
+
+    The worker leaves the job table to the scheduler, as SQLite connections
+    must not cross a fork, and writes the outcome to a file beside the
+    result instead.
+
+    Args:
+        app: The application to run the request in.
+        job: The running job.
+        output: The path of the result file.
+    """
+    tmp_path = f"{output}.tmp"
+    try:
+        response = app.test_client().open(
+            job.path,
+            method=job.method,
+            query_string=list(job.args),
+            buffered=False,
+            environ_overrides={JOB_ENVIRON_KEY: job.id},
+        )
+        try:
+            with open(tmp_path, "wb") as handle:
+                for chunk in response.iter_encoded():
+                    handle.write(chunk)
+        finally:
+            response.close()
+        if response.status_code >= 400:
+            with open(tmp_path, "rb") as handle:
+                error = _error_message(handle.read(), response.status_code)
+            os.unlink(tmp_path)
+            _write_outcome(output, {"error": error})
+            return
+        os.replace(tmp_path, output)
+        _, options = parse_options_header(response.headers.get("Content-Disposition"))
+        _write_outcome(
+            output,
+            {"mimetype": response.mimetype, "filename": options.get("filename")},
+        )
+    except Exception as error:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        _write_outcome(output, {"error": repr(error)[:MAX_ERROR_LENGTH]})
+
+
+class JobScheduler:
+    """Runs queued jobs in worker processes.
+
+    Attributes:
+        app: The application the jobs' routes belong to.
+        store: The job table.
+        job_dir: The directory of the job table and results.
+        poll_interval: The seconds between checks of the job table.
+
+    Methods:
+        start: Start the scheduler thread.
+        submit: Queue a request to run as a job.
+        cancel: Cancel a job, stopping its worker if it runs here.
+        shutdown: Stop the scheduler thread and its workers.
+    """
+
+    def __init__(
+        self,
+        app: Flask,
+        job_dir: str = DEFAULT_JOB_DIR,
+        max_workers: Optional[int] = None,
+        poll_interval: float = DEFAULT_POLL_INTERVAL,
+    ) -> None:
+        """Initialize a scheduler.
+
+        Args:
+            app: The application the jobs' routes belong to.
+            job_dir: The directory of the job table and results.
+            max_workers: The most jobs run at once. Defaults to the
+                max_threads compute setting, read as jobs start.
+            poll_interval: The seconds between checks of the job table.
+        """
+        self.app: Flask = app
+        self.job_dir: str = job_dir
+        self.store: JobStore = JobStore(os.path.join(job_dir, "jobs.sqlite3"))
+        self.poll_interval: float = poll_interval
+        self._max_workers: Optional[int] = max_workers
+        self._context = multiprocessing.get_context("fork")
+        self._workers: Dict[str, multiprocessing.process.BaseProcess] = {}
+        self._wake: threading.Event = threading.Event()
+        self._stop: threading.Event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._lock: threading.Lock = threading.Lock()
+        self._heartbeat: float = 0.0
+
+    @property
+    def max_workers(self) -> int:
+        """Get the most jobs run at once.
+
+        Returns:
+            int: The most jobs run at once
+        """
+        return self._max_workers or ComputeSettings().max_threads
+
+    def start(self) -> None:
+        """Start the scheduler thread."""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(
+                target=self._loop, name="job-scheduler", daemon=True
+            )
+            self._thread.start()
+        # Workers are not daemons, so stop them before the interpreter
+        # waits for its child processes at exit
+        atexit.register(self.shutdown)
+
+    def submit(
+        self,
+        path: str,
+        method: str = "GET",
+        args: Sequence[Tuple[str, str]] = (),
+        priority: int = 0,
+    ) -> Job:
+        """Queue a request to run as a job.
+
+        Args:
+            path: The URL path of the route to run.
+            method: The HTTP method of the request.
+            args: The request arguments, as (name, value) pairs.
+            priority: The priority; higher priorities run first.
+
+        Returns:
+            The queued job.
+
+        Raises:
+            InvalidJobError: If the path is not a design, optimization or
+                modeling route accepting the method.
+        """
+        adapter = self.app.url_map.bind("localhost")
+        try:
+            endpoint, _ = adapter.match(path, method=method.upper())
+        except HTTPException:
+            raise InvalidJobError(f"No route for {method.upper()} {path}")
+        if endpoint.partition(".")[0] not in JOB_BLUEPRINTS:
+            raise InvalidJobError(f"Route cannot run as a job: {path}")
+        job = self.store.submit(path, method, args, priority)
+        self._wake.set()
+        return job
+
+    def cancel(self, job_id: str) -> Job:
+        """Cancel a job, stopping its worker if it runs here.
+
+        Args:
+            job_id: The job identifier.
+
+        Returns:
+            The cancelled job.
+
+        Raises:
+            UnknownJobError: If there is no such job.
+            InvalidJobError: If the job has already finished.
+        """
+        job = self.store.cancel(job_id)
+        self._wake.set()
+        return job
+
+    def _reap(self) -> None:
+        """Stop cancelled workers and record the outcome of finished ones."""
+        statuses = self.store.statuses(list(self._workers))
+        for job_id, worker in list(self._workers.items()):
+            if statuses.get(job_id) == CANCELLED and worker.is_alive():
+                worker.terminate()
+            if worker.is_alive():
+                continue
+            worker.join()
+            del self._workers[job_id]
+            self._record(job_id, worker.exitcode, statuses.get(job_id) == CANCELLED)
+
+    def _record(self, job_id: str, exitcode: Optional[int], cancelled: bool) -> None:
+        """Record the outcome a finished worker left for its job."""
+        output = result_path(self.job_dir, job_id)
+        outcome: Dict[str, Optional[str]] = {
+            "error": f"Worker exited with code {exitcode}"
+        }
+        if os.path.exists(f"{output}.outcome"):
+            with open(f"{output}.outcome") as handle:
+                outcome = json.load(handle)
+            os.unlink(f"{output}.outcome")
+        if cancelled:
+            if os.path.exists(output):
+                os.unlink(output)
+        elif outcome.get("error") is not None:
+            self.store.fail(job_id, outcome["error"])
+        else:
+            self.store.complete(job_id, outcome["mimetype"], outcome["filename"])
+
+    def _launch(self) -> None:
+        """Start workers for queued jobs while there is room."""
+        while len(self._workers) < self.max_workers and not self._stop.is_set():
+            job = self.store.claim(os.getpid())
+            if job is None:
+                return
+            worker = self._context.Process(
+                target=_run_job,
+                args=(self.app, job, result_path(self.job_dir, job.id)),
+                name=f"job-{job.id}",
+                # Daemon processes cannot start the process pools of routes
+                daemon=False,
+            )
+            try:
+                worker.start()
+            except OSError as error:
+                self.store.fail(job.id, f"Worker failed to start: {error}")
+                continue
+            self._workers[job.id] = worker
+
+    def _loop(self) -> None:
+        """Run jobs until the scheduler is shut down."""
+        while not self._stop.is_set():
+            if time.monotonic() - self._heartbeat >= HEARTBEAT_INTERVAL:
+                self.store.renew(list(self._workers))
+                self.store.recover(LEASE_TIMEOUT)
+                self._heartbeat = time.monotonic()
+            self._reap()
+            self._launch()
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+
+    def shutdown(self) -> None:
+        """Stop the scheduler thread and its workers.
+
+        Stopped jobs are queued again, to run from the start next time.
+        """
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+        for worker in self._workers.values():
+            worker.terminate()
+            worker.join()
+        self.store.release(list(self._workers))
+        self._workers.clear()
+
+
+_scheduler: Optional[JobScheduler] = None
+_scheduler_lock: threading.Lock = threading.Lock()
+
+
+def get_job_scheduler(app: Flask) -> JobScheduler:
+    """Get the process-wide job scheduler, starting it on first use.
+
+    The application starts it when registering its blueprints.
+
+    Args:
+        app: The application the jobs' routes belong to.
+
+    Returns:
+        The job scheduler.
+    """
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = JobScheduler(app)
+            _scheduler.start()
+        return _scheduler
@@ -0,0 +1,452 @@
+# web/services/jobs/store.py
+"""
+This module contains the persistent job table.
+
+Jobs are rows of a SQLite database, so they outlive the request that
+submitted them and the server process that ran them. Every call opens its
+own connection, which makes a store safe to share between threads. Queued jobs are claimed in a
+write transaction, so several servers can run jobs from the same table
+without running any job twice. A running job holds a lease that its
+server renews while it runs; a job whose lease runs out belongs to a server
+that has exited or hung, and is queued again.
+
+Jobs run in priority order, highest first, and in submission order within a
+priority.
+
+Classes:
+    Job: A background job.
+    JobStore: The persistent job table.
+"""
+
+# Standard Library Imports
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+import contextlib
+import json
+import os
+import secrets
+import sqlite3
+import time
+
+# Internal Imports
+from web.core.exceptions.job_exceptions import InvalidJobError, UnknownJobError
+
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETE = "complete"
+FAILED = "failed"
+CANCELLED = "cancelled"
+JOB_STATUSES = (QUEUED, RUNNING, COMPLETE, FAILED, CANCELLED)
+FINISHED_STATUSES = (COMPLETE, FAILED, CANCELLED)
+
+_COLUMNS = (
+    "id",
+    "path",
+    "method",
+    "args",
+    "priority",
+    "status",
+    "created",
+    "started",
+    "finished",
+    "owner",
+    "heartbeat",
+    "error",
+    "mimetype",
+    "filename",
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    path TEXT NOT NULL,
+    method TEXT NOT NULL,
+    args TEXT NOT NULL,
+    priority INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    created REAL NOT NULL,
+    started REAL,
+    finished REAL,
+    owner INTEGER,
+    heartbeat REAL,
+    error TEXT,
+    mimetype TEXT,
+    filename TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_queue ON jobs (status, priority DESC, created);
+"""
+
+
+@dataclass(frozen=True)
+class Job:
+    """A background job.
+
+    Attributes:
+        id: The job identifier.
+        path: The URL path of the route the job runs.
+        method: The HTTP method of the request.
+        args: The request arguments, as (name, value) pairs.
+        priority: The priority; higher priorities run first.
+        status: The job status, one of JOB_STATUSES.
+        created: The submission time, in seconds since the epoch.
+        started: The time the job last started, if it has.
+        finished: The time the job finished, if it has.
+        owner: The process id of the server running the job.
+        heartbeat: The time the job's lease was last renewed.
+        error: The error message of a failed job.
+        mimetype: The media type of a complete job's result.
+        filename: The download name of a complete job's result.
+
+    Methods:
+        to_dict: Describe the job as JSON-compatible data.
+    """
+
+    id: str
+    path: str
+    method: str
+    args: Tuple[Tuple[str, str], ...]
+    priority: int
+    status: str
+    created: float
+    started: Optional[float] = None
+    finished: Optional[float] = None
+    owner: Optional[int] = None
+    heartbeat: Optional[float] = None
+    error: Optional[str] = None
+    mimetype: Optional[str] = None
+    filename: Optional[str] = None
+
+    @classmethod
+    def from_row(cls, row: Sequence[Any]) -> "Job":
+        """Build a job from a row of the job table."""
+        values = dict(zip(_COLUMNS, row))
+        values["args"] = tuple(tuple(pair) for pair in json.loads(values["args"]))
+        return cls(**values)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Describe the job as JSON-compatible data.
+
+        Returns:
+            The job's fields, with the arguments as a list of pairs.
+        """
+        return {
+            "id": self.id,
+            "path": self.path,
+            "method": self.method,
+            "args": [list(pair) for pair in self.args],
+            "priority": self.priority,
+            "status": self.status,
+            "created": self.created,
+            "started": self.started,
+            "finished": self.finished,
+            "error": self.error,
+            "mimetype": self.mimetype,
+            "filename": self.filename,
+        }
+
+
+class JobStore:
+    """The persistent job table.
+
+    Attributes:
+        path: The path of the SQLite database.
+
+    Methods:
+        submit: Add a job to the queue.
+        get: Get a job by id.
+        list: List jobs, newest first.
+        statuses: Get the status of several jobs.
+        claim: Start the next queued job.
+        complete: Mark a running job complete.
+        fail: Mark a running job failed.
+        cancel: Cancel a queued or running job.
+        renew: Renew the leases of running jobs.
+        release: Queue running jobs again.
+        recover: Queue again the running jobs whose lease has run out.
+    """
+
+    def __init__(self, path: str) -> None:
+        """Initialize a store, creating the database if needed.
+
+        Args:
+            path: The path of the SQLite database.
+        """
+        self.path: str = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connect() as connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.executescript(_SCHEMA)
+            columns = [row[1] for row in connection.execute("PRAGMA table_info(jobs)")]
+            # Tables from before leases were added lack the heartbeat column
+            if "heartbeat" not in columns:
+                connection.execute("ALTER TABLE jobs ADD COLUMN heartbeat REAL")
+
+    @contextlib.contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        """Open a connection in autocommit mode."""
+        connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        try:
+            yield connection
+        finally:
+            connection.close()
+
+    def submit(
+        self,
+        path: str,
+        method: str = "GET",
+        args: Sequence[Tuple[str, str]] = (),
+        priority: int = 0,
+    ) -> Job:
+        """Add a job to the queue.
+
+        Args:
+            path: The URL path of the route to run.
+            method: The HTTP method of the request.
+            args: The request arguments, as (name, value) pairs.
+            priority: The priority; higher priorities run first.
+
+        Returns:
+            The queued job.
+        """
+        job = Job(
+            id=secrets.token_hex(8),
+            path=path,
+            method=method.upper(),
+            args=tuple((str(name), str(value)) for name, value in args),
+            priority=int(priority),
+            status=QUEUED,
+            created=time.time(),
+        )
+        with self._connect() as connection:
+            connection.execute(
+                "INSERT INTO jobs (id, path, method, args, priority, status, created)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    job.id,
+                    job.path,
+                    job.method,
+                    json.dumps(job.args),
+                    job.priority,
+                    job.status,
+                    job.created,
+                ),
+            )
+        return job
+
+    def get(self, job_id: str) -> Job:
+        """Get a job by id.
+
+        Args:
+            job_id: The job identifier.
+
+        Returns:
+            The job.
+
+        Raises:
+            UnknownJobError: If there is no such job.
+        """
+        with self._connect() as connection:
+            row = connection.execute(
+                f"SELECT {', '.join(_COLUMNS)} FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        if row is None:
+            raise UnknownJobError(f"Unknown job: {job_id}")
+        return Job.from_row(row)
+
+    def list(self, status: Optional[str] = None, limit: int = 100) -> List[Job]:
+        """List jobs, newest first.
+
+        Args:
+            status: Only list jobs with this status.
+            limit: The most jobs to list.
+
+        Returns:
+            The jobs.
+
+        Raises:
+            InvalidJobError: If the status is unknown.
+        """
+        query = f"SELECT {', '.join(_COLUMNS)} FROM jobs"
+        parameters: Tuple[Any, ...] = ()
+        if status is not None:
+            if status not in JOB_STATUSES:
+                raise InvalidJobError(f"Unknown job status: {status}")
+            query += " WHERE status = ?"
+            parameters = (status,)
+        query += " ORDER BY created DESC LIMIT ?"
+        with self._connect() as connection:
+            rows = connection.execute(query, (*parameters, limit)).fetchall()
+        return [Job.from_row(row) for row in rows]
+
+    def statuses(self, job_ids: Sequence[str]) -> Dict[str, str]:
+        """Get the status of several jobs.
+
+        Args:
+            job_ids: The job identifiers.
+
+        Returns:
+            The status of each job that exists, by id.
+        """
+        if not job_ids:
+            return {}
+        with self._connect() as connection:
+            rows = connection.execute(
+                "SELECT id, status FROM jobs WHERE id IN"
+                f" ({', '.join('?' * len(job_ids))})",
+                tuple(job_ids),
+            ).fetchall()
+        return dict(rows)
+
+    def claim(self, owner: int) -> Optional[Job]:
+        """Start the next queued job.
+
+        Args:
+            owner: The process id of the server that will run the job.
+
+        Returns:
+            The started job, or None if the queue is empty.
+        """
+        with self._connect() as connection:
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                row = connection.execute(
+                    f"SELECT {', '.join(_COLUMNS)} FROM jobs WHERE status = ?"
+                    " ORDER BY priority DESC, created, rowid LIMIT 1",
+                    (QUEUED,),
+                ).fetchone()
+                if row is None:
+                    connection.execute("COMMIT")
+                    return None
+                started = time.time()
+                connection.execute(
+                    "UPDATE jobs SET status = ?, started = ?, owner = ?, heartbeat = ?"
+                    " WHERE id = ?",
+                    (RUNNING, started, owner, started, row[0]),
+                )
+                connection.execute("COMMIT")
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+        job = Job.from_row(row)
+        return Job(
+            **{
+                **job.__dict__,
+                "status": RUNNING,
+                "started": started,
+                "owner": owner,
+                "heartbeat": started,
+            }
+        )
+
+    def _finish(self, job_id: str, status: str, **fields: Any) -> bool:
+        """Move a running job to a finished status."""
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self._connect() as connection:
+            cursor = connection.execute(
+                f"UPDATE jobs SET status = ?, finished = ?, {assignments}"
+                " WHERE id = ? AND status = ?",
+                (status, time.time(), *fields.values(), job_id, RUNNING),
+            )
+        return cursor.rowcount == 1
+
+    def complete(
+        self, job_id: str, mimetype: Optional[str], filename: Optional[str]
+    ) -> bool:
+        """Mark a running job complete.
+
+        Args:
+            job_id: The job identifier.
+            mimetype: The media type of the result.
+            filename: The download name of the result.
+
+        Returns:
+            True if the job was running; a cancelled job stays cancelled.
+        """
+        return self._finish(job_id, COMPLETE, mimetype=mimetype, filename=filename)
+
+    def fail(self, job_id: str, error: str) -> bool:
+        """Mark a running job failed.
+
+        Args:
+            job_id: The job identifier.
+            error: The error message.
+
+        Returns:
+            True if the job was running; a cancelled job stays cancelled.
+        """
+        return self._finish(job_id, FAILED, error=error)
+
+    def cancel(self, job_id: str) -> Job:
+        """Cancel a queued or running job.
+
+        A running job is only marked cancelled here; the server running it
+        stops its worker process.
+
+        Args:
+            job_id: The job identifier.
+
+        Returns:
+            The cancelled job.
+
+        Raises:
+            UnknownJobError: If there is no such job.
+            InvalidJobError: If the job has already finished.
+        """
+        with self._connect() as connection:
+            cursor = connection.execute(
+                "UPDATE jobs SET status = ?, finished = ?"
+                " WHERE id = ? AND status IN (?, ?)",
+                (CANCELLED, time.time(), job_id, QUEUED, RUNNING),
+            )
+        job = self.get(job_id)
+        if cursor.rowcount == 0:
+            raise InvalidJobError(f"Job {job_id} has already finished")
+        return job
+
+    def renew(self, job_ids: Sequence[str]) -> None:
+        """Renew the leases of running jobs.
+
+        Args:
+            job_ids: The identifiers of the jobs.
+        """
+        if not job_ids:
+            return
+        with self._connect() as connection:
+            connection.execute(
+                "UPDATE jobs SET heartbeat = ? WHERE status = ? AND id IN"
+                f" ({', '.join('?' * len(job_ids))})",
+                (time.time(), RUNNING, *job_ids),
+            )
+
+    def release(self, job_ids: Sequence[str]) -> None:
+        """Queue running jobs again.
+
+        Args:
+            job_ids: The identifiers of the jobs.
+        """
+        if not job_ids:
+            return
+        with self._connect() as connection:
+            connection.execute(
+                "UPDATE jobs SET status = ?, started = NULL, owner = NULL,"
+                " heartbeat = NULL WHERE status = ? AND id IN"
+                f" ({', '.join('?' * len(job_ids))})",
+                (QUEUED, RUNNING, *job_ids),
+            )
+
+    def recover(self, lease: float) -> int:
+        """Queue again the running jobs whose lease has run out.
+
+        Args:
+            lease: The seconds a lease lasts without renewal.
+
+        Returns:
+            The number of jobs queued again.
+        """
+        with self._connect() as connection:
+            cursor = connection.execute(
+                "UPDATE jobs SET status = ?, started = NULL, owner = NULL,"
+                " heartbeat = NULL WHERE status = ? AND heartbeat < ?",
+                (QUEUED, RUNNING, time.time() - lease),
+            )
+        return cursor.rowcount
@@ -0,0 +1,4 @@
+# web/services/library/__init__.py
+"""
+This package contains the services for peptide libraries.
+"""
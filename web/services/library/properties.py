@@ -0,0 +1,350 @@
+# web/services/library/properties.py
+"""
+This module contains the incremental peptide property engine.
+
+A library is an integer array of block indices, one row per peptide, padded
+with -1 for peptides shorter than the longest one. Additive properties
+(average and monoisotopic mass, elemental formula, residue counts and the
+additive block descriptors) are computed for the whole library at once with
+NumPy gathers and sums over per-block contributions, minus one water per
+amide bond (one extra bond for head-to-tail cyclization). Only properties
+that are not additive fall back to building an RDKit molecule per peptide.
+
+Classes:
+    PeptidePropertyEngine: The peptide property engine for one block set.
+
+Functions:
+    build_property_engine: Build the property engine for blocks of a block set.
+    format_properties: Format chunks of library members and their properties.
+"""
+
+# Standard Library Imports
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+import csv
+import io
+
+# External Imports
+import numpy as np
+from rdkit import Chem
+from rdkit.Chem import Descriptors
+
+# Internal Imports
+from web.core.exceptions.blocks_exceptions import InvalidSmilesError
+from web.services.blocks.coupling import assemble_peptide
+from web.services.blocks.descriptors import (
+    AMIDE_BOND_CORRECTIONS,
+    DescriptorTable,
+    get_descriptor_table,
+)
+from web.services.blocks.set_loader import load_block_set
+
+PADDING: int = -1
+
+# Elements tracked in formulas, in Hill order after C and H
+ELEMENTS: Tuple[str, ...] = ("C", "H", "Br", "Cl", "F", "I", "N", "O", "P", "S", "Se")
+WATER: Dict[str, int] = {"H": 2, "O": 1}
+
+
+class PeptidePropertyEngine:
+    """The peptide property engine for one block set.
+
+    Attributes:
+        smiles: The canonical SMILES of each block.
+        average_masses: The average mass of each block.
+        monoisotopic_masses: The monoisotopic mass of each block.
+        element_counts: The count of each element in ELEMENTS per block.
+        descriptors: The block descriptor table, if given.
+
+    Methods:
+        lengths: Get the length of every peptide.
+        average_mass: Get the average mass of every peptide.
+        monoisotopic_mass: Get the monoisotopic mass of every peptide.
+        element_totals: Get the element counts of every peptide.
+        formulas: Get the Hill formula of every peptide.
+        residue_counts: Get the count of every block in every peptide.
+        descriptor_totals: Get the additive block descriptors of every peptide.
+        rdkit_property: Compute a non-additive property with RDKit.
+    """
+
+    def __init__(
+        self, smiles: Sequence[str], descriptors: Optional[DescriptorTable] = None
+    ) -> None:
+        """Initialize the peptide property engine.
+
+        Args:
+            smiles: The canonical SMILES of each block.
+            descriptors: The block descriptor table.
+
+        Raises:
+            InvalidSmilesError: If a block's SMILES cannot be parsed.
+        """
+        self.smiles: List[str] = list(smiles)
+        self.descriptors: Optional[DescriptorTable] = descriptors
+        self._mols: List[Chem.Mol] = []
+
+        # Row n_blocks is all zero so that padding gathers contribute nothing
+        n_blocks = len(self.smiles)
+        self.average_masses: np.ndarray = np.zeros(n_blocks + 1)
+        self.monoisotopic_masses: np.ndarray = np.zeros(n_blocks + 1)
+        self.element_counts: np.ndarray = np.zeros(
+            (n_blocks + 1, len(ELEMENTS)), dtype=np.int64
+        )
+        for i, item in enumerate(self.smiles):
+            mol = Chem.MolFromSmiles(item) if item else None
+            if mol is None:
+                raise InvalidSmilesError(f"Invalid SMILES: {item}")
+            self._mols.append(mol)
+            self.average_masses[i] = Descriptors.MolWt(mol)
+            self.monoisotopic_masses[i] = Descriptors.ExactMolWt(mol)
+            for atom in mol.GetAtoms():
+                if atom.GetSymbol() not in ELEMENTS:
+                    raise InvalidSmilesError(
+                        f"Unsupported element {atom.GetSymbol()} in: {item}"
+                    )
+                self.element_counts[i, ELEMENTS.index(atom.GetSymbol())] += 1
+                self.element_counts[i, ELEMENTS.index("H")] += atom.GetTotalNumHs()
+
+        self._water_average: float = -AMIDE_BOND_CORRECTIONS["mol_wt"]
+        self._water_monoisotopic: float = -AMIDE_BOND_CORRECTIONS["monoisotopic_mass"]
+        self._water_elements: np.ndarray = np.array(
+            [WATER.get(element, 0) for element in ELEMENTS]
+        )
+
+    def _gather_index(self, library: np.ndarray) -> np.ndarray:
+        library = np.asarray(library)
+        return np.where(library == PADDING, len(self.smiles), library)
+
+    def lengths(self, library: np.ndarray) -> np.ndarray:
+        """Get the length of every peptide.
+
+        Args:
+            library: The block indices, shape (n_peptides, max_length).
+
+        Returns:
+            The peptide lengths.
+        """
+        return (np.asarray(library) != PADDING).sum(axis=-1)
+
+    def bonds(self, library: np.ndarray, cyclic: bool = False) -> np.ndarray:
+        """Get the number of amide bonds of every peptide.
+
+        Args:
+            library: The block indices, shape (n_peptides, max_length).
+            cyclic: Whether the peptides are head-to-tail cyclized.
+
+        Returns:
+            The number of amide bonds.
+        """
+        lengths = self.lengths(library)
+        if cyclic:
+            return np.where(lengths > 1, lengths, 0)
+        return np.maximum(lengths - 1, 0)
+
+    def average_mass(self, library: np.ndarray, cyclic: bool = False) -> np.ndarray:
+        """Get the average mass of every peptide.
+
+        Args:
+            library: The block indices, shape (n_peptides, max_length).
+            cyclic: Whether the peptides are head-to-tail cyclized.
+
+        Returns:
+            The average masses in Da.
+        """
+        total = self.average_masses[self._gather_index(library)].sum(axis=-1)
+        return total - self.bonds(library, cyclic) * self._water_average
+
+    def monoisotopic_mass(
+        self, library: np.ndarray, cyclic: bool = False
+    ) -> np.ndarray:
+        """Get the monoisotopic mass of every peptide.
+
+        Args:
+            library: The block indices, shape (n_peptides, max_length).
+            cyclic: Whether the peptides are head-to-tail cyclized.
+
+        Returns:
+            The monoisotopic masses in Da.
+        """
+        total = self.monoisotopic_masses[self._gather_index(library)].sum(axis=-1)
+        return total - self.bonds(library, cyclic) * self._water_monoisotopic
+
+    def element_totals(self, library: np.ndarray, cyclic: bool = False) -> np.ndarray:
+        """Get the element counts of every peptide.
+
+        Args:
+            library: The block indices, shape (n_peptides, max_length).
+            cyclic: Whether the peptides are head-to-tail cyclized.
+
+        Returns:
+            The count of each element in ELEMENTS, shape (n_peptides, n_elements).
+        """
+        total = self.element_counts[self._gather_index(library)].sum(axis=-2)
+        return total - self.bonds(library, cyclic)[..., None] * self._water_elements
+
+    def formulas(self, library: np.ndarray, cyclic: bool = False) -> List[str]:
+        """Get the Hill formula of every peptide.
+
+        Args:
+            library: The block indices, shape (n_peptides, max_length).
+            cyclic: Whether the peptides are head-to-tail cyclized.
+
+        Returns:
+            The formulas.
+        """
+        totals = np.atleast_2d(self.element_totals(library, cyclic)).tolist()
+        return [
+            "".join(
+                element + (str(count) if count > 1 else "")
+                for element, count in zip(ELEMENTS, row)
+                if count
+            )
+            for row in totals
+        ]
+
+    def residue_counts(self, library: np.ndarray) -> np.ndarray:
+        """Get the count of every block in every peptide.
+
+        Args:
+            library: The block indices, shape (n_peptides, max_length).
+
+        Returns:
+            The counts, shape (n_peptides, n_blocks).
+        """
+        library = np.atleast_2d(library)
+        n_blocks = len(self.smiles)
+        rows = np.broadcast_to(np.arange(len(library))[:, None], library.shape)
+        valid = library != PADDING
+        flat = rows[valid] * n_blocks + library[valid]
+        counts = np.bincount(flat, minlength=len(library) * n_blocks)
+        return counts.reshape(len(library), n_blocks)
+
+    def descriptor_totals(
+        self, library: np.ndarray, cyclic: bool = False
+    ) -> Dict[str, np.ndarray]:
+        """Get the additive block descriptors of every peptide.
+
+        Args:
+            library: The block indices, shape (n_peptides, max_length).
+            cyclic: Whether the peptides are head-to-tail cyclized.
+
+        Returns:
+            The values of each descriptor, by descriptor name.
+
+        Raises:
+            ValueError: If the engine has no descriptor table.
+        """
+        if self.descriptors is None:
+            raise ValueError("No descriptor table was given to the engine")
+        totals = self.descriptors.peptide_properties(library, cyclic)
+        return {name: totals[..., i] for i, name in enumerate(self.descriptors.names)}
+
+    def rdkit_property(
+        self,
+        library: np.ndarray,
+        function: Callable[[Chem.Mol], float],
+        cyclic: bool = False,
+    ) -> np.ndarray:
+        """Compute a non-additive property with RDKit.
+
+        This builds one molecule per peptide and is orders of magnitude
+        slower than the additive properties, so use it only for properties
+        that cannot be summed from block contributions.
+
+        Args:
+            library: The block indices, shape (n_peptides, max_length).
+            function: The RDKit property function.
+            cyclic: Whether the peptides are head-to-tail cyclized.
+
+        Returns:
+            The property values.
+        """
+        values = []
+        for row in np.atleast_2d(library).tolist():
+            mols = [self._mols[index] for index in row if index != PADDING]
+            values.append(function(assemble_peptide(mols, cyclic)))
+        return np.asarray(values)
+
+
+def build_property_engine(set_name: str, codes: Sequence[str]) -> PeptidePropertyEngine:
+    """Build the property engine for blocks of a block set.
+
+    The engine's blocks are the given codes in order, so the block indices
+    of a design over those codes index the engine directly.
+
+    Args:
+        set_name: The block set name.
+        codes: The codes of the blocks, all in the set.
+
+    Returns:
+        The property engine, with the blocks' descriptor table.
+
+    Raises:
+        UnknownBlockSetError: If the set name is not known.
+        InvalidSmilesError: If a block's SMILES is invalid or unsupported.
+    """
+    block_set = load_block_set(set_name)
+    lookup = {code: index for index, code in enumerate(block_set.codes.tolist())}
+    indices = [lookup[code] for code in codes]
+    smiles = block_set.canonical_smiles.tolist()
+    for code, index in zip(codes, indices):
+        if not smiles[index]:
+            raise InvalidSmilesError(
+                f"Invalid SMILES for block {code}: {block_set.smiles[index]}"
+            )
+    table = get_descriptor_table(set_name)
+    return PeptidePropertyEngine(
+        [smiles[index] for index in indices],
+        DescriptorTable(table.names, table.values[indices], table.couplings[indices]),
+    )
+
+
+def format_properties(
+    chunks: Iterable[np.ndarray],
+    codes: Sequence[str],
+    engine: PeptidePropertyEngine,
+    separator: str = "-",
+    cyclic: bool = False,
+) -> Iterator[str]:
+    """Format chunks of library members and their properties as CSV text.
+
+    Each member is written with its formula, its average and monoisotopic
+    masses and its totals of the other block descriptors.
+
+    Args:
+        chunks: Integer arrays of block indices, shape (rows, length),
+            padded with -1 for shorter members.
+        codes: The code of each block, used to spell out members.
+        engine: The property engine over the same blocks as codes, with
+            a descriptor table.
+        separator: The separator between block codes.
+        cyclic: Whether the peptides are head-to-tail cyclized.
+
+    Yields:
+        The CSV header, then the CSV text of each chunk of members.
+    """
+    names = [
+        name
+        for name in engine.descriptors.names
+        if name not in ("mol_wt", "monoisotopic_mass")
+    ]
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    writer.writerow(["Sequence", "Formula", "MW", "Monoisotopic Mass", *names])
+    yield buffer.getvalue()
+    for chunk in chunks:
+        chunk = np.atleast_2d(chunk)
+        sequences = [
+            separator.join(codes[index] for index in row if index != PADDING)
+            for row in chunk.tolist()
+        ]
+        totals = engine.descriptor_totals(chunk, cyclic)
+        columns = [
+            engine.formulas(chunk, cyclic),
+            np.round(engine.average_mass(chunk, cyclic), 4).tolist(),
+            np.round(engine.monoisotopic_mass(chunk, cyclic), 4).tolist(),
+            *(np.round(totals[name], 4).tolist() for name in names),
+        ]
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(zip(sequences, *columns))
+        yield buffer.getvalue()
@@ -1,6 +1,7 @@
 class BuildingBlockExplorer {
-    constructor(containerId) {
+    constructor(containerId, setName = 'canonical') {
         this.container = document.getElementById(containerId);
+        this.setName = setName;
         this.buildingBlocks = [];
         this.initializeUI();
     }
@@ -27,16 +28,39 @@ class BuildingBlockExplorer {
     }
 
     async loadBuildingBlocks() {
+        this.buildingBlocks = [];
+        this.gridContainer.innerHTML = '';
+
         try {
-            const response = await fetch('/api/building-blocks');
-            const data = await response.json();
-            
-            if (data.error) {
+            // Stream the set as NDJSON so cards appear as blocks arrive
+            const response = await fetch(`/blocks/api/building-blocks/${this.setName}?stream=ndjson`);
+
+            if (!response.ok) {
+                const data = await response.json();
                 throw new Error(data.error);
             }
-            
-            this.buildingBlocks = data.building_blocks;
-            this.displayBuildingBlocks();
+
+            const reader = response.body.getReader();
+            const decoder = new TextDecoder();
+            let buffered = '';
+
+            while (true) {
+                const { done, value } = await reader.read();
+                if (done) {
+                    break;
+                }
+
+                buffered += decoder.decode(value, { stream: true });
+                const lines = buffered.split('\n');
+                buffered = lines.pop();
+                this.displayBuildingBlocks(
+                    lines.filter(line => line.trim()).map(line => JSON.parse(line))
+                );
+            }
+
+            if (buffered.trim()) {
+                this.displayBuildingBlocks([JSON.parse(buffered)]);
+            }
         } catch (error) {
             console.error('Error loading building blocks:', error);
             // Show error message to user
@@ -44,26 +68,30 @@ class BuildingBlockExplorer {
         }
     }
 
-    displayBuildingBlocks() {
-        this.gridContainer.innerHTML = '';
-        
-        this.buildingBlocks.forEach(block => {
+    displayBuildingBlocks(blocks) {
+        // Append only the new blocks, so the grid renders incrementally
+        const fragment = document.createDocumentFragment();
+
+        blocks.forEach(block => {
             const card = document.createElement('div');
             card.className = 'building-block-card';
             
             card.innerHTML = `
                 <div class="molecule-image">
-                    <img src="${block.image}" alt="${block.name}">
+                    <img src="${block.image_url}" alt="${block.name}" loading="lazy" decoding="async">
                 </div>
                 <div class="molecule-info">
                     <h3>${block.name}</h3>
-                    <p>Aliases: ${block.alt_name1} (${block.alt_name2})</p>
+                    <p>Aliases: ${block.code} (${block.alt_code})</p>
                     <p>SMILES: ${block.smiles}</p>
                     <p>Position: ${block.position}</p>
                 </div>
             `;
             
-            this.gridContainer.appendChild(card);
+            fragment.appendChild(card);
         });
+
+        this.buildingBlocks.push(...blocks);
+        this.gridContainer.appendChild(fragment);
     }
-} 
\ No newline at end of file
+}
\ No newline at end of file